@@ -0,0 +1,64 @@
+"""
+Helpers for reading images out of uploaded zip/tar archives.
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+from typing import List, Tuple
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+
+
+def is_image_name(name: str) -> bool:
+    """
+    Whether an archive member looks like an image, skipping hidden/metadata files.
+    """
+    base = os.path.basename(name)
+    return not base.startswith(".") and base.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def is_archive(filename: str, contents: bytes) -> bool:
+    """
+    Check whether an upload is a zip or tar archive rather than a single image.
+    """
+    if zipfile.is_zipfile(io.BytesIO(contents)):
+        return True
+    lower = (filename or "").lower()
+    return lower.endswith((".tar", ".tar.gz", ".tgz")) and tarfile.is_tarfile(io.BytesIO(contents))
+
+
+def extract_images(contents: bytes, max_files: int) -> List[Tuple[str, bytes]]:
+    """
+    Read image members of a zip or tar archive, in archive order.
+
+    Args:
+        contents: Raw archive bytes
+        max_files: Maximum number of images to read
+
+    Returns:
+        list: (member name, image bytes) tuples
+
+    Raises:
+        ValueError: If the archive holds more than `max_files` images
+    """
+    images = []
+    if zipfile.is_zipfile(io.BytesIO(contents)):
+        with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_name(info.filename):
+                    continue
+                if len(images) >= max_files:
+                    raise ValueError(f"Archive contains more than {max_files} images")
+                images.append((info.filename, archive.read(info)))
+        return images
+
+    with tarfile.open(fileobj=io.BytesIO(contents), mode="r:*") as archive:
+        for member in archive:
+            if not member.isfile() or not is_image_name(member.name):
+                continue
+            if len(images) >= max_files:
+                raise ValueError(f"Archive contains more than {max_files} images")
+            images.append((member.name, archive.extractfile(member).read()))
+    return images
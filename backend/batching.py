@@ -0,0 +1,181 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent /predict/ requests are collected into a single batch, run through
+one forward pass and the individual results are handed back to each caller.
+Each request names the model that must score it; a batch only ever holds
+requests for one model, so requests admitted before a model swap finish on
+the model they started with.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed upper bounds (Prometheus-style buckets).
+    """
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+        }
+
+
+class MicroBatcher:
+    """
+    Collects concurrent inference requests into batches.
+
+    A batch is dispatched as soon as it holds `max_batch_size` rows or the
+    oldest request has waited `max_wait_ms`, whichever comes first. Forward
+    passes run one at a time on a dedicated inference thread.
+
+    Args:
+        predict_fn: Callable taking a model and a (N, H, W, C) array and
+            returning the model's N outputs
+        max_batch_size: Maximum number of rows per forward pass
+        max_wait_ms: Maximum time a request waits for the batch to fill up
+    """
+
+    def __init__(self, predict_fn: Callable[[Any, np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait_histogram = Histogram(
+            [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0])
+        self._queue: Optional[asyncio.Queue] = None
+        # Request for another model that ended the previous batch
+        self._carry = None
+        self._task: Optional[asyncio.Task] = None
+        self._worker: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """
+        Start the batching loop on the running event loop.
+        """
+        self._queue = asyncio.Queue()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the batching loop and fail any requests still waiting.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._worker is not None:
+            self._worker.shutdown(wait=False)
+            self._worker = None
+        leftover = [self._carry] if self._carry is not None else []
+        self._carry = None
+        while self._queue is not None and not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        for _, future, _, _ in leftover:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped"))
+
+    async def submit(self, inputs: np.ndarray, model: Any) -> np.ndarray:
+        """
+        Queue a (n, H, W, C) array for inference by `model` and wait for its n outputs.
+        """
+        if self._queue is None:
+            raise RuntimeError("Inference batcher not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((np.asarray(inputs), future, time.perf_counter(), model))
+        return await future
+
+    async def _collect(self) -> List:
+        """
+        Wait for the first request, then gather more until the batch is full
+        or the wait deadline passes.
+        """
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self._queue.get()
+        batch = [first]
+        rows = len(first[0])
+        deadline = first[2] + self.max_wait
+        while rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout <= 0 or not self._queue.empty():
+                    # Requests that piled up during the previous forward pass
+                    # are taken without waiting
+                    item = self._queue.get_nowait()
+                else:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item[3] is not first[3]:
+                # Different model: close this batch, the item starts the next one
+                self._carry = item
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            dispatched_at = time.perf_counter()
+            for _, _, enqueued_at, _ in batch:
+                self.queue_wait_histogram.observe(dispatched_at - enqueued_at)
+
+            inputs = np.concatenate([item[0] for item in batch], axis=0)
+            self.batch_size_histogram.observe(len(inputs))
+            try:
+                outputs = await loop.run_in_executor(self._worker, self.predict_fn, batch[0][3], inputs)
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_inputs, future, _, _ in batch:
+                n = len(item_inputs)
+                if not future.done():
+                    future.set_result(outputs[offset:offset + n])
+                offset += n
+
+    def stats(self) -> Dict:
+        """
+        Return the batching configuration and histograms.
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_seconds": self.queue_wait_histogram.snapshot(),
+        }
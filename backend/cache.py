@@ -0,0 +1,93 @@
+"""
+Prediction cache keyed by a hash of the raw upload bytes and the model version.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def upload_hash(contents: bytes) -> str:
+    """
+    SHA-256 of the raw upload bytes, also used to identify uploads in the prediction log.
+    """
+    return hashlib.sha256(contents).hexdigest()
+
+
+def cache_key(upload_sha256: str, model_version: str) -> str:
+    """
+    Build the cache key for an upload (by its hash) scored by a given model version.
+    """
+    return f"{model_version}:{upload_sha256}"
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of raw model outputs with an optional TTL.
+
+    Keys include the model version, so deploying or rolling back a model
+    needs no invalidation: entries of other versions are never served, age
+    out through LRU eviction, and are reused if their version is swapped
+    back in.
+
+    Args:
+        max_entries: Maximum number of cached predictions (0 disables the cache)
+        ttl_seconds: Lifetime of an entry in seconds (0 means no expiry)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 0):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[float]:
+        """
+        Return the cached raw prediction for `key`, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, stored_at = entry
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: float):
+        if not self.enabled:
+            return
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
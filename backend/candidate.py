@@ -0,0 +1,280 @@
+"""
+Live evaluation of a candidate model next to the active one.
+
+In shadow mode every image scored by the active model is mirrored to the
+candidate after the response has been computed, so the candidate never
+delays a client. In canary mode a share of requests is served by the
+candidate instead. The candidate has its own micro-batcher and inference
+thread, so its forward passes never queue behind (or in front of) the
+active model's.
+
+Latency and confidence are recorded per model version, together with how
+often both models agree on mirrored images and each model's accuracy on
+predictions that later receive /feedback/ labels.
+"""
+
+import asyncio
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from backend import telemetry
+from backend.batching import Histogram, MicroBatcher
+
+SHADOW = "shadow"
+CANARY = "canary"
+MODES = (SHADOW, CANARY)
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+CONFIDENCE_BUCKETS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0]
+
+
+def interpret(raw_prediction: float) -> Tuple[str, float]:
+    """
+    Class and confidence of a sigmoid output (0 = cat, 1 = dog).
+    """
+    if raw_prediction > 0.5:
+        return "dog", float(raw_prediction)
+    return "cat", float(1 - raw_prediction)
+
+
+class ModelStats:
+    """
+    Latency, confidence and feedback accuracy of one model version.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.confidence = Histogram(CONFIDENCE_BUCKETS)
+        self.labeled = 0
+        self.correct = 0
+
+    def report(self) -> Dict:
+        return {
+            "predictions": self.confidence.count,
+            "avg_confidence": self.confidence.sum / self.confidence.count if self.confidence.count else 0.0,
+            "confidence": self.confidence.snapshot(),
+            "forward_pass_seconds": self.latency.snapshot(),
+            "labeled": self.labeled,
+            "accuracy": self.correct / self.labeled if self.labeled else None,
+        }
+
+
+class ModelComparison:
+    """
+    Per-model statistics of a candidate evaluation. Safe to update from the
+    event loop and from the inference threads.
+
+    Args:
+        feedback_window: Number of recent predictions whose outcomes are kept
+            so later feedback can be attributed to each model
+    """
+
+    def __init__(self, feedback_window: int = 10000):
+        self.feedback_window = max(1, feedback_window)
+        self.started_at = datetime.now().isoformat()
+        self.models: Dict[str, ModelStats] = {}
+        self.compared = 0
+        self.agreed = 0
+        self.abs_difference_sum = 0.0
+        self.shadow_dropped = 0
+        self.shadow_errors = 0
+        self._lock = threading.Lock()
+        # Prediction ID -> (label per model version, ground truth)
+        self._outcomes: "OrderedDict[str, Tuple[Dict[str, str], Optional[str]]]" = OrderedDict()
+
+    def _stats(self, version: str) -> ModelStats:
+        if version not in self.models:
+            self.models[version] = ModelStats()
+        return self.models[version]
+
+    def _remember(self, prediction_id: str, version: str, label: str):
+        outcome = self._outcomes.get(prediction_id)
+        if outcome is None:
+            self._outcomes[prediction_id] = ({version: label}, None)
+            if len(self._outcomes) > self.feedback_window:
+                self._outcomes.popitem(last=False)
+        else:
+            outcome[0][version] = label
+
+    def observe_latency(self, version: str, seconds: float):
+        with self._lock:
+            self._stats(version).latency.observe(seconds)
+
+    def record(self, prediction_id: str, version: str, raw_prediction: float):
+        """
+        Record a prediction returned to a client.
+        """
+        label, confidence = interpret(raw_prediction)
+        with self._lock:
+            self._stats(version).confidence.observe(confidence)
+            self._remember(prediction_id, version, label)
+
+    def record_shadow(self, prediction_id: str, version: str, raw_prediction: float, served_raw: float):
+        """
+        Record the candidate's output for an image whose served output was `served_raw`.
+        """
+        label, confidence = interpret(raw_prediction)
+        with self._lock:
+            self._stats(version).confidence.observe(confidence)
+            self._remember(prediction_id, version, label)
+            self.compared += 1
+            self.agreed += int(label == interpret(served_raw)[0])
+            self.abs_difference_sum += abs(raw_prediction - served_raw)
+
+    def record_feedback(self, prediction_id: str, ground_truth: str):
+        """
+        Score every model that predicted `prediction_id` against a label.
+        Re-labeling replaces the previous label.
+        """
+        with self._lock:
+            outcome = self._outcomes.get(prediction_id)
+            if outcome is None:
+                return
+            labels, previous = outcome
+            for version, label in labels.items():
+                stats = self._stats(version)
+                if previous is not None:
+                    stats.labeled -= 1
+                    stats.correct -= int(label == previous)
+                stats.labeled += 1
+                stats.correct += int(label == ground_truth)
+            self._outcomes[prediction_id] = (labels, ground_truth)
+
+    def count_shadow_dropped(self, n: int):
+        with self._lock:
+            self.shadow_dropped += n
+
+    def count_shadow_error(self, n: int):
+        with self._lock:
+            self.shadow_errors += n
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "models": {version: stats.report() for version, stats in self.models.items()},
+                "shadow": {
+                    "compared": self.compared,
+                    "agreement_rate": self.agreed / self.compared if self.compared else None,
+                    "mean_abs_difference": self.abs_difference_sum / self.compared if self.compared else None,
+                    "dropped": self.shadow_dropped,
+                    "errors": self.shadow_errors,
+                },
+            }
+
+    def render(self, candidate_version: str) -> List[str]:
+        """
+        Prometheus exposition lines, labeled by model version and role.
+        """
+        def labels(version):
+            return {"model_version": version, "role": "candidate" if version == candidate_version else "primary"}
+
+        with self._lock:
+            lines = telemetry.histogram_family(
+                "catvsdog_model_forward_pass_seconds", "Forward pass time per model during a candidate evaluation.",
+                [(labels(version), stats.latency) for version, stats in self.models.items()])
+            lines += telemetry.histogram_family(
+                "catvsdog_model_confidence", "Prediction confidence per model during a candidate evaluation.",
+                [(labels(version), stats.confidence) for version, stats in self.models.items()])
+            lines += telemetry.metric_family(
+                "catvsdog_model_labeled_total", "counter", "Evaluated predictions that received feedback.",
+                [(labels(version), stats.labeled) for version, stats in self.models.items()])
+            lines += telemetry.metric_family(
+                "catvsdog_model_correct_total", "counter", "Evaluated predictions that matched their feedback.",
+                [(labels(version), stats.correct) for version, stats in self.models.items()])
+            lines += telemetry.metric_family(
+                "catvsdog_shadow_compared_total", "counter", "Images scored by both the primary and shadow model.",
+                [({}, self.compared)])
+            lines += telemetry.metric_family(
+                "catvsdog_shadow_agreed_total", "counter", "Mirrored images both models put in the same class.",
+                [({}, self.agreed)])
+            lines += telemetry.metric_family(
+                "catvsdog_shadow_dropped_total", "counter", "Images not mirrored because the shadow backlog was full.",
+                [({}, self.shadow_dropped)])
+        return lines
+
+
+class Candidate:
+    """
+    A loaded candidate model with its own micro-batcher.
+
+    Args:
+        model: The candidate LoadedModel
+        mode: SHADOW or CANARY
+        traffic_percent: Share of requests served by the candidate in canary mode
+        batcher: Micro-batcher running the candidate's forward passes
+        comparison: Statistics of this evaluation
+        max_pending: Mirrored images in flight beyond which new ones are dropped
+    """
+
+    def __init__(self, model, mode: str, traffic_percent: float, batcher: MicroBatcher,
+                 comparison: ModelComparison, max_pending: int = 64):
+        if mode not in MODES:
+            raise ValueError(f"Unknown candidate mode '{mode}', expected one of {list(MODES)}")
+        self.model = model
+        self.mode = mode
+        self.traffic_percent = traffic_percent
+        self.batcher = batcher
+        self.comparison = comparison
+        self.max_pending = max_pending
+        self.pending = 0
+        # Canary requests currently being served by the candidate
+        self.inflight = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def takes_request(self) -> bool:
+        """
+        Whether the candidate serves the next request (canary mode only).
+        """
+        return self.mode == CANARY and random.random() * 100 < self.traffic_percent
+
+    def mirror(self, inputs: np.ndarray, served: List[Tuple[str, float]]):
+        """
+        Score `inputs` with the candidate in the background. `served` holds the
+        prediction ID and served raw output of each row. Returns immediately.
+        """
+        n = len(served)
+        if self.pending + n > self.max_pending:
+            # A slow candidate must not build an unbounded backlog
+            self.comparison.count_shadow_dropped(n)
+            return
+        self.pending += n
+        task = asyncio.create_task(self._score_shadow(inputs, served))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score_shadow(self, inputs: np.ndarray, served: List[Tuple[str, float]]):
+        try:
+            outputs = await self.batcher.submit(inputs, self.model)
+        except Exception:
+            self.comparison.count_shadow_error(len(served))
+            return
+        finally:
+            self.pending -= len(served)
+        for (prediction_id, served_raw), output in zip(served, outputs):
+            self.comparison.record_shadow(prediction_id, self.model.version, float(output), served_raw)
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Stop the candidate once the requests and mirrored images it already
+        accepted have been scored (or `timeout` seconds have passed).
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        while (self.inflight or self._tasks) and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        await self.batcher.stop()
+
+    def report(self) -> Dict:
+        return {
+            "version": self.model.version,
+            "mode": self.mode,
+            "traffic_percent": self.traffic_percent if self.mode == CANARY else None,
+            "inflight": self.inflight,
+            "shadow_pending": self.pending,
+            **self.comparison.report(),
+        }
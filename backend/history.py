@@ -0,0 +1,203 @@
+"""
+Bounded prediction history with running aggregates.
+
+Records live in preallocated NumPy columns used as a ring buffer, and the
+sums, class counts and accuracy counts behind /performance/ are updated on
+every insert, eviction and feedback, so reading them never scans the window.
+Prediction IDs ("pred_<instance>_<n>") combine a random per-history instance
+token with a monotonic sequence number, so IDs issued by different replicas or
+restarts never collide, and are indexed by slot for O(1) feedback lookups.
+"""
+
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+NO_LABEL = -1
+ID_PREFIX = "pred_"
+
+
+class PredictionHistory:
+    """
+    Ring buffer of the most recent `capacity` predictions.
+
+    Args:
+        capacity: Number of predictions kept; the oldest one is evicted first
+        classes: Class names, stored as indexes into this sequence
+        instance: Token identifying this history in its IDs, random by default
+    """
+
+    def __init__(self, capacity: int = 10000, classes: Sequence[str] = ("cat", "dog"),
+                 instance: Optional[str] = None):
+        self.capacity = max(1, capacity)
+        self.id_prefix = f"{ID_PREFIX}{instance or uuid.uuid4().hex[:12]}_"
+        self.classes = list(classes)
+        self._class_index = {name: i for i, name in enumerate(self.classes)}
+
+        self._ids: List[Optional[str]] = [None] * self.capacity
+        self._filenames: List[Optional[str]] = [None] * self.capacity
+        self._model_versions: List[Optional[str]] = [None] * self.capacity
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self._prediction = np.zeros(self.capacity, dtype=np.int8)
+        self._ground_truth = np.full(self.capacity, NO_LABEL, dtype=np.int8)
+        self._confidence = np.zeros(self.capacity, dtype=np.float64)
+        self._processing_time = np.zeros(self.capacity, dtype=np.float64)
+        self._start = 0
+        self._size = 0
+        self._index: Dict[str, int] = {}
+        self._next_sequence = 1
+
+        # Running aggregates over the records currently in the buffer
+        self.confidence_sum = 0.0
+        self.processing_time_sum = 0.0
+        self.class_counts = [0] * len(self.classes)
+        self.labeled = 0
+        self.correct = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, position: int) -> int:
+        return (self._start + position) % self.capacity
+
+    def _evict_oldest(self):
+        slot = self._start
+        self.confidence_sum -= float(self._confidence[slot])
+        self.processing_time_sum -= float(self._processing_time[slot])
+        predicted = self._prediction[slot]
+        self.class_counts[predicted] -= 1
+        if self._ground_truth[slot] != NO_LABEL:
+            self.labeled -= 1
+            self.correct -= int(self._ground_truth[slot] == predicted)
+        del self._index[self._ids[slot]]
+        self._ids[slot] = None
+        self._filenames[slot] = None
+        self._model_versions[slot] = None
+        self._start = (self._start + 1) % self.capacity
+        self._size -= 1
+
+    def append(self, filename: str, prediction: str, confidence: float,
+               processing_time: float, timestamp: Optional[float] = None,
+               model_version: Optional[str] = None) -> str:
+        """
+        Record a prediction, evicting the oldest one when the buffer is full.
+
+        Returns:
+            str: The new prediction's ID, unique across histories
+        """
+        prediction_id = f"{self.id_prefix}{self._next_sequence}"
+        self._insert(prediction_id, filename, prediction, confidence, processing_time,
+                     datetime.now().timestamp() if timestamp is None else timestamp, model_version)
+        return prediction_id
+
+    def restore(self, records: List[Dict]):
+        """
+        Reload records (oldest first, as dicts with the fields of a recorded
+        prediction) e.g. from the prediction log after a restart. Restored
+        records keep their IDs; new IDs continue after the highest restored
+        one issued by this history.
+        """
+        for record in records:
+            if record["id"] in self._index:
+                continue
+            self._insert(record["id"], record["filename"], record["prediction"],
+                         record["confidence"], record["processing_time"], record["timestamp"],
+                         record.get("model_version"))
+            if record.get("ground_truth"):
+                self.set_ground_truth(record["id"], record["ground_truth"])
+
+    def _insert(self, prediction_id: str, filename: str, prediction: str,
+                confidence: float, processing_time: float, timestamp: float,
+                model_version: Optional[str] = None):
+        if self._size == self.capacity:
+            self._evict_oldest()
+        slot = self._slot(self._size)
+        predicted = self._class_index[prediction]
+        self._ids[slot] = prediction_id
+        self._index[prediction_id] = slot
+        self._filenames[slot] = filename
+        self._model_versions[slot] = model_version
+        self._timestamps[slot] = timestamp
+        self._prediction[slot] = predicted
+        self._ground_truth[slot] = NO_LABEL
+        self._confidence[slot] = confidence
+        self._processing_time[slot] = processing_time
+        self._size += 1
+        sequence = self._sequence(prediction_id)
+        if sequence is not None:
+            self._next_sequence = max(self._next_sequence, sequence + 1)
+
+        self.confidence_sum += confidence
+        self.processing_time_sum += processing_time
+        self.class_counts[predicted] += 1
+
+    def _sequence(self, prediction_id: str) -> Optional[int]:
+        number = prediction_id[len(self.id_prefix):]
+        if prediction_id.startswith(self.id_prefix) and number.isdigit():
+            return int(number)
+        return None
+
+    def was_evicted(self, prediction_id: str) -> bool:
+        """
+        Whether `prediction_id` was issued by this history but has since been evicted.
+        """
+        sequence = self._sequence(prediction_id)
+        return sequence is not None and sequence < self._next_sequence - self._size
+
+    def set_ground_truth(self, prediction_id: str, ground_truth: str) -> bool:
+        """
+        Attach a ground-truth label to a recorded prediction.
+
+        Returns:
+            bool: False if the prediction is not (or no longer) in the history
+        """
+        slot = self._index.get(prediction_id)
+        if slot is None:
+            return False
+        predicted = self._prediction[slot]
+        previous = self._ground_truth[slot]
+        if previous != NO_LABEL:
+            self.labeled -= 1
+            self.correct -= int(previous == predicted)
+        label = self._class_index[ground_truth]
+        self._ground_truth[slot] = label
+        self.labeled += 1
+        self.correct += int(label == predicted)
+        return True
+
+    def _record(self, slot: int) -> Dict:
+        ground_truth = self._ground_truth[slot]
+        return {
+            "id": self._ids[slot],
+            "timestamp": datetime.fromtimestamp(self._timestamps[slot]).isoformat(),
+            "filename": self._filenames[slot],
+            "prediction": self.classes[self._prediction[slot]],
+            "confidence": float(self._confidence[slot]),
+            "processing_time": float(self._processing_time[slot]),
+            "model_version": self._model_versions[slot],
+            "ground_truth": None if ground_truth == NO_LABEL else self.classes[ground_truth],
+        }
+
+    def recent(self, n: int) -> List[Dict]:
+        """
+        Return the `n` most recent records, oldest first.
+        """
+        n = min(n, self._size)
+        return [self._record(self._slot(position)) for position in range(self._size - n, self._size)]
+
+    def summary(self) -> Dict:
+        """
+        Aggregates over the whole window, computed in constant time.
+        """
+        total = self._size
+        return {
+            "total_predictions": total,
+            "avg_confidence": self.confidence_sum / total if total else 0.0,
+            "avg_processing_time": self.processing_time_sum / total if total else 0.0,
+            # Only classes that were predicted at least once, as before
+            "class_distribution": {name: count for name, count in zip(self.classes, self.class_counts)
+                                   if count},
+            "accuracy": self.correct / self.labeled if self.labeled else None,
+        }
@@ -0,0 +1,69 @@
+"""
+Fast image decoding for inference.
+
+JPEGs are decoded with PIL's draft mode so libjpeg downsamples by 1/2, 1/4 or
+1/8 while decoding instead of materialising a full-resolution bitmap. The
+result is returned as uint8 at model resolution; scaling to [0, 1] happens
+inside the model graph (see `with_input_normalization` in ml_part/export.py).
+
+Compared with the previous pipeline (full decode, bicubic resize, float divide
+by 255) pixel values differ by at most a few 1/255 steps, because the DCT
+downscale replaces part of the bicubic filter. benchmarks/preprocess_benchmark.py
+reports the exact pixel and model-output differences alongside the speedup.
+"""
+
+import io
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+# Shrink by integer factors before the bicubic pass once the image is at
+# least this many times larger than the target (Pillow's reducing_gap)
+REDUCING_GAP = 3.0
+
+
+def open_image(contents: bytes, size: Tuple[int, int]) -> Image.Image:
+    """
+    Decode raw image bytes into an RGB PIL image, at reduced scale for JPEGs
+    that are much larger than `size` (width, height).
+    """
+    image = Image.open(io.BytesIO(contents))
+    if image.format == "JPEG":
+        # The decoder picks the largest DCT scale that still covers `size`
+        image.draft("RGB", size)
+    image.load()
+    # Convert to RGB to ensure compatibility (handles PNG, RGBA, etc.)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def resize_image(image: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """
+    Resize a decoded image to exactly `size` (width, height).
+    """
+    if image.size != size:
+        image = image.resize(size, Image.BICUBIC, reducing_gap=REDUCING_GAP)
+    return image
+
+
+def to_batch(image: Image.Image) -> np.ndarray:
+    """
+    Convert an RGB image into a (1, H, W, 3) uint8 array ready for the model.
+    """
+    return np.asarray(image, dtype=np.uint8)[np.newaxis]
+
+
+def load_image(contents: bytes, size: Tuple[int, int]) -> Image.Image:
+    """
+    Decode raw image bytes into an RGB PIL image of exactly `size` (width, height).
+    """
+    return resize_image(open_image(contents, size), size)
+
+
+def decode_image(contents: bytes, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Decode raw image bytes into a (1, H, W, 3) uint8 array ready for the model.
+    """
+    return to_batch(load_image(contents, size))
@@ -0,0 +1,143 @@
+"""
+Pluggable inference backends for serving.
+
+Every backend takes a (N, H, W, 3) uint8 batch and returns the N raw sigmoid
+outputs as a float32 array, so they can be swapped through configuration.
+Runtimes are imported lazily so a pod only needs the one it uses.
+"""
+
+import os
+from typing import Dict
+
+import numpy as np
+
+# Artifact for each backend, relative to the ml_part directory. The int8
+# model is only written by the quantize stage when it passes the accuracy gate.
+ARTIFACTS: Dict[str, str] = {
+    "keras": "checkpoints/model.h5",
+    "tflite": "checkpoints/model.tflite",
+    "onnx": "checkpoints/model.onnx",
+    "tflite_int8": "quantized/model_int8.tflite",
+}
+
+
+class KerasBackend:
+    """
+    Full TensorFlow/Keras inference on the H5 checkpoint.
+    """
+
+    name = "keras"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        import tensorflow as tf
+        from ml_part.export import with_input_normalization
+
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            except RuntimeError:
+                # Already set when an earlier model was loaded; TF cannot change it afterwards
+                pass
+        self.path = model_path
+        self.model = with_input_normalization(tf.keras.models.load_model(model_path))
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict_on_batch(batch), dtype=np.float32)[:, 0]
+
+
+def tflite_interpreter_class():
+    """
+    Return a TFLite Interpreter class, preferring the slim LiteRT/tflite-runtime
+    packages so a TFLite pod never has to import full TensorFlow.
+    """
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter inference. Not thread-safe; the micro-batcher only
+    calls it from its single inference thread.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        Interpreter = tflite_interpreter_class()
+
+        self.path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads or None)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # Re-allocating tensors is costly, so only do it when the batch size changes
+        if len(batch) != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = len(batch)
+        self.interpreter.set_tensor(self._input["index"], batch.astype(self._input["dtype"], copy=False))
+        self.interpreter.invoke()
+        outputs = self.interpreter.get_tensor(self._output["index"])[:, 0].astype(np.float32)
+        scale, zero_point = self._output["quantization"]
+        if scale:
+            # Integer-quantized output tensor
+            outputs = (outputs - zero_point) * scale
+        return outputs
+
+
+class ONNXBackend:
+    """
+    ONNX Runtime inference. Requires the optional onnxruntime package.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = model_path
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        outputs = self.session.run(None, {self._input_name: batch.astype(np.uint8, copy=False)})
+        return np.asarray(outputs[0], dtype=np.float32)[:, 0]
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+    "tflite_int8": TFLiteBackend,
+}
+
+
+def load_backend(name: str, model_dir: str, num_threads: int = 0):
+    """
+    Load the artifact for inference backend `name` from `model_dir` (ml_part).
+
+    Raises:
+        ValueError: If the backend name is unknown
+        RuntimeError: If the backend's artifact has not been exported
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    model_path = os.path.join(model_dir, ARTIFACTS[name])
+    if not os.path.exists(model_path):
+        if name == "tflite_int8":
+            raise RuntimeError(f"Model file not found at {model_path}; the quantized model is only "
+                               "promoted if it passes the accuracy gate (see quantization_metrics.json)")
+        raise RuntimeError(f"Model file not found at {model_path}")
+    return BACKENDS[name](model_path, num_threads)
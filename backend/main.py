@@ -1,22 +1,36 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-import tensorflow as tf
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import numpy as np
-from PIL import Image
 import io
 import uvicorn
 import os
 import sys
 import time
-import subprocess
 from datetime import datetime
 from typing import Dict, List, Optional
 from pydantic import BaseModel
 import json
+import asyncio
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the project root to path so we can import from ml_part
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from ml_part import config
+from backend import imaging
+from backend.batching import MicroBatcher
+from backend.registry import LoadedModel, ModelRegistry
+from backend.candidate import CANARY, MODES, SHADOW, Candidate, ModelComparison, interpret
+from backend.training_queue import COMPLETED, FAILED, FINISHED, TrainingQueue
+from backend.workers import Overloaded, PreprocessExecutor
+from backend.cache import PredictionCache, cache_key, upload_hash
+from backend.history import PredictionHistory
+from backend.prediction_log import PredictionLog
+from backend import telemetry
+from backend.archives import extract_images, is_archive
+from backend.streaming import (AsyncBodyReader, DuplexStreamingResponse, iter_jsonl_items,
+                               iter_tar_items, produce_items)
 
 app = FastAPI(title="Cat vs Dog Classifier API")
 
@@ -29,8 +43,72 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Load the model on startup
-model = None
+def process_start_time():
+    """
+    Wall-clock time at which this process was started, read from /proc on
+    Linux so interpreter start-up and imports are included. Falls back to the
+    time this module was imported.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) counts clock ticks since boot
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - age
+    except (OSError, ValueError, AttributeError, IndexError):
+        return time.time()
+
+PROCESS_START = process_start_time()
+
+# Trained model artifacts live under ml_part (checkpoints/, quantized/)
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ml_part")
+
+# Versioned model artifacts for the configured inference backend
+model_registry = ModelRegistry(config.MODEL_REGISTRY_DIR, config.INFERENCE_BACKEND)
+
+# Model serving new requests. Swapped with a single assignment on the event
+# loop; a request keeps the model it started with until it has finished.
+active_model: Optional[LoadedModel] = None
+
+# Model replaced by the last swap, kept loaded so a rollback needs no reload
+previous_model: Optional[LoadedModel] = None
+
+# Serializes deployments and rollbacks
+deploy_lock = asyncio.Lock()
+
+# Candidate model evaluated next to the active one (shadow or canary), if any
+candidate: Optional[Candidate] = None
+
+# Shape of one preprocessed image
+INPUT_SHAPE = (config.IMG_HEIGHT, config.IMG_WIDTH, config.CHANNELS)
+
+# Set once the model is loaded and warmed up; /health/ready reports it
+ready = False
+startup_error: Optional[str] = None
+
+# Seconds from process start to each startup milestone
+startup_timings: Dict[str, float] = {}
+
+# Collects concurrent /predict/ requests into a single forward pass
+batcher: Optional[MicroBatcher] = None
+
+# Bounded pool for image decode/preprocess, keeps blocking work off the event loop
+preprocess_executor = PreprocessExecutor(
+    max_workers=config.PREPROCESS_WORKERS,
+    max_pending=config.PREDICT_MAX_PENDING,
+    retry_after=config.PREDICT_RETRY_AFTER_SECONDS
+)
+
+# Producer threads of /predict/stream/ jobs, each held for a whole stream; kept apart from
+# the default executor used by the registry, prediction log and training queue calls.
+# Streams beyond STREAM_MAX_JOBS wait for a thread.
+stream_executor = ThreadPoolExecutor(max_workers=config.STREAM_MAX_JOBS, thread_name_prefix="stream")
+
+# Raw model outputs for previously seen uploads, keyed by model version
+prediction_cache = PredictionCache(
+    max_entries=config.PREDICTION_CACHE_SIZE,
+    ttl_seconds=config.PREDICTION_CACHE_TTL_SECONDS
+)
 
 # Store prediction data for performance tracking
 class Prediction(BaseModel):
@@ -40,10 +118,17 @@ class Prediction(BaseModel):
     prediction: str
     confidence: float
     processing_time: float
+    model_version: Optional[str] = None
     ground_truth: Optional[str] = None
 
-# In-memory storage for predictions (in a production app, this would be a database)
-predictions: List[Prediction] = []
+# Stage latencies, per-class prediction counts and errors for /prometheus
+serving_metrics = telemetry.ServingMetrics()
+
+# Bounded in-memory prediction history with running aggregates for /performance/
+predictions = PredictionHistory(capacity=config.PREDICTION_HISTORY_SIZE)
+
+# Durable append-only log of predictions and feedback, opened on startup
+prediction_log: Optional[PredictionLog] = None
 
 # Performance metrics
 class ModelPerformance(BaseModel):
@@ -58,6 +143,13 @@ class FeedbackRequest(BaseModel):
     prediction_id: str
     ground_truth: str
 
+class BulkFeedbackRequest(BaseModel):
+    feedback: List[FeedbackRequest]
+
+class CandidateRequest(BaseModel):
+    mode: str = SHADOW  # shadow: mirrored traffic, canary: a share of requests
+    traffic_percent: float = config.CANDIDATE_TRAFFIC_PERCENT  # canary only
+
 class RetrainResponse(BaseModel):
     status: str
     job_id: str
@@ -65,143 +157,577 @@ class RetrainResponse(BaseModel):
 
 class RetrainRequest(BaseModel):
     force: bool = False  # Whether to force retraining even if no changes detected
+    mode: str = "full"  # "full" retrains from scratch, "incremental" fine-tunes the current model on new data
 
-# Maintain a list of training jobs
-training_jobs = {}
+# Persistent queue of retraining jobs run by backend/training_worker.py, opened on startup
+training_queue: Optional[TrainingQueue] = None
 
 @app.on_event("startup")
 async def startup_event():
-    global model
-    model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                             "ml_part", "checkpoints", "model.h5")
-    if not os.path.exists(model_path):
-        raise RuntimeError(f"Model file not found at {model_path}")
+    global batcher, prediction_log, training_queue
+    startup_timings["server_started"] = time.time() - PROCESS_START
+    batcher = MicroBatcher(
+        run_inference,
+        max_batch_size=config.PREDICT_MAX_BATCH_SIZE,
+        max_wait_ms=config.PREDICT_MAX_WAIT_MS
+    )
+    batcher.start()
+    
+    if config.PREDICTION_LOG_PATH:
+        prediction_log = PredictionLog(
+            config.PREDICTION_LOG_PATH,
+            flush_interval_ms=config.PREDICTION_LOG_FLUSH_MS,
+            max_pending=config.PREDICTION_LOG_MAX_PENDING,
+            upload_dir=config.PREDICTION_LOG_UPLOAD_DIR or None
+        )
+        prediction_log.start()
+    
+    training_queue = TrainingQueue(config.TRAINING_QUEUE_PATH, config.TRAINING_LOG_DIR,
+                                   config.TRAINING_QUEUE_JOURNAL_MODE)
     
-    print(f"Loading model from {model_path}")
-    model = tf.keras.models.load_model(model_path)
-    print("Model loaded successfully")
+    # Load in the background so liveness probes are answered while the model loads
+    asyncio.create_task(load_and_warm_up())
+    asyncio.create_task(deploy_trained_models())
 
-def preprocess_image(image):
+async def load_and_warm_up():
     """
-    Preprocess the image to be compatible with the model.
+    Load the model off the event loop, then run a dummy batch through the
+    whole inference path before the pod reports ready.
     """
-    # Resize image
-    image = image.resize((config.IMG_WIDTH, config.IMG_HEIGHT))
+    global active_model, ready, startup_error
+    loop = asyncio.get_running_loop()
+    if prediction_log is not None:
+        # Refill the in-memory history so /performance/ survives restarts
+        try:
+            predictions.restore(await loop.run_in_executor(None, prediction_log.recent, predictions.capacity))
+            print(f"Restored {len(predictions)} predictions from {prediction_log.path}")
+        except Exception as e:
+            print(f"Could not restore prediction history: {str(e)}")
+    try:
+        version = await loop.run_in_executor(None, startup_version)
+        print(f"Loading {config.INFERENCE_BACKEND} model version {version} from {model_registry.root}")
+        active_model = await loop.run_in_executor(None, model_registry.load, version, config.INFERENCE_THREADS)
+        startup_timings["model_loaded"] = time.time() - PROCESS_START
+        print(f"Model loaded successfully from {active_model.path} (version {version})")
+        
+        # Warm-up pays for graph tracing / tensor allocation before real traffic
+        dummy = np.zeros((1,) + INPUT_SHAPE, dtype=np.uint8)
+        await batcher.submit(dummy, active_model)
+        startup_timings["first_prediction"] = time.time() - PROCESS_START
+        ready = True
+        print(f"Ready: first prediction {startup_timings['first_prediction']:.2f}s after process start")
+    except Exception as e:
+        startup_error = str(e)
+        print(f"Error loading model: {startup_error}")
+        return
     
-    # Convert image to array and normalize
-    img_array = tf.keras.preprocessing.image.img_to_array(image)
-    img_array = img_array / 255.0  # Normalize to [0,1]
+    if config.CANDIDATE_MODEL_VERSION:
+        # A candidate that fails to load must not take the active model down
+        try:
+            await start_candidate(config.CANDIDATE_MODEL_VERSION, config.CANDIDATE_MODE,
+                                  config.CANDIDATE_TRAFFIC_PERCENT)
+        except Exception as e:
+            print(f"Error loading candidate model: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if candidate is not None:
+        await candidate.batcher.stop()
+    if batcher is not None:
+        await batcher.stop()
+    preprocess_executor.shutdown()
+    stream_executor.shutdown(wait=False, cancel_futures=True)
+    if prediction_log is not None:
+        prediction_log.close()
+
+def startup_version():
+    """
+    Register the trained checkpoint and pick the version to serve: a newly
+    trained checkpoint becomes active, otherwise the registry's active version
+    is kept so a rollback survives restarts.
+    """
+    active = model_registry.active()
+    known = {metadata["version"] for metadata in model_registry.versions()}
+    try:
+        version = model_registry.register(MODEL_DIR)
+    except RuntimeError:
+        # No exported checkpoint in this image; serve from the registry alone
+        if active is None:
+            raise
+        return active
+    if active is None or version not in known:
+        model_registry.set_active(version)
+        return version
+    return active
+
+def load_and_warm_up_version(version):
+    """
+    Load a registered version and run a dummy batch through it. Runs on a
+    worker thread while the active model keeps serving.
+    """
+    loaded = model_registry.load(version, config.INFERENCE_THREADS)
+    loaded.warm_up(INPUT_SHAPE)
+    return loaded
+
+async def deploy_version(version):
+    """
+    Make `version` the active model without interrupting traffic. It is loaded
+    and warmed up in the background, then swapped in; the replaced model stays
+    loaded for rollback. Deploying the previous version is a plain swap.
+    """
+    global active_model, previous_model
+    async with deploy_lock:
+        if active_model is not None and active_model.version == version:
+            return active_model
+        loop = asyncio.get_running_loop()
+        if previous_model is not None and previous_model.version == version:
+            loaded = previous_model
+        else:
+            loaded = await loop.run_in_executor(None, load_and_warm_up_version, version)
+        active_model, previous_model = loaded, active_model
+        await loop.run_in_executor(None, model_registry.set_active, version)
+        print(f"Serving model version {version}")
+    if candidate is not None and candidate.model.version == version:
+        # The candidate was promoted; comparing it with itself tells nothing
+        await stop_candidate()
+    return loaded
+
+async def start_candidate(version, mode, traffic_percent):
+    """
+    Load and warm up `version` in the background and evaluate it next to the
+    active model, replacing the current candidate.
+    """
+    global candidate
+    if mode not in MODES:
+        raise ValueError(f"Unknown candidate mode '{mode}', expected one of {list(MODES)}")
+    loaded = await asyncio.get_running_loop().run_in_executor(None, load_and_warm_up_version, version)
+    # Canary passes serve clients and count as the inference stage; shadow passes do not
+    candidate_batcher = MicroBatcher(
+        run_inference if mode == CANARY else forward_pass,
+        max_batch_size=config.PREDICT_MAX_BATCH_SIZE,
+        max_wait_ms=config.PREDICT_MAX_WAIT_MS
+    )
+    candidate_batcher.start()
+    await stop_candidate()
+    candidate = Candidate(loaded, mode, traffic_percent, candidate_batcher,
+                          ModelComparison(config.CANDIDATE_FEEDBACK_WINDOW), config.CANDIDATE_MAX_PENDING)
+    print(f"Evaluating candidate model version {version} ({mode})")
+    return candidate
+
+async def stop_candidate():
+    """
+    Stop routing traffic to the candidate and unload it once the requests it
+    already accepted have finished.
+    """
+    global candidate
+    current, candidate = candidate, None
+    if current is not None:
+        await current.stop()
+    return current
+
+@contextmanager
+def request_route():
+    """
+    Pick the model serving one request. Yields (model, batcher, shadow): the
+    active model or, for a share of requests in canary mode, the candidate,
+    and the candidate to mirror images to in shadow mode.
+    """
+    current = candidate
+    if current is None:
+        yield active_model, batcher, None
+    elif current.takes_request():
+        current.inflight += 1
+        try:
+            yield current.model, current.batcher, None
+        finally:
+            current.inflight -= 1
+    else:
+        yield active_model, batcher, current if current.mode == SHADOW else None
+
+def forward_pass(model, batch):
+    """
+    Run `model` over a batch, timing it per model while a candidate is evaluated.
+    """
+    start = time.perf_counter()
+    outputs = model.predict(batch)
+    if candidate is not None:
+        candidate.comparison.observe_latency(model.version, time.perf_counter() - start)
+    return outputs
+
+def run_inference(model, batch):
+    """
+    Run a single forward pass of `model` over a batch of preprocessed images.
+    """
+    with serving_metrics.time_stage("inference"):
+        return forward_pass(model, batch)
+
+def decode_image(contents):
+    """
+    Decode raw upload bytes into a (1, H, W, C) uint8 array.
+    Runs on the preprocessing pool, never on the event loop.
+    """
+    size = (config.IMG_WIDTH, config.IMG_HEIGHT)
+    with serving_metrics.time_stage("decode"):
+        image = imaging.open_image(contents, size)
+    with serving_metrics.time_stage("preprocess"):
+        return imaging.to_batch(imaging.resize_image(image, size))
+
+def record_prediction(filename, prediction, processing_time, model_version, upload_sha256=None,
+                      contents=None):
+    """
+    Interpret a raw model output of model `model_version`, store it in the
+    prediction history and the prediction log, and return the response payload.
+    """
+    # Interpret results (sigmoid output: 0 = cat, 1 = dog)
+    animal_class, confidence = interpret(prediction)
     
-    # Add batch dimension
-    img_array = tf.expand_dims(img_array, 0)
+    # Store prediction data
+    timestamp = time.time()
+    prediction_id = predictions.append(filename or "unknown", animal_class, confidence,
+                                       processing_time, timestamp, model_version)
+    serving_metrics.count_prediction(animal_class, model_version)
+    if candidate is not None:
+        candidate.comparison.record(prediction_id, model_version, float(prediction))
+    if prediction_log is not None:
+        prediction_log.append_prediction({
+            "id": prediction_id,
+            "timestamp": timestamp,
+            "filename": filename or "unknown",
+            "prediction": animal_class,
+            "confidence": confidence,
+            "raw_prediction": float(prediction),
+            "processing_time": processing_time,
+            "model_version": model_version,
+            "upload_sha256": upload_sha256
+        }, contents)
     
-    return img_array
+    return {
+        "id": prediction_id,
+        "prediction": animal_class,
+        "confidence": confidence,
+        "raw_prediction": float(prediction),
+        "processing_time": processing_time,
+        "model_version": model_version
+    }
+
+def json_response(payload):
+    """
+    Serialize a response payload, timing it as the serialization stage.
+    """
+    with serving_metrics.time_stage("serialization"):
+        return JSONResponse(payload)
+
+def not_ready_error():
+    serving_metrics.count_error("not_ready")
+    return HTTPException(
+        status_code=503,
+        detail="Model is still loading, please retry later",
+        headers={"Retry-After": str(config.PREDICT_RETRY_AFTER_SECONDS)}
+    )
+
+def overloaded_error(e: Overloaded):
+    serving_metrics.count_error("overloaded")
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
 
 @app.post("/predict/")
 async def predict(file: UploadFile = File(...)):
     """
     Predict whether an uploaded image is a cat or a dog.
     """
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    if not ready:
+        raise not_ready_error()
     
     # Validate file
     if not file.content_type.startswith("image/"):
+        serving_metrics.count_error("invalid_content_type")
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    try:
-        start_time = time.time()
-        
-        # Read and preprocess the image
-        contents = await file.read()
+    # Serve the whole request with the model routed to when it arrived
+    with request_route() as (serving, serving_batcher, shadow):
         try:
-            # Try to open the image with PIL, with better error handling
-            image = Image.open(io.BytesIO(contents))
-            # Convert to RGB to ensure compatibility (handles PNG, RGBA, etc.)
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-            processed_image = preprocess_image(image)
-        except Exception as img_error:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Error processing image: {str(img_error)}. Make sure the file is a valid image."
-            )
-        
-        # Make prediction
-        prediction = model.predict(processed_image)[0][0]
-        
-        # Interpret results (sigmoid output: 0 = cat, 1 = dog)
-        is_dog = prediction > 0.5
-        animal_class = "dog" if is_dog else "cat"
-        confidence = float(prediction) if is_dog else float(1 - prediction)
-        
-        # Calculate processing time
-        processing_time = time.time() - start_time
+            start_time = time.time()
+            with serving_metrics.time_stage("upload_read"):
+                contents = await file.read()
+            
+            # Re-uploads of the same image are served from the cache
+            digest = upload_hash(contents)
+            key = cache_key(digest, serving.version)
+            prediction = prediction_cache.get(key)
+            processed_image = None
+            if prediction is None:
+                with preprocess_executor.admit():
+                    # Preprocess the image
+                    try:
+                        processed_image = await preprocess_executor.run(decode_image, contents)
+                    except Exception as img_error:
+                        serving_metrics.count_error("decode_error")
+                        raise HTTPException(
+                            status_code=400, 
+                            detail=f"Error processing image: {str(img_error)}. Make sure the file is a valid image."
+                        )
+                    
+                    # Make prediction (batched together with concurrent requests)
+                    prediction = float((await serving_batcher.submit(processed_image, serving))[0])
+                prediction_cache.put(key, prediction)
+            
+            # Calculate processing time
+            processing_time = time.time() - start_time
+            
+            result = record_prediction(file.filename, prediction, processing_time, serving.version,
+                                       digest, contents)
+            if shadow is not None and processed_image is not None:
+                # Scored by the candidate after the response is built, never awaited
+                shadow.mirror(processed_image, [(result["id"], prediction)])
+            return json_response(result)
         
-        # Store prediction data
-        prediction_data = Prediction(
-            id=f"pred_{len(predictions) + 1}",
-            timestamp=datetime.now().isoformat(),
-            filename=file.filename or "unknown",
-            prediction=animal_class,
-            confidence=confidence,
-            processing_time=processing_time
+        except Overloaded as e:
+            raise overloaded_error(e)
+        except HTTPException:
+            raise
+        except Exception as e:
+            serving_metrics.count_error("internal_error")
+            raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+async def read_batch_items(files: List[UploadFile]):
+    """
+    Flatten uploaded files and archives into a list of (filename, bytes) items.
+    Archive members that fail to extract are reported as per-item errors.
+    """
+    items = []
+    for upload in files:
+        with serving_metrics.time_stage("upload_read"):
+            contents = await upload.read()
+        if is_archive(upload.filename, contents):
+            try:
+                members = await preprocess_executor.run(
+                    extract_images, contents, config.PREDICT_BATCH_MAX_FILES)
+            except Exception as e:
+                items.append((upload.filename, None, f"Error reading archive: {str(e)}"))
+                continue
+            items.extend((name, data, None) for name, data in members)
+        elif upload.content_type and not upload.content_type.startswith("image/"):
+            items.append((upload.filename, None, "File must be an image or a zip/tar archive"))
+        else:
+            items.append((upload.filename, contents, None))
+    return items
+
+async def decode_or_error(contents):
+    """
+    Decode one batch item on the preprocessing pool, returning the exception
+    instead of raising so a bad image does not fail the whole batch.
+    """
+    try:
+        return await preprocess_executor.run(decode_image, contents)
+    except Exception as e:
+        serving_metrics.count_error("decode_error")
+        return e
+
+async def score_items(items, start_time, route):
+    """
+    Serve cached items, decode the rest in parallel, run them through the
+    model in fixed-size batches and record each successful prediction.
+    
+    Args:
+        items: List of (filename, image bytes, error) tuples
+        start_time: When processing of these items started
+        route: (model, batcher, shadow candidate) from request_route()
+    
+    Returns:
+        list: One result per item, in input order
+    """
+    serving, serving_batcher, shadow = route
+    raw_predictions = {}
+    digests = {}
+    keys = {}
+    for i, (_, data, error) in enumerate(items):
+        if error is None:
+            digests[i] = upload_hash(data)
+            keys[i] = cache_key(digests[i], serving.version)
+            cached = prediction_cache.get(keys[i])
+            if cached is not None:
+                raw_predictions[i] = cached
+    
+    # Decode all cache misses in parallel on the preprocessing pool
+    pending = [i for i in keys if i not in raw_predictions]
+    decoded = await asyncio.gather(*[decode_or_error(items[i][1]) for i in pending])
+    
+    errors = [error for _, _, error in items]
+    for error in errors:
+        if error is not None:
+            # Unreadable upload, archive member or stream entry
+            serving_metrics.count_error("invalid_item")
+    arrays = []
+    for i, result in zip(pending, decoded):
+        if isinstance(result, Exception):
+            errors[i] = f"Error processing image: {str(result)}"
+        else:
+            arrays.append((i, result))
+    
+    # Run the valid images through the model in fixed-size batches
+    batch_size = config.PREDICT_MAX_BATCH_SIZE
+    chunks = [arrays[j:j + batch_size] for j in range(0, len(arrays), batch_size)]
+    inputs = [np.concatenate([array for _, array in chunk], axis=0) for chunk in chunks]
+    outputs = await asyncio.gather(*[serving_batcher.submit(chunk_inputs, serving) for chunk_inputs in inputs])
+    
+    for chunk, chunk_outputs in zip(chunks, outputs):
+        for (i, _), value in zip(chunk, chunk_outputs):
+            raw_predictions[i] = float(value)
+            prediction_cache.put(keys[i], raw_predictions[i])
+    
+    # Processing time is amortized over the items that produced a prediction
+    per_item_time = (time.time() - start_time) / max(1, len(raw_predictions))
+    
+    results = []
+    for i, (filename, data, _) in enumerate(items):
+        if i in raw_predictions:
+            result = record_prediction(filename, raw_predictions[i], per_item_time, serving.version,
+                                       digests[i], data)
+            result["filename"] = filename
+        else:
+            result = {"filename": filename, "error": errors[i]}
+        results.append(result)
+    
+    if shadow is not None:
+        # Mirror the freshly scored images to the candidate without waiting for it
+        for chunk, chunk_inputs in zip(chunks, inputs):
+            shadow.mirror(chunk_inputs, [(results[i]["id"], raw_predictions[i]) for i, _ in chunk])
+    return results
+
+@app.post("/predict/batch/")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """
+    Predict a batch of images uploaded as multiple files and/or zip/tar archives.
+    Results are returned in input order; a failing item only fails itself.
+    """
+    if not ready:
+        raise not_ready_error()
+    
+    start_time = time.time()
+    items = await read_batch_items(files)
+    if len(items) > config.PREDICT_BATCH_MAX_FILES:
+        serving_metrics.count_error("batch_too_large")
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.PREDICT_BATCH_MAX_FILES} images can be sent per batch"
         )
-        predictions.append(prediction_data)
-        
-        # Keep only the most recent 100 predictions
-        if len(predictions) > 100:
-            predictions.pop(0)
-        
-        return {
-            "id": prediction_data.id,
-            "prediction": animal_class,
-            "confidence": confidence,
-            "raw_prediction": float(prediction),
-            "processing_time": processing_time
-        }
     
+    try:
+        with preprocess_executor.admit(max(1, min(len(items), preprocess_executor.max_pending))), \
+                request_route() as route:
+            results = await score_items(items, start_time, route)
+    except Overloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+        serving_metrics.count_error("internal_error")
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+    
+    failed = sum(1 for result in results if "error" in result)
+    return json_response({
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "processing_time": time.time() - start_time,
+        "results": results
+    })
+
+async def score_stream_batch(batch):
+    """
+    Score one window of a streaming job. Bulk jobs wait for capacity instead
+    of being rejected, so interactive /predict/ traffic keeps priority.
+    """
+    while True:
+        try:
+            # Clamped like /predict/batch/, or a batch above the admission limit would never fit
+            with preprocess_executor.admit(max(1, min(len(batch), preprocess_executor.max_pending))), \
+                    request_route() as route:
+                return await score_items(batch, time.time(), route)
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+
+def ndjson_line(result):
+    with serving_metrics.time_stage("serialization"):
+        return json.dumps(result) + "\n"
+
+async def stream_predictions(items):
+    """
+    Yield one NDJSON line per item as each batch of the stream finishes.
+    """
+    batch = []
+    async for item in produce_items(items, config.STREAM_WINDOW, stream_executor):
+        batch.append(item)
+        if len(batch) >= config.PREDICT_MAX_BATCH_SIZE:
+            for result in await score_stream_batch(batch):
+                yield ndjson_line(result)
+            batch = []
+    if batch:
+        for result in await score_stream_batch(batch):
+            yield ndjson_line(result)
+
+@app.post("/predict/stream/")
+async def predict_stream(request: Request):
+    """
+    Score a streamed request body and stream the results back as NDJSON.
+    
+    The body is either a tar stream of images (optionally gzipped) or, with a
+    JSON content type, JSONL lines naming images by `path` (relative to
+    STREAM_DATA_ROOT) or `url`. Only a bounded window of images is held in
+    memory at any time.
+    """
+    if not ready:
+        raise not_ready_error()
+    
+    body = io.BufferedReader(AsyncBodyReader(request.stream(), asyncio.get_running_loop()))
+    content_type = request.headers.get("content-type", "")
+    if "json" in content_type:
+        items = iter_jsonl_items(body, config.STREAM_DATA_ROOT, config.STREAM_ALLOW_URLS)
+    else:
+        items = iter_tar_items(body)
+    
+    return DuplexStreamingResponse(stream_predictions(items), media_type="application/x-ndjson")
+
+def parse_timestamp(value, name):
+    """
+    Parse an ISO 8601 query parameter into a Unix timestamp.
+    """
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be an ISO 8601 timestamp")
 
 @app.get("/performance/")
-async def get_performance():
+async def get_performance(since: Optional[str] = None, until: Optional[str] = None):
     """
     Get model performance metrics.
+    
+    Without parameters the metrics cover the in-memory history. With `since`
+    and/or `until` (ISO 8601) they are computed from the prediction log over
+    that time window.
     """
+    if since is not None or until is not None:
+        if prediction_log is None:
+            raise HTTPException(status_code=400, detail="Time windows require the prediction log")
+        window_start = parse_timestamp(since, "since") if since is not None else 0.0
+        window_end = parse_timestamp(until, "until") if until is not None else time.time() + 1
+        summary = await asyncio.get_running_loop().run_in_executor(
+            None, prediction_log.summary, window_start, window_end)
+        if not summary["total_predictions"]:
+            raise HTTPException(status_code=404, detail="No prediction data in this time window")
+        recent_predictions = summary.pop("recent_predictions")
+        return ModelPerformance(**summary, recent_predictions=[Prediction(**p) for p in recent_predictions])
+    
     if not predictions:
         raise HTTPException(status_code=404, detail="No prediction data available yet")
     
-    # Calculate metrics
-    total_predictions = len(predictions)
-    avg_confidence = sum(p.confidence for p in predictions) / total_predictions
-    avg_processing_time = sum(p.processing_time for p in predictions) / total_predictions
-    
-    # Calculate class distribution
-    class_distribution = {}
-    for p in predictions:
-        if p.prediction in class_distribution:
-            class_distribution[p.prediction] += 1
-        else:
-            class_distribution[p.prediction] = 1
-    
-    # Calculate accuracy if ground truth is available
-    accuracy = None
-    predictions_with_ground_truth = [p for p in predictions if p.ground_truth is not None]
-    if predictions_with_ground_truth:
-        correct = sum(1 for p in predictions_with_ground_truth if p.prediction == p.ground_truth)
-        accuracy = correct / len(predictions_with_ground_truth)
-    
-    # Get the 10 most recent predictions
-    recent_predictions = predictions[-10:] if len(predictions) > 10 else predictions
+    # Aggregates are maintained incrementally, so this does not scan the history
+    summary = predictions.summary()
     
     return ModelPerformance(
-        total_predictions=total_predictions,
-        avg_confidence=avg_confidence,
-        avg_processing_time=avg_processing_time,
-        class_distribution=class_distribution,
-        recent_predictions=recent_predictions,
-        accuracy=accuracy
+        **summary,
+        recent_predictions=[Prediction(**p) for p in predictions.recent(10)]
     )
 
 @app.get("/metrics/")
@@ -224,6 +750,222 @@ async def get_metrics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading metrics file: {str(e)}")
 
+@app.get("/prometheus")
+async def get_prometheus_metrics():
+    """
+    Serving metrics in the Prometheus text exposition format.
+    """
+    lines = serving_metrics.render()
+    lines += telemetry.metric_family(
+        "catvsdog_model_info", "gauge", "Loaded model version and inference backend.",
+        [({"model_version": active_model.version if active_model else "",
+           "backend": config.INFERENCE_BACKEND}, 1)])
+    lines += telemetry.metric_family(
+        "catvsdog_ready", "gauge", "1 once the model is loaded and warmed up.", [({}, int(ready))])
+    
+    if batcher is not None:
+        lines += telemetry.histogram_family(
+            "catvsdog_batch_size", "Images per forward pass.", [({}, batcher.batch_size_histogram)])
+        lines += telemetry.histogram_family(
+            "catvsdog_batch_queue_wait_seconds", "Time requests wait for their batch to be dispatched.",
+            [({}, batcher.queue_wait_histogram)])
+        lines += telemetry.metric_family(
+            "catvsdog_batch_queue_depth", "gauge", "Requests waiting for a forward pass.",
+            [({}, batcher.stats()["queue_depth"])])
+    
+    admission = preprocess_executor.stats()
+    lines += telemetry.metric_family(
+        "catvsdog_inflight_images", "gauge", "Images admitted for preprocessing and inference.",
+        [({}, admission["pending"])])
+    lines += telemetry.metric_family(
+        "catvsdog_admission_rejected_total", "counter", "Requests rejected with 503 by admission control.",
+        [({}, admission["rejected"])])
+    
+    cache = prediction_cache.stats()
+    lines += telemetry.metric_family(
+        "catvsdog_cache_entries", "gauge", "Entries in the prediction cache.", [({}, cache["size"])])
+    for counter in ("hits", "misses", "evictions", "expirations"):
+        lines += telemetry.metric_family(
+            f"catvsdog_cache_{counter}_total", "counter", f"Prediction cache {counter}.",
+            [({}, cache[counter])])
+    
+    if prediction_log is not None:
+        log_stats = prediction_log.stats()
+        lines += telemetry.metric_family(
+            "catvsdog_prediction_log_written_total", "counter", "Records committed to the prediction log.",
+            [({}, log_stats["written"])])
+        lines += telemetry.metric_family(
+            "catvsdog_prediction_log_dropped_total", "counter", "Records dropped because the log queue was full.",
+            [({}, log_stats["dropped"])])
+    
+    current = candidate
+    if current is not None:
+        lines += telemetry.metric_family(
+            "catvsdog_candidate_info", "gauge", "Candidate model under evaluation and its mode.",
+            [({"model_version": current.model.version, "mode": current.mode}, 1)])
+        lines += current.comparison.render(current.model.version)
+    
+    return Response("\n".join(lines) + "\n", media_type=telemetry.CONTENT_TYPE)
+
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and its event loop is responsive.
+    Fails only if the model could not be loaded at all, so the pod is restarted.
+    """
+    if startup_error is not None:
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {startup_error}")
+    
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: the model is loaded and warmed up. Also reports how long
+    each startup step took, in seconds from process start.
+    """
+    status = {
+        "status": "ready" if ready else "loading",
+        "backend": config.INFERENCE_BACKEND,
+        "model_version": active_model.version if active_model else None,
+        "startup_seconds": startup_timings
+    }
+    if not ready:
+        raise HTTPException(status_code=503, detail=status)
+    
+    return status
+
+@app.get("/batching/")
+async def get_batching_stats():
+    """
+    Get micro-batching configuration, batch-size and queue-wait histograms.
+    """
+    if batcher is None:
+        raise HTTPException(status_code=500, detail="Inference batcher not started")
+    
+    stats = batcher.stats()
+    stats["admission"] = preprocess_executor.stats()
+    return stats
+
+@app.get("/cache/")
+async def get_cache_stats():
+    """
+    Get prediction cache hit, miss and eviction counters.
+    """
+    stats = prediction_cache.stats()
+    stats["model_version"] = active_model.version if active_model else None
+    return stats
+
+def model_summary(metadata):
+    version = metadata["version"]
+    loaded = [active_model, previous_model, candidate.model if candidate else None]
+    return {
+        **metadata,
+        "active": active_model is not None and active_model.version == version,
+        "candidate": candidate is not None and candidate.model.version == version,
+        "loaded": any(m is not None and m.version == version for m in loaded)
+    }
+
+@app.get("/models/")
+async def list_models():
+    """
+    List the registered model versions with their training metrics.
+    """
+    versions = await asyncio.get_running_loop().run_in_executor(None, model_registry.versions)
+    return {
+        "active": active_model.version if active_model else None,
+        "previous": previous_model.version if previous_model else None,
+        "candidate": candidate.model.version if candidate else None,
+        "versions": [model_summary(metadata) for metadata in versions]
+    }
+
+@app.post("/models/{version}/activate")
+async def activate_model(version: str):
+    """
+    Load and warm up a registered version in the background, then switch
+    traffic to it. Requests in flight finish on the old version.
+    """
+    if not ready:
+        raise not_ready_error()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, model_registry.metadata, version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    
+    try:
+        await deploy_version(version)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading model version {version}: {str(e)}")
+    return {"active": active_model.version, "previous": previous_model.version if previous_model else None}
+
+@app.post("/models/rollback")
+async def rollback_model():
+    """
+    Switch traffic back to the previously active version, which is still
+    loaded, so no model is read from disk.
+    """
+    global active_model, previous_model
+    async with deploy_lock:
+        if previous_model is None:
+            raise HTTPException(status_code=409, detail="No previous model version to roll back to")
+        active_model, previous_model = previous_model, active_model
+        await asyncio.get_running_loop().run_in_executor(None, model_registry.set_active, active_model.version)
+    print(f"Rolled back to model version {active_model.version}")
+    return {"active": active_model.version, "previous": previous_model.version}
+
+@app.post("/models/{version}/candidate")
+async def evaluate_candidate(version: str, request: CandidateRequest):
+    """
+    Load a registered version next to the active model and send it mirrored
+    traffic (shadow) or a share of requests (canary).
+    """
+    if not ready:
+        raise not_ready_error()
+    if request.mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of {list(MODES)}")
+    if request.mode == CANARY and not 0 < request.traffic_percent <= 100:
+        raise HTTPException(status_code=400, detail="traffic_percent must be in (0, 100]")
+    if version == active_model.version:
+        raise HTTPException(status_code=400, detail=f"Model version {version} is already active")
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, model_registry.metadata, version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    
+    try:
+        started = await start_candidate(version, request.mode, request.traffic_percent)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading model version {version}: {str(e)}")
+    return started.report()
+
+@app.get("/models/candidate")
+async def get_candidate():
+    """
+    Compare the candidate with the active model: latency and confidence per
+    model, agreement on mirrored images and accuracy on labeled predictions.
+    """
+    if candidate is None:
+        raise HTTPException(status_code=404, detail="No candidate model is being evaluated")
+    return {"active": active_model.version if active_model else None, **candidate.report()}
+
+@app.delete("/models/candidate")
+async def remove_candidate():
+    """
+    Stop evaluating the candidate. Its final comparison is returned.
+    """
+    stopped = await stop_candidate()
+    if stopped is None:
+        raise HTTPException(status_code=404, detail="No candidate model is being evaluated")
+    return stopped.report()
+
+async def logged_prediction_ids(prediction_ids):
+    """
+    Which of `prediction_ids` are in the prediction log (empty without one).
+    """
+    if prediction_log is None or not prediction_ids:
+        return set()
+    return await asyncio.get_running_loop().run_in_executor(None, prediction_log.known_ids, prediction_ids)
+
 @app.post("/feedback/")
 async def provide_feedback(feedback: FeedbackRequest):
     """
@@ -232,83 +974,211 @@ async def provide_feedback(feedback: FeedbackRequest):
     if feedback.ground_truth not in ["cat", "dog"]:
         raise HTTPException(status_code=400, detail="Ground truth must be 'cat' or 'dog'")
     
-    # Find the prediction by ID
-    for p in predictions:
-        if p.id == feedback.prediction_id:
-            p.ground_truth = feedback.ground_truth
-            return {"message": "Feedback recorded successfully"}
+    # Find the prediction by ID, falling back to the log for older predictions
+    if (predictions.set_ground_truth(feedback.prediction_id, feedback.ground_truth)
+            or await logged_prediction_ids([feedback.prediction_id])):
+        if prediction_log is not None:
+            prediction_log.append_feedback(feedback.prediction_id, feedback.ground_truth)
+        if candidate is not None:
+            candidate.comparison.record_feedback(feedback.prediction_id, feedback.ground_truth)
+        return {"message": "Feedback recorded successfully"}
     
+    if predictions.was_evicted(feedback.prediction_id):
+        raise HTTPException(status_code=404, detail=f"Prediction with ID {feedback.prediction_id} "
+                                                    "is no longer in the prediction history")
     raise HTTPException(status_code=404, detail=f"Prediction with ID {feedback.prediction_id} not found")
 
-async def run_dvc_training(job_id: str, force: bool = False):
+@app.post("/feedback/batch/")
+async def provide_bulk_feedback(request: BulkFeedbackRequest):
     """
-    Run DVC pipeline in the background.
+    Apply many ground truth labels in one request. Labels that cannot be
+    applied are reported back instead of failing the whole request.
     """
-    try:
-        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-        training_jobs[job_id] = {"status": "running", "started_at": datetime.now().isoformat()}
-        
-        # Change to project root directory
-        os.chdir(project_root)
-        
-        # Pull data from DVC remote
-        subprocess.run(["dvc", "pull"], check=True)
-        
-        # Run DVC reproduce with or without force flag
-        if force:
-            subprocess.run(["dvc", "repro", "--force"], check=True)
+    if len(request.feedback) > config.FEEDBACK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {config.FEEDBACK_BATCH_MAX_ITEMS} "
+                                                    "labels per request")
+    
+    invalid, missing, accepted = [], [], []
+    for feedback in request.feedback:
+        if feedback.ground_truth not in ["cat", "dog"]:
+            invalid.append(feedback.prediction_id)
+        elif predictions.set_ground_truth(feedback.prediction_id, feedback.ground_truth):
+            accepted.append(feedback)
         else:
-            subprocess.run(["dvc", "repro"], check=True)
-            
-        # Push changes back to DVC remote
-        subprocess.run(["dvc", "push"], check=True)
-        
-        # Update job status
-        training_jobs[job_id]["status"] = "completed"
-        training_jobs[job_id]["completed_at"] = datetime.now().isoformat()
-        
-        # Reload the model
-        global model
-        model_path = os.path.join(project_root, "ml_part", "checkpoints", "model.h5")
-        model = tf.keras.models.load_model(model_path)
-        
-    except Exception as e:
-        training_jobs[job_id]["status"] = "failed"
-        training_jobs[job_id]["error"] = str(e)
+            missing.append(feedback)
+    
+    # Predictions that left the in-memory history can still be labeled in the log
+    logged = await logged_prediction_ids([feedback.prediction_id for feedback in missing])
+    evicted, not_found = [], []
+    for feedback in missing:
+        if feedback.prediction_id in logged:
+            accepted.append(feedback)
+        elif predictions.was_evicted(feedback.prediction_id):
+            evicted.append(feedback.prediction_id)
+        else:
+            not_found.append(feedback.prediction_id)
+    
+    if prediction_log is not None:
+        for feedback in accepted:
+            prediction_log.append_feedback(feedback.prediction_id, feedback.ground_truth)
+    if candidate is not None:
+        for feedback in accepted:
+            candidate.comparison.record_feedback(feedback.prediction_id, feedback.ground_truth)
+    
+    return {
+        "recorded": len(accepted),
+        "invalid": invalid,
+        "evicted": evicted,
+        "not_found": not_found
+    }
+
+@app.get("/prediction-log/")
+async def get_prediction_log_stats():
+    """
+    Get write statistics of the durable prediction log.
+    """
+    if prediction_log is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_log.stats()}
+
+async def deploy_trained_models():
+    """
+    Swap in the model of every training job that completes while this
+    process runs. The training worker registers the model; each API process
+    deploys it on its own.
+    """
+    loop = asyncio.get_running_loop()
+    since = datetime.now().isoformat()
+    deployed = set()
+    while True:
+        await asyncio.sleep(config.TRAINING_POLL_SECONDS)
+        if not ready:
+            continue
+        try:
+            jobs = await loop.run_in_executor(None, training_queue.completed_since, since)
+            for job in jobs:
+                if job["id"] in deployed:
+                    continue
+                deployed.add(job["id"])
+                if job["model_version"]:
+                    await deploy_version(job["model_version"])
+        except Exception as e:
+            print(f"Error deploying trained model: {str(e)}")
+
+def training_job_status(job):
+    """
+    A queued job as returned by the training endpoints.
+    """
+    status = dict(job)
+    params = status.pop("params")
+    status["force"] = params.get("force", False)
+    status["mode"] = params.get("mode", "full")
+    status["completed_at"] = job["finished_at"] if job["status"] == COMPLETED else None
+    return status
+
+def read_log(path, offset, limit=1 << 20):
+    """
+    Read up to `limit` bytes of a job log from byte `offset`.
+    """
+    if not os.path.exists(path):
+        return b""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(limit)
+
+def read_log_tail(path, lines, max_bytes=1 << 16):
+    """
+    The last `lines` lines of a job log, reading at most its last `max_bytes`.
+    """
+    if lines <= 0 or not os.path.exists(path):
+        return []
+    data = read_log(path, max(0, os.path.getsize(path) - max_bytes), max_bytes)
+    return data.decode(errors="replace").splitlines()[-lines:]
+
+async def get_job_or_404(job_id):
+    job = await asyncio.get_running_loop().run_in_executor(None, training_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    return job
 
 @app.post("/retrain/", response_model=RetrainResponse)
-async def retrain_model(request: RetrainRequest, background_tasks: BackgroundTasks):
+async def retrain_model(request: RetrainRequest):
     """
-    Trigger retraining of the model using DVC pipeline.
-    This is an asynchronous operation that runs in the background.
+    Queue retraining of the model using the DVC pipeline. The training worker
+    runs one job at a time in its own process; a request identical to a job
+    that is already queued or running returns that job.
+    
+    In "incremental" mode the current model is fine-tuned on the labeled
+    production images, falling back to a full retrain if accuracy regresses.
     """
-    job_id = f"train_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if request.mode not in config.TRAINING_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of {list(config.TRAINING_MODES)}")
     
-    # Start training in the background
-    background_tasks.add_task(run_dvc_training, job_id, request.force)
+    job, created = await asyncio.get_running_loop().run_in_executor(
+        None, training_queue.submit, {"force": request.force, "mode": request.mode})
     
-    return RetrainResponse(
-        status="started",
-        job_id=job_id,
-        message="Model retraining started in the background. Check job status endpoint for updates."
-    )
+    if created:
+        message = "Model retraining queued. Check job status endpoint for updates."
+    else:
+        message = f"An identical retraining job is already {job['status']}."
+    return RetrainResponse(status=job["status"], job_id=job["id"], message=message)
 
 @app.get("/training-status/{job_id}")
-async def get_training_status(job_id: str):
+async def get_training_status(job_id: str, log_lines: int = 20):
     """
-    Get the status of a training job.
+    Get the status, progress (step, DVC stage, epoch) and last log lines of a training job.
     """
-    if job_id not in training_jobs:
-        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    job = await get_job_or_404(job_id)
+    status = training_job_status(job)
+    status["log_tail"] = await asyncio.get_running_loop().run_in_executor(
+        None, read_log_tail, training_queue.log_path(job_id), log_lines)
+    return status
+
+@app.get("/training-status/{job_id}/logs")
+async def stream_training_logs(job_id: str, offset: int = 0, follow: bool = True):
+    """
+    Stream a training job's log from byte `offset`. With `follow`, the
+    response stays open and streams new output until the job has finished.
+    """
+    await get_job_or_404(job_id)
+    loop = asyncio.get_running_loop()
+    path = training_queue.log_path(job_id)
+    
+    async def tail():
+        position = max(0, offset)
+        while True:
+            job = await loop.run_in_executor(None, training_queue.get, job_id)
+            chunk = await loop.run_in_executor(None, read_log, path, position)
+            while chunk:
+                position += len(chunk)
+                yield chunk
+                chunk = await loop.run_in_executor(None, read_log, path, position)
+            # The job was looked up before the last read, so no output is lost
+            if not follow or job is None or job["status"] in FINISHED:
+                return
+            await asyncio.sleep(0.5)
     
-    return training_jobs[job_id]
+    return StreamingResponse(tail(), media_type="text/plain")
+
+@app.post("/training-jobs/{job_id}/cancel")
+async def cancel_training_job(job_id: str):
+    """
+    Cancel a training job. A queued job is cancelled right away; the worker
+    stops a running job's DVC process group within a poll interval.
+    """
+    await get_job_or_404(job_id)
+    job = await asyncio.get_running_loop().run_in_executor(None, training_queue.cancel, job_id)
+    if job["status"] in (COMPLETED, FAILED):
+        raise HTTPException(status_code=409, detail=f"Training job {job_id} has already {job['status']}")
+    return training_job_status(job)
 
 @app.get("/training-jobs/")
 async def get_training_jobs():
     """
-    Get all training jobs.
+    Get the 100 most recent training jobs, keyed by job ID.
     """
-    return training_jobs
+    jobs = await asyncio.get_running_loop().run_in_executor(None, training_queue.jobs)
+    return {job["id"]: training_job_status(job) for job in jobs}
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""
+Durable, append-only log of predictions and feedback.
+
+Records are written to SQLite in WAL mode by a background thread that groups
+everything queued within a flush interval into one transaction, so requests
+only pay for a queue put. Reads open their own connection and can run while
+the writer commits.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    filename TEXT,
+    prediction TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    raw_prediction REAL,
+    processing_time REAL NOT NULL,
+    model_version TEXT,
+    upload_sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS predictions_timestamp ON predictions (timestamp);
+CREATE TABLE IF NOT EXISTS feedback (
+    prediction_id TEXT NOT NULL,
+    ground_truth TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feedback_prediction_id ON feedback (prediction_id);
+"""
+
+# Latest label per prediction; feedback rows are never updated in place.
+# SQLite returns the ground_truth of the row holding MAX(rowid).
+LATEST_FEEDBACK = "SELECT prediction_id, ground_truth, MAX(rowid) FROM feedback GROUP BY prediction_id"
+
+PREDICTION_COLUMNS = ("id", "timestamp", "filename", "prediction", "confidence", "raw_prediction",
+                      "processing_time", "model_version", "upload_sha256")
+
+
+class PredictionLog:
+    """
+    Append-only SQLite log with group-committed writes.
+
+    Args:
+        path: SQLite database file
+        flush_interval_ms: How long the writer collects records before committing
+        max_pending: Queued records beyond which new records are dropped
+        upload_dir: If set, upload bytes are stored there by SHA-256 so labeled
+            predictions can be turned into training data
+    """
+
+    def __init__(self, path: str, flush_interval_ms: float = 200, max_pending: int = 10000,
+                 upload_dir: Optional[str] = None):
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self.upload_dir = upload_dir
+        self.written = 0
+        self.commits = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Flush everything queued so far and stop the writer.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Never block a request on the disk; the gap shows up in stats()
+            self.dropped += 1
+
+    def append_prediction(self, record: Dict, contents: Optional[bytes] = None):
+        """
+        Queue a prediction record (keys as in PREDICTION_COLUMNS). `contents`
+        is only kept when an upload directory is configured.
+        """
+        self._enqueue(("prediction", record, contents if self.upload_dir else None))
+
+    def append_feedback(self, prediction_id: str, ground_truth: str, timestamp: Optional[float] = None):
+        self._enqueue(("feedback", (prediction_id, ground_truth, timestamp or time.time()), None))
+
+    def _run(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            # Group commit: collect whatever arrives within the flush interval
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(conn, batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error writing prediction log: {str(e)}")
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List):
+        predictions = []
+        feedback = []
+        for kind, payload, contents in batch:
+            if kind == "prediction":
+                predictions.append(tuple(payload.get(column) for column in PREDICTION_COLUMNS))
+                if contents is not None and payload.get("upload_sha256"):
+                    self._store_upload(payload["upload_sha256"], contents)
+            else:
+                feedback.append(payload)
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO predictions ({', '.join(PREDICTION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(PREDICTION_COLUMNS))})", predictions)
+            conn.executemany("INSERT INTO feedback VALUES (?, ?, ?)", feedback)
+        self.written += len(batch)
+        self.commits += 1
+
+    def upload_path(self, sha256: str) -> str:
+        return os.path.join(self.upload_dir, sha256[:2], sha256)
+
+    def _store_upload(self, sha256: str, contents: bytes):
+        path = self.upload_path(sha256)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+
+    def recent(self, limit: int) -> List[Dict]:
+        """
+        The `limit` most recent predictions with their latest label, oldest first.
+        Used to restore the in-memory history after a restart.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT p.id, p.timestamp, p.filename, p.prediction, p.confidence, "
+                f"p.processing_time, p.model_version, l.ground_truth FROM predictions p "
+                f"LEFT JOIN ({LATEST_FEEDBACK}) l ON l.prediction_id = p.id "
+                f"ORDER BY p.rowid DESC LIMIT ?", (limit,)).fetchall()
+        keys = ("id", "timestamp", "filename", "prediction", "confidence", "processing_time",
+                "model_version", "ground_truth")
+        return [dict(zip(keys, row)) for row in reversed(rows)]
+
+    def known_ids(self, prediction_ids: Iterable[str]) -> Set[str]:
+        """
+        Which of `prediction_ids` have been written to the log.
+        """
+        prediction_ids = list(prediction_ids)
+        found = set()
+        with closing(self._connect()) as conn:
+            # Stay below SQLite's limit on bound parameters
+            for i in range(0, len(prediction_ids), 500):
+                chunk = prediction_ids[i:i + 500]
+                rows = conn.execute(f"SELECT id FROM predictions WHERE id IN ({', '.join('?' * len(chunk))})",
+                                    chunk).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def summary(self, since: float, until: float, recent: int = 10) -> Dict:
+        """
+        Aggregates over the predictions logged in [since, until), in the
+        same shape as PredictionHistory.summary() plus the most recent records.
+        """
+        window = "p.timestamp >= ? AND p.timestamp < ?"
+        with closing(self._connect()) as conn:
+            total, avg_confidence, avg_processing_time = conn.execute(
+                f"SELECT COUNT(*), AVG(confidence), AVG(processing_time) FROM predictions p WHERE {window}",
+                (since, until)).fetchone()
+            class_distribution = dict(conn.execute(
+                f"SELECT prediction, COUNT(*) FROM predictions p WHERE {window} GROUP BY prediction",
+                (since, until)).fetchall())
+            labeled, correct = conn.execute(
+                f"SELECT COUNT(*), SUM(p.prediction = l.ground_truth) FROM predictions p "
+                f"JOIN ({LATEST_FEEDBACK}) l ON l.prediction_id = p.id WHERE {window}",
+                (since, until)).fetchone()
+            rows = conn.execute(
+                f"SELECT p.id, p.timestamp, p.filename, p.prediction, p.confidence, p.processing_time, "
+                f"p.model_version, l.ground_truth FROM predictions p "
+                f"LEFT JOIN ({LATEST_FEEDBACK}) l ON l.prediction_id = p.id "
+                f"WHERE {window} ORDER BY p.timestamp DESC LIMIT ?", (since, until, recent)).fetchall()
+        keys = ("id", "timestamp", "filename", "prediction", "confidence", "processing_time",
+                "model_version", "ground_truth")
+        recent_predictions = []
+        for row in reversed(rows):
+            record = dict(zip(keys, row))
+            record["timestamp"] = datetime.fromtimestamp(record["timestamp"]).isoformat()
+            recent_predictions.append(record)
+        return {
+            "total_predictions": total,
+            "avg_confidence": avg_confidence or 0.0,
+            "avg_processing_time": avg_processing_time or 0.0,
+            "class_distribution": class_distribution,
+            "accuracy": correct / labeled if labeled else None,
+            "recent_predictions": recent_predictions,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "store_uploads": self.upload_dir is not None,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "commits": self.commits,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
@@ -0,0 +1,174 @@
+"""
+Local registry of versioned serving models.
+
+Each trained model is copied into `<root>/<version>/` together with a
+metadata.json holding its training metrics, where the version is a short
+content hash of the served artifact. The ACTIVE file names the version the
+API serves, so a rollback survives restarts.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.inference import ARTIFACTS, BACKENDS
+
+
+def file_version(path: str) -> str:
+    """
+    Short content hash of a model file.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:12]
+
+
+class LoadedModel:
+    """
+    An inference backend loaded from the registry, with its version and metadata.
+    """
+
+    def __init__(self, version: str, backend, metadata: Dict):
+        self.version = version
+        self.backend = backend
+        self.metadata = metadata
+
+    @property
+    def path(self) -> str:
+        return self.backend.path
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.backend.predict(batch)
+
+    def warm_up(self, input_shape):
+        """
+        Run a dummy batch so graph tracing / tensor allocation happen before traffic.
+        """
+        self.predict(np.zeros((1,) + tuple(input_shape), dtype=np.uint8))
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts for one inference backend.
+
+    Args:
+        root: Registry directory
+        backend_name: Inference backend (keras, tflite, onnx or tflite_int8)
+    """
+
+    def __init__(self, root: str, backend_name: str):
+        self.root = root
+        self.backend_name = backend_name
+
+    @property
+    def artifact_name(self) -> str:
+        """
+        Raises:
+            ValueError: If the backend name is unknown
+        """
+        if self.backend_name not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{self.backend_name}', "
+                             f"expected one of {sorted(BACKENDS)}")
+        return os.path.basename(ARTIFACTS[self.backend_name])
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    def artifact_path(self, version: str) -> str:
+        return os.path.join(self._version_dir(version), self.artifact_name)
+
+    def register(self, model_dir: str, source: str = "checkpoint") -> str:
+        """
+        Copy the backend's artifact from `model_dir` (ml_part) into the
+        registry, with metrics.json as metadata. Registering the same model
+        twice returns the existing version.
+
+        Returns:
+            str: The model version
+
+        Raises:
+            ValueError: If the backend name is unknown
+            RuntimeError: If the artifact has not been exported
+        """
+        artifact_name = self.artifact_name
+        artifact = os.path.join(model_dir, ARTIFACTS[self.backend_name])
+        if not os.path.exists(artifact):
+            raise RuntimeError(f"Model file not found at {artifact}")
+        version = file_version(artifact)
+        if os.path.exists(os.path.join(self._version_dir(version), "metadata.json")):
+            return version
+
+        metrics_path = os.path.join(model_dir, "metrics.json")
+        metrics = None
+        if os.path.exists(metrics_path):
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+
+        # Build the version in a temporary directory so a crash never leaves a half-registered model
+        tmp_dir = self._version_dir(f".{version}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        shutil.copy2(artifact, os.path.join(tmp_dir, artifact_name))
+        metadata = {
+            "version": version,
+            "backend": self.backend_name,
+            "artifact": artifact_name,
+            "registered_at": datetime.now().isoformat(),
+            "source": source,
+            "metrics": metrics,
+        }
+        with open(os.path.join(tmp_dir, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=4)
+        os.replace(tmp_dir, self._version_dir(version))
+        return version
+
+    def metadata(self, version: str) -> Dict:
+        path = os.path.join(self._version_dir(version), "metadata.json")
+        if not os.path.exists(path):
+            raise KeyError(version)
+        with open(path) as f:
+            return json.load(f)
+
+    def versions(self) -> List[Dict]:
+        """
+        Metadata of every registered version, oldest first.
+        """
+        versions = []
+        if not os.path.isdir(self.root):
+            return versions
+        for name in os.listdir(self.root):
+            if not name.startswith(".") and os.path.isdir(self._version_dir(name)):
+                try:
+                    versions.append(self.metadata(name))
+                except KeyError:
+                    continue
+        return sorted(versions, key=lambda m: m["registered_at"])
+
+    def active(self) -> Optional[str]:
+        path = os.path.join(self.root, "ACTIVE")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().strip() or None
+
+    def set_active(self, version: str):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, ".ACTIVE.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, "ACTIVE"))
+
+    def load(self, version: str, num_threads: int = 0) -> LoadedModel:
+        """
+        Load a registered version with the registry's inference backend.
+        """
+        metadata = self.metadata(version)
+        backend = BACKENDS[self.backend_name](self.artifact_path(version), num_threads)
+        return LoadedModel(version, backend, metadata)
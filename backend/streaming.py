@@ -0,0 +1,185 @@
+"""
+Streaming input for bulk scoring jobs.
+
+A request body (tar stream or JSONL list of paths/URLs) is parsed on a
+producer thread and handed to the event loop through a bounded queue, so only
+a fixed window of images is held in memory however large the input is.
+"""
+
+import asyncio
+import io
+import json
+import os
+import tarfile
+import threading
+import urllib.request
+from concurrent.futures import Executor
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+from backend.archives import is_image_name
+
+# (name, image bytes, error) - exactly one of bytes/error is set
+StreamItem = Tuple[str, Optional[bytes], Optional[str]]
+
+
+class AsyncBodyReader(io.RawIOBase):
+    """
+    Blocking file-like view over an async byte stream.
+    Must be read from a thread other than the event loop's.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._stream = stream
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            future = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop)
+            chunk = future.result()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that streams while the request body is still being read.
+
+    The stock response listens for client disconnects by consuming request
+    messages, which would steal body chunks from the producer. A disconnect is
+    still noticed here, through the body stream or a failing send.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def iter_tar_items(fileobj) -> Iterator[StreamItem]:
+    """
+    Yield image members of a (optionally compressed) tar stream, in order.
+    """
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and is_image_name(member.name):
+                yield member.name, archive.extractfile(member).read(), None
+
+
+def read_jsonl_item(line: str, line_number: int, data_root: str, allow_urls: bool) -> StreamItem:
+    """
+    Resolve one JSONL line to image bytes.
+
+    A line is either a JSON string or an object with a `path` or `url` key.
+    Paths are resolved against `data_root` and may not escape it. Items are
+    named by their path or URL, or "line <n>" when the line names neither.
+    """
+    name = f"line {line_number}"
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        return name, None, f"Invalid JSON: {str(e)}"
+    if isinstance(entry, str):
+        entry = {"url": entry} if entry.startswith(("http://", "https://")) else {"path": entry}
+    if not isinstance(entry, dict) or not isinstance(entry.get("url", entry.get("path")), str):
+        return name, None, "Each line must be a JSON string or an object with 'path' or 'url'"
+
+    if "url" in entry:
+        url = entry["url"]
+        if not allow_urls:
+            return url, None, "Fetching URLs is disabled (set STREAM_ALLOW_URLS=true)"
+        if not url.startswith(("http://", "https://")):
+            return url, None, "Only http(s) URLs are supported"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                return url, response.read(), None
+        except Exception as e:
+            return url, None, f"Error reading item: {str(e)}"
+
+    path = entry["path"]
+    root = os.path.realpath(data_root)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root:
+        return path, None, f"Path must be inside {data_root}"
+    try:
+        with open(full_path, "rb") as f:
+            return path, f.read(), None
+    except OSError as e:
+        return path, None, f"Error reading item: {str(e)}"
+
+
+def iter_jsonl_items(fileobj, data_root: str, allow_urls: bool) -> Iterator[StreamItem]:
+    """
+    Yield one item per non-empty JSONL line; unreadable entries become errors
+    named like the item (see read_jsonl_item), never by the raw line.
+    """
+    for line_number, line in enumerate(io.TextIOWrapper(fileobj, encoding="utf-8"), 1):
+        line = line.strip()
+        if line:
+            yield read_jsonl_item(line, line_number, data_root, allow_urls)
+
+
+async def produce_items(items: Iterator[StreamItem], window: int,
+                        executor: Executor) -> AsyncIterator[StreamItem]:
+    """
+    Drain a blocking item iterator on a thread of `executor`, holding at most
+    `window` items in memory, and yield them on the event loop. The producer
+    holds its thread for the whole stream, so `executor` should be reserved
+    for streams rather than the loop's default executor.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, window))
+    done = object()
+    stopped = threading.Event()
+
+    def put(item):
+        # Block the producer while the window is full, but notice when the
+        # consumer has gone away so the thread does not hang forever
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while not stopped.is_set():
+            try:
+                future.result(timeout=1)
+                return
+            except TimeoutError:
+                continue
+        future.cancel()
+
+    def run():
+        try:
+            for item in items:
+                if stopped.is_set():
+                    return
+                put(item)
+        except Exception as e:
+            put(("<stream>", None, f"Error reading request body: {str(e)}"))
+        finally:
+            put(done)
+
+    producer = loop.run_in_executor(executor, run)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stopped.set()
+        await producer
@@ -0,0 +1,113 @@
+"""
+Prometheus metrics for the serving API.
+
+The API does not depend on prometheus_client; metric families are rendered
+directly in the Prometheus text exposition format (version 0.0.4). Histograms
+use the cumulative `Histogram` from batching.py, so the micro-batcher's own
+histograms are exported as they are.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from backend.batching import Histogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stages of a prediction, in pipeline order
+STAGES = ("upload_read", "decode", "preprocess", "inference", "serialization")
+STAGE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def metric_family(name: str, metric_type: str, help_text: str, samples: Samples) -> List[str]:
+    """
+    Render a counter or gauge family as exposition lines.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+    return lines
+
+
+def histogram_family(name: str, help_text: str,
+                     histograms: Iterable[Tuple[Dict[str, str], Histogram]]) -> List[str]:
+    """
+    Render cumulative histograms (one per label set) as exposition lines.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in histograms:
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {count}")
+        lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum)}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return lines
+
+
+class ServingMetrics:
+    """
+    Stage latencies, prediction counts per class and errors by type.
+    Safe to update from the event loop and from worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_histograms = {stage: Histogram(STAGE_BUCKETS) for stage in STAGES}
+        self.predictions: Dict[Tuple[str, str], int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_histograms[stage].observe(seconds)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def count_prediction(self, label: str, model_version: str):
+        with self._lock:
+            key = (label, model_version or "")
+            self.predictions[key] = self.predictions.get(key, 0) + 1
+
+    def count_error(self, error_type: str):
+        with self._lock:
+            self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            lines = histogram_family(
+                "catvsdog_stage_duration_seconds",
+                "Time spent per prediction pipeline stage (inference is per forward pass).",
+                [({"stage": stage}, histogram) for stage, histogram in self.stage_histograms.items()])
+            lines += metric_family(
+                "catvsdog_predictions_total", "counter", "Predictions served, by class and model version.",
+                [({"class": label, "model_version": version}, count)
+                 for (label, version), count in sorted(self.predictions.items())])
+            lines += metric_family(
+                "catvsdog_errors_total", "counter", "Failed requests and items, by error type.",
+                [({"type": error_type}, count) for error_type, count in sorted(self.errors.items())])
+        return lines
@@ -32,12 +32,18 @@ def test_retrain():
                 status = status_response.json()
                 print(f"Current status: {status.get('status')}")
                 
+                if status.get("progress"):
+                    print(f"Progress: {status.get('progress')}")
+                
                 if status.get("status") == "completed":
-                    print("Training completed successfully!")
+                    print(f"Training completed successfully! Model version: {status.get('model_version')}")
                     break
                 elif status.get("status") == "failed":
                     print(f"Training failed: {status.get('error')}")
                     break
+                elif status.get("status") == "cancelled":
+                    print("Training was cancelled")
+                    break
             else:
                 print(f"Failed to get status: {status_response.text}")
     else:
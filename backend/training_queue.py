@@ -0,0 +1,210 @@
+"""
+Persistent queue of retraining jobs.
+
+The API enqueues jobs and the training worker (training_worker.py) claims
+and runs them, one at a time, in a separate process. Jobs live in a SQLite
+database so they survive restarts of either side; each job's output is
+appended to its own log file. A running job's worker renews a heartbeat
+lease on it; a job whose lease expires is requeued. Leases only rely on the
+shared database, so they work across containers and PID namespaces.
+"""
+
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    progress TEXT,
+    error TEXT,
+    model_version TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    heartbeat_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+JOB_COLUMNS = ("id", "params", "status", "created_at", "started_at", "finished_at", "progress", "error",
+               "model_version", "cancel_requested", "worker_pid", "heartbeat_at")
+
+
+class TrainingQueue:
+    """
+    SQLite-backed job queue shared by the API and the training worker.
+
+    Args:
+        path: SQLite database file
+        log_dir: Directory holding one log file per job
+        journal_mode: SQLite journal mode; WAL needs every process on one host,
+            "delete" also works on a volume shared by several pods
+    """
+
+    def __init__(self, path: str, log_dir: str, journal_mode: str = "wal"):
+        self.path = path
+        self.log_dir = log_dir
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        os.makedirs(log_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            conn.executescript(SCHEMA)
+            # Databases created before heartbeat leases
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; multi-statement updates take the write lock with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _job(row) -> Dict:
+        job = dict(zip(JOB_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _select(self, conn: sqlite3.Connection, where: str, args=()) -> List[Dict]:
+        rows = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE {where}", args).fetchall()
+        return [self._job(row) for row in rows]
+
+    def log_path(self, job_id: str) -> str:
+        return os.path.join(self.log_dir, f"{job_id}.log")
+
+    def submit(self, params: Dict) -> Tuple[Dict, bool]:
+        """
+        Queue a job, unless one with identical parameters is already queued or running.
+
+        Returns:
+            tuple: The job and whether it was newly created
+        """
+        encoded = json.dumps(params, sort_keys=True)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._select(conn, "params = ? AND status IN (?, ?) ORDER BY rowid LIMIT 1",
+                                        (encoded, QUEUED, RUNNING))
+                if existing:
+                    conn.execute("COMMIT")
+                    return existing[0], False
+                job_id = f"train_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+                conn.execute("INSERT INTO jobs (id, params, status, created_at) VALUES (?, ?, ?, ?)",
+                             (job_id, encoded, QUEUED, datetime.now().isoformat()))
+                job = self._select(conn, "id = ?", (job_id,))[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job, True
+
+    def claim(self, worker_pid: int) -> Optional[Dict]:
+        """
+        Mark the oldest queued job as running, unless a job is already running.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._select(conn, "status = ?", (RUNNING,)):
+                    conn.execute("COMMIT")
+                    return None
+                queued = self._select(conn, "status = ? ORDER BY rowid LIMIT 1", (QUEUED,))
+                if not queued:
+                    conn.execute("COMMIT")
+                    return None
+                now = datetime.now().isoformat()
+                conn.execute("UPDATE jobs SET status = ?, started_at = ?, worker_pid = ?, heartbeat_at = ? "
+                             "WHERE id = ?", (RUNNING, now, worker_pid, now, queued[0]["id"]))
+                job = self._select(conn, "id = ?", (queued[0]["id"],))[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def heartbeat(self, job_id: str):
+        """
+        Renew the running job's lease.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                         (datetime.now().isoformat(), job_id, RUNNING))
+
+    def requeue_orphaned(self, lease_seconds: float) -> List[str]:
+        """
+        Put running jobs whose worker has not renewed the lease for
+        `lease_seconds` back in the queue.
+        """
+        expired = (datetime.now() - timedelta(seconds=lease_seconds)).isoformat()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                orphaned = [job["id"] for job in self._select(
+                    conn, "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)", (RUNNING, expired))]
+                for job_id in orphaned:
+                    conn.execute("UPDATE jobs SET status = ?, started_at = NULL, worker_pid = NULL, progress = NULL, "
+                                 "heartbeat_at = NULL WHERE id = ?", (QUEUED, job_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return orphaned
+
+    def update_progress(self, job_id: str, progress: Dict):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None, model_version: Optional[str] = None):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ?, model_version = ? WHERE id = ?",
+                         (status, datetime.now().isoformat(), error, model_version, job_id))
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a queued job right away, or ask the worker to stop a running one.
+
+        Returns:
+            dict: The updated job, or None if it does not exist
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                         (CANCELLED, datetime.now().isoformat(), job_id, QUEUED))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+            jobs = self._select(conn, "id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            jobs = self._select(conn, "id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def jobs(self, limit: int = 100) -> List[Dict]:
+        """
+        The `limit` most recently created jobs, newest first.
+        """
+        with closing(self._connect()) as conn:
+            return self._select(conn, "1 ORDER BY rowid DESC LIMIT ?", (limit,))
+
+    def completed_since(self, since: str) -> List[Dict]:
+        """
+        Jobs that completed at or after the ISO timestamp `since`, oldest first.
+        """
+        with closing(self._connect()) as conn:
+            return self._select(conn, "status = ? AND finished_at >= ? ORDER BY finished_at", (COMPLETED, since))
@@ -0,0 +1,210 @@
+"""
+Training worker: runs queued retraining jobs outside the serving process.
+
+Jobs are taken from the persistent training queue one at a time. Each job
+runs `dvc pull`, `dvc repro` and `dvc push` as subprocesses at a lowered
+CPU priority, appends their output to the job's log and reports the current
+step, DVC stage and epoch as progress. A trained model is registered in the
+model registry; the API picks it up from the finished job and swaps it in.
+
+Run from the project root, with the API's training queue and model registry
+(or as the training-worker container built from Dockerfile.worker):
+    python -m backend.training_worker
+"""
+
+import argparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml_part import config
+from backend.registry import ModelRegistry
+from backend.training_queue import CANCELLED, COMPLETED, FAILED, TrainingQueue
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODEL_DIR = os.path.join(PROJECT_ROOT, "ml_part")
+
+# Progress reported from the subprocess output
+STAGE_PATTERN = re.compile(r"Running stage '([^']+)'")
+EPOCH_PATTERN = re.compile(r"Epoch (\d+)/(\d+)")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def training_steps(params):
+    """
+    Commands of a retraining job, as (step name, argv) pairs.
+    """
+    repro = ["dvc", "repro", "--force"] if params.get("force") else ["dvc", "repro"]
+    return [("pull", ["dvc", "pull"]), ("repro", repro), ("push", ["dvc", "push"])]
+
+
+def training_env(params):
+    """
+    Environment of a retraining job's steps; the train stage reads the
+    training mode from it.
+    """
+    return {**os.environ, "TRAINING_MODE": params.get("mode", "full")}
+
+
+class Heartbeat(threading.Thread):
+    """
+    Renews a running job's lease in the queue until stopped, so other
+    workers do not requeue it.
+    """
+
+    def __init__(self, queue, job_id, interval):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.queue.heartbeat(self.job_id)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class StepOutput(threading.Thread):
+    """
+    Copies a subprocess's output to the job log and tracks the DVC stage
+    and training epoch it reports.
+    """
+
+    def __init__(self, stream, log, on_progress):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.log = log
+        self.on_progress = on_progress
+
+    def run(self):
+        # Universal newlines also split Keras' carriage-return progress bars
+        for line in self.stream:
+            self.log.write(line if line.endswith("\n") else line + "\n")
+            self.log.flush()
+            stage = STAGE_PATTERN.search(line)
+            if stage:
+                self.on_progress(stage=stage.group(1), epoch=None)
+            epoch = EPOCH_PATTERN.search(line)
+            if epoch:
+                self.on_progress(epoch=f"{epoch.group(1)}/{epoch.group(2)}")
+
+
+def stop_process_group(process, grace_seconds):
+    """
+    SIGTERM the step's process group, then SIGKILL it after `grace_seconds`.
+    """
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace_seconds)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def run_step(queue, job_id, command, env, log, on_progress, poll_seconds):
+    """
+    Run one step, polling for cancellation while it runs.
+
+    Raises:
+        JobCancelled: If the job was cancelled
+        subprocess.CalledProcessError: If the command failed
+    """
+    # Own process group, so cancelling also stops the stage scripts DVC starts
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1, start_new_session=True)
+    output = StepOutput(process.stdout, log, on_progress)
+    output.start()
+    while process.poll() is None:
+        if queue.get(job_id)["cancel_requested"]:
+            stop_process_group(process, config.TRAINING_CANCEL_GRACE_SECONDS)
+            output.join()
+            raise JobCancelled()
+        time.sleep(poll_seconds)
+    output.join()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def run_job(queue, job, poll_seconds):
+    """
+    Run a claimed job to completion, failure or cancellation.
+    """
+    job_id = job["id"]
+    steps = training_steps(job["params"])
+    env = training_env(job["params"])
+    progress = {"step": None, "step_index": 0, "steps": len(steps), "stage": None, "epoch": None}
+
+    def on_progress(**changes):
+        if any(progress.get(key) != value for key, value in changes.items()):
+            progress.update(changes)
+            queue.update_progress(job_id, progress)
+
+    heartbeat = Heartbeat(queue, job_id, config.TRAINING_LEASE_SECONDS / 4)
+    heartbeat.start()
+    try:
+        with open(queue.log_path(job_id), "a") as log:
+            for index, (step, command) in enumerate(steps, 1):
+                on_progress(step=step, step_index=index, stage=None, epoch=None)
+                log.write(f"==== [{index}/{len(steps)}] {' '.join(command)} ====\n")
+                log.flush()
+                run_step(queue, job_id, command, env, log, on_progress, poll_seconds)
+
+            on_progress(step="register", stage=None, epoch=None)
+            registry = ModelRegistry(config.MODEL_REGISTRY_DIR, config.INFERENCE_BACKEND)
+            version = registry.register(MODEL_DIR, source=job_id)
+            log.write(f"Registered model version {version}\n")
+        queue.finish(job_id, COMPLETED, model_version=version)
+        print(f"Job {job_id} completed (model version {version})")
+    except JobCancelled:
+        queue.finish(job_id, CANCELLED)
+        print(f"Job {job_id} cancelled")
+    except Exception as e:
+        queue.finish(job_id, FAILED, error=str(e))
+        print(f"Job {job_id} failed: {str(e)}")
+    finally:
+        heartbeat.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run queued retraining jobs')
+    parser.add_argument('--queue', default=config.TRAINING_QUEUE_PATH, help='Training queue database')
+    parser.add_argument('--logs', default=config.TRAINING_LOG_DIR, help='Directory for job logs')
+    parser.add_argument('--poll', type=float, default=config.TRAINING_POLL_SECONDS,
+                        help='Seconds between queue and cancellation checks')
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+    args = parser.parse_args()
+
+    # Training yields the CPU to serving processes on the same machine
+    os.nice(config.TRAINING_WORKER_NICE)
+    queue = TrainingQueue(args.queue, args.logs, config.TRAINING_QUEUE_JOURNAL_MODE)
+    print(f"Training worker {os.getpid()} watching {args.queue}")
+
+    while True:
+        for job_id in queue.requeue_orphaned(config.TRAINING_LEASE_SECONDS):
+            print(f"Requeued job {job_id}, its worker stopped renewing the lease")
+        job = queue.claim(os.getpid())
+        if job is not None:
+            print(f"Running job {job['id']} ({job['params']})")
+            run_job(queue, job, args.poll)
+        elif args.once:
+            return
+        else:
+            time.sleep(args.poll)
+
+
+if __name__ == "__main__":
+    main()
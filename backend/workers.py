@@ -0,0 +1,72 @@
+"""
+Executor layer keeping blocking image work off the asyncio event loop.
+
+Decode and preprocessing run on a bounded thread pool; inference runs on the
+micro-batcher's dedicated worker thread. Admission control caps the number of
+in-flight requests so an overloaded pod sheds load instead of queueing forever.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted because the pipeline is full.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class PreprocessExecutor:
+    """
+    Bounded thread pool for decode/preprocess plus in-flight admission control.
+
+    Args:
+        max_workers: Number of decode/preprocess threads
+        max_pending: Maximum number of requests admitted at the same time
+        retry_after: Seconds a rejected client is told to wait before retrying
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 64, retry_after: int = 1):
+        self.max_pending = max(1, max_pending)
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                        thread_name_prefix="preprocess")
+
+    @contextmanager
+    def admit(self, n: int = 1):
+        """
+        Reserve `n` pipeline slots for the duration of the block.
+        Only called from the event loop thread, so no locking is needed.
+        """
+        if self.pending + n > self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        self.pending += n
+        try:
+            yield
+        finally:
+            self.pending -= n
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run a blocking function on the preprocessing pool.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
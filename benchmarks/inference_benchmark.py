@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+CPU benchmark of the serving inference backends (keras, tflite, onnx, tflite_int8).
+
+For each backend whose artifact has been exported, runs
+forward passes at several batch sizes and reports p50/p99 latency and
+throughput, plus the largest output difference from the first backend
+(keras by default) on the same inputs. Use --cpus to pin the process to as
+many cores as a backend pod gets (k8s/backend-deployment.yaml limits it to
+1 CPU).
+
+Run from the project root: python benchmarks/inference_benchmark.py --cpus 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml_part import config
+from backend.inference import ARTIFACTS, load_backend
+
+MODEL_DIR = "ml_part"
+
+
+def benchmark_backend(backend, batch_sizes, iterations, rng):
+    """
+    Time `iterations` forward passes per batch size.
+    """
+    results = {}
+    for batch_size in batch_sizes:
+        batch = rng.integers(0, 256, size=(batch_size, config.IMG_HEIGHT, config.IMG_WIDTH,
+                                           config.CHANNELS), dtype=np.uint8)
+        backend.predict(batch)  # warm up (graph tracing, tensor allocation)
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            backend.predict(batch)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies)
+        results[str(batch_size)] = {
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000),
+            "throughput_images_per_sec": float(batch_size * iterations / latencies.sum()),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark serving inference backends')
+    parser.add_argument('--backends', default=','.join(ARTIFACTS),
+                        help='Comma-separated backends to benchmark')
+    parser.add_argument('--batch-sizes', default='1,8,16', help='Comma-separated batch sizes')
+    parser.add_argument('--iterations', type=int, default=50, help='Timed passes per batch size')
+    parser.add_argument('--cpus', type=int, default=0, help='Pin to this many cores (0 = all)')
+    parser.add_argument('--threads', type=int, default=0, help='Runtime intra-op threads (0 = default)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.cpus:
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:args.cpus])
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    rng = np.random.default_rng(config.RANDOM_SEED)
+    check_batch = rng.integers(0, 256, size=(8, config.IMG_HEIGHT, config.IMG_WIDTH, config.CHANNELS),
+                               dtype=np.uint8)
+
+    report = {"cpus": len(os.sched_getaffinity(0)), "threads": args.threads, "backends": {}}
+    reference = None
+    for name in args.backends.split(','):
+        try:
+            backend = load_backend(name, MODEL_DIR, args.threads)
+        except (RuntimeError, ImportError) as e:
+            print(f"Skipping {name}: {e}")
+            continue
+
+        outputs = backend.predict(check_batch)
+        if reference is None:
+            # The first backend that loads (keras by default) is the reference
+            reference = outputs
+            report["reference_backend"] = name
+        result = {
+            "artifact": backend.path,
+            "artifact_mb": os.path.getsize(backend.path) / 1e6,
+            "max_abs_diff_vs_reference": float(np.max(np.abs(outputs - reference))),
+            "batch_sizes": benchmark_backend(backend, batch_sizes, args.iterations, rng),
+        }
+        report["backends"][name] = result
+
+        for batch_size, stats in result["batch_sizes"].items():
+            print(f"{name:>7} batch {batch_size:>3}: p50 {stats['p50_ms']:.1f} ms, "
+                  f"p99 {stats['p99_ms']:.1f} ms, {stats['throughput_images_per_sec']:.0f} images/sec")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
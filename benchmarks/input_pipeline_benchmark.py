@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of the training input pipeline.
+
+Measures augmented training images/sec over whole epochs for the legacy
+ImageDataGenerator.flow_from_directory pipeline and for ml_part/input_pipeline.py,
+both decoding the image files with tf.data and streaming the preprocessed
+NPY shard cache. The first tf.data epoch over image files includes decoding;
+later epochs read the decoded images from the tf.data cache.
+
+Run from the project root after the preprocess stage:
+    python benchmarks/input_pipeline_benchmark.py --epochs 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'ml_part')))
+import config
+import dataset_cache
+import input_pipeline
+
+
+def image_data_generator():
+    """
+    The previous training pipeline (ImageDataGenerator with Python-side augmentation).
+    """
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    datagen = ImageDataGenerator(
+        rescale=1./255,
+        rotation_range=20,
+        width_shift_range=0.2,
+        height_shift_range=0.2,
+        shear_range=0.2,
+        zoom_range=0.2,
+        horizontal_flip=True,
+        validation_split=config.VALIDATION_SPLIT
+    )
+    return datagen.flow_from_directory(
+        config.TRAIN_DIR,
+        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
+        batch_size=config.BATCH_SIZE,
+        class_mode='binary',
+        subset='training'
+    )
+
+
+def generator_epochs():
+    generator = image_data_generator()
+    return lambda: (generator[i] for i in range(len(generator)))
+
+
+def tfdata_file_epochs():
+    # One dataset across epochs, so epochs after the first read the tf.data cache
+    samples = dataset_cache.split_sources()["train"]
+    dataset = input_pipeline.file_dataset(samples, config.BATCH_SIZE, shuffle=True, seed=config.RANDOM_SEED,
+                                          transform=input_pipeline.make_augment())
+    return lambda: dataset
+
+
+def tfdata_cache_epochs():
+    if not dataset_cache.is_current():
+        dataset_cache.build_cache()
+    dataset = dataset_cache.load_split_dataset("train", config.BATCH_SIZE, shuffle=True, seed=config.RANDOM_SEED,
+                                               transform=input_pipeline.make_augment())
+    return lambda: dataset
+
+
+PIPELINES = {
+    "image_data_generator": generator_epochs,
+    "tfdata_files": tfdata_file_epochs,
+    "tfdata_cache": tfdata_cache_epochs,
+}
+
+
+def time_epochs(make_epoch, epochs):
+    """
+    Images/sec of each of `epochs` full passes.
+    """
+    results = []
+    for _ in range(epochs):
+        images = 0
+        start = time.perf_counter()
+        for batch, _ in make_epoch():
+            images += len(batch)
+        results.append(images / (time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark training input pipelines')
+    parser.add_argument('--epochs', type=int, default=3, help='Full passes over the training split per pipeline')
+    parser.add_argument('--pipelines', default=','.join(PIPELINES),
+                        help='Comma-separated pipelines to benchmark')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = {"batch_size": config.BATCH_SIZE, "pipelines": {}}
+    for name in args.pipelines.split(','):
+        try:
+            epochs = time_epochs(PIPELINES[name](), args.epochs)
+        except ImportError as e:
+            # ImageDataGenerator's affine transforms need scipy
+            print(f"{name}: skipped ({str(e)})")
+            report["pipelines"][name] = {"error": str(e)}
+            continue
+        report["pipelines"][name] = {
+            "images_per_sec_per_epoch": epochs,
+            "steady_state_images_per_sec": max(epochs[1:] or epochs),
+        }
+        print(f"{name}: " + ", ".join(f"{rate:.0f}" for rate in epochs) + " images/sec per epoch")
+
+    baseline = report["pipelines"].get("image_data_generator", {}).get("steady_state_images_per_sec")
+    if baseline:
+        for name, result in report["pipelines"].items():
+            if "steady_state_images_per_sec" in result:
+                result["speedup"] = result["steady_state_images_per_sec"] / baseline
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
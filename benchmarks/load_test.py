@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Load test of the serving API.
+
+Generates synthetic cat/dog-sized JPEG and PNG uploads and sends them to
+/predict/ (or /predict/batch/) from a fixed number of concurrent clients,
+either to the app in this process, to a uvicorn server started for the run
+(--spawn), or to an already running server (--url). Reports throughput,
+p50/p95/p99 latency, status codes and peak memory per server process.
+
+With --baseline, the report is compared against a stored one and the script
+exits with 1 if throughput dropped or p95/p99 latency grew by more than
+--max-regression, so CI can flag regressions.
+
+Run from the project root: python benchmarks/load_test.py --concurrency 16 --requests 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import psutil
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from preprocess_benchmark import synthetic_photo
+
+# Typical sizes of the Kaggle cats and dogs photos
+IMAGE_SIZES = [(500, 375), (375, 500), (320, 240), (800, 600)]
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+def build_payloads(count, formats):
+    """
+    Distinct synthetic uploads, cycling through formats and sizes, so the
+    prediction cache does not serve repeated requests.
+    """
+    payloads = []
+    for i in range(count):
+        fmt = formats[i % len(formats)]
+        width, height = IMAGE_SIZES[i % len(IMAGE_SIZES)]
+        payloads.append((f"load_{i}.{fmt.lower()}", synthetic_photo(width, height, fmt, seed=i),
+                         MEDIA_TYPES[fmt]))
+    return payloads
+
+
+class MemorySampler:
+    """
+    Samples the resident set size of a set of processes in a background
+    thread and keeps the peak per process.
+    """
+
+    def __init__(self, processes, interval=0.1):
+        self.processes = processes
+        self.interval = interval
+        self.peak_rss = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        for process in self.processes():
+            try:
+                rss = process.memory_info().rss
+            except psutil.Error:
+                continue
+            self.peak_rss[process.pid] = max(self.peak_rss.get(process.pid, 0), rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def report(self):
+        return {str(pid): rss / 1e6 for pid, rss in sorted(self.peak_rss.items())}
+
+
+async def wait_until_ready(client, timeout, consecutive=1):
+    """
+    Poll /health/ready until it answers 200 `consecutive` times in a row
+    (several workers behind one port each have to load the model).
+    """
+    deadline = time.time() + timeout
+    streak = 0
+    while time.time() < deadline:
+        try:
+            streak = streak + 1 if (await client.get("/health/ready")).status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        if streak >= consecutive:
+            return
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"API not ready after {timeout}s")
+
+
+async def send(client, endpoint, payloads):
+    if endpoint == "batch":
+        files = [("files", payload) for payload in payloads]
+        return await client.post("/predict/batch/", files=files)
+    return await client.post("/predict/", files={"file": payloads[0]})
+
+
+async def run_load(client, payloads, args):
+    """
+    Closed-loop load: `concurrency` clients each send their next request as
+    soon as the previous one finished, until `requests` have been sent.
+    """
+    per_request = args.batch_size if args.endpoint == "batch" else 1
+    latencies = []
+    statuses = {}
+    counter = iter(range(args.requests))
+
+    async def worker():
+        for i in counter:
+            start = (args.warmup + i) * per_request
+            chunk = [payloads[(start + j) % len(payloads)] for j in range(per_request)]
+            sent_at = time.perf_counter()
+            try:
+                response = await send(client, args.endpoint, chunk)
+                status = str(response.status_code)
+            except httpx.TransportError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - sent_at)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    # Warm-up requests are not measured
+    for i in range(args.warmup):
+        await send(client, args.endpoint,
+                   [payloads[(i * per_request + j) % len(payloads)] for j in range(per_request)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    succeeded = statuses.get("200", 0)
+    return {
+        "requests": len(latencies),
+        "statuses": statuses,
+        "elapsed_seconds": elapsed,
+        "throughput_requests_per_sec": succeeded / elapsed,
+        "throughput_images_per_sec": succeeded * per_request / elapsed,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "max": float(latencies_ms.max()),
+        },
+    }
+
+
+async def run_in_process(payloads, args):
+    """
+    Drive the FastAPI app in this process through an ASGI transport.
+    """
+    from backend.main import app
+
+    this_process = psutil.Process()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=args.timeout) as client:
+            await wait_until_ready(client, args.timeout)
+            with MemorySampler(lambda: [this_process]) as sampler:
+                result = await run_load(client, payloads, args)
+    result["peak_rss_mb"] = sampler.report()
+    return result
+
+
+async def run_against_server(payloads, args, base_url, server=None):
+    """
+    Drive a server over HTTP. If `server` is the uvicorn process we started,
+    the memory of its worker processes is reported too.
+    """
+    def server_processes():
+        if server is None:
+            return []
+        parent = psutil.Process(server.pid)
+        # With --workers > 1 the parent only supervises the worker processes
+        return parent.children() or [parent]
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_until_ready(client, args.timeout, consecutive=3 * args.workers)
+        with MemorySampler(server_processes) as sampler:
+            result = await run_load(client, payloads, args)
+    if server is not None:
+        result["peak_rss_mb"] = sampler.report()
+    return result
+
+
+def spawn_server(args):
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(args.port),
+         "--workers", str(args.workers)],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def compare_to_baseline(report, baseline, max_regression):
+    """
+    Relative changes of the headline numbers and the ones that regressed by
+    more than `max_regression` (a fraction).
+    """
+    checks = {
+        "throughput_images_per_sec": (report["throughput_images_per_sec"],
+                                      baseline["throughput_images_per_sec"], -1),
+        "latency_p95_ms": (report["latency_ms"]["p95"], baseline["latency_ms"]["p95"], 1),
+        "latency_p99_ms": (report["latency_ms"]["p99"], baseline["latency_ms"]["p99"], 1),
+    }
+    changes = {}
+    regressions = []
+    for name, (current, reference, direction) in checks.items():
+        change = (current - reference) / reference if reference else 0.0
+        changes[name] = {"current": current, "baseline": reference, "change": change}
+        # direction -1: lower is worse (throughput), 1: higher is worse (latency)
+        if change * direction > max_regression:
+            regressions.append(name)
+    return {"changes": changes, "max_regression": max_regression, "regressions": regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the prediction API')
+    parser.add_argument('--url', help='Base URL of a running server (default: run the app in-process)')
+    parser.add_argument('--spawn', action='store_true', help='Start a local uvicorn server for the run')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers with --spawn')
+    parser.add_argument('--port', type=int, default=8766, help='Port for --spawn')
+    parser.add_argument('--endpoint', choices=['predict', 'batch'], default='predict')
+    parser.add_argument('--batch-size', type=int, default=8, help='Images per request with --endpoint batch')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests sent first')
+    parser.add_argument('--payloads', type=int, default=0,
+                        help='Distinct synthetic images (default: one per image sent, so nothing is '
+                             'served from the prediction cache)')
+    parser.add_argument('--formats', default='JPEG,PNG', help='Comma-separated upload formats')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds for readiness and per request')
+    parser.add_argument('--baseline', help='Compare against this stored JSON report')
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help='Allowed relative drop in throughput / growth in p95 and p99 latency')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    per_request = args.batch_size if args.endpoint == "batch" else 1
+    args.payloads = args.payloads or (args.warmup + args.requests) * per_request
+    payloads = build_payloads(args.payloads, args.formats.split(','))
+    config = {key: getattr(args, key) for key in
+              ("endpoint", "batch_size", "concurrency", "requests", "payloads", "formats", "workers")}
+
+    if args.url:
+        config["target"] = args.url
+        result = asyncio.run(run_against_server(payloads, args, args.url))
+    elif args.spawn:
+        config["target"] = "spawn"
+        server = spawn_server(args)
+        try:
+            result = asyncio.run(run_against_server(payloads, args, f"http://127.0.0.1:{args.port}", server))
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        config["target"] = "in-process"
+        result = asyncio.run(run_in_process(payloads, args))
+
+    report = {"config": config, **result}
+    latency = report["latency_ms"]
+    print(f"{report['throughput_requests_per_sec']:.1f} requests/sec "
+          f"({report['throughput_images_per_sec']:.1f} images/sec), latency p50 {latency['p50']:.1f} ms, "
+          f"p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms, statuses {report['statuses']}")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare_to_baseline(report, json.load(f), args.max_regression)
+        regressions = report["comparison"]["regressions"]
+        if regressions:
+            print(f"Regression against {args.baseline}: {', '.join(regressions)}")
+            exit_code = 1
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
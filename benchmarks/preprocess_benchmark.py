@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the inference preprocessing pipeline.
+
+Compares the previous pipeline (full-resolution decode, bicubic resize,
+float32 divide by 255) with backend/imaging.py (JPEG draft-mode decode,
+uint8 output, normalization folded into the model graph) on synthetic
+phone-sized photos, and reports the per-image speedup and how far the
+outputs drift apart.
+
+Run from the project root: python benchmarks/preprocess_benchmark.py [--model PATH]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml_part import config
+from backend import imaging
+
+SIZE = (config.IMG_WIDTH, config.IMG_HEIGHT)
+
+
+def synthetic_photo(width, height, fmt, seed):
+    """
+    Build a smooth, photo-like image (gradients plus noise) and encode it.
+    Pure noise would defeat JPEG compression and make decoding unrealistically slow.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = []
+    for c in range(3):
+        fx, fy = rng.uniform(2, 8, size=2)
+        channels.append(127 + 100 * np.sin(x / width * fx + c) * np.cos(y / height * fy))
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 8, size=(height, width, 3))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=90) if fmt == "JPEG" else image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def reference_preprocess(contents):
+    """
+    The previous pipeline, returning (1, H, W, 3) float32 in [0, 1].
+    """
+    image = Image.open(io.BytesIO(contents))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image = image.resize(SIZE)
+    img_array = np.asarray(image, dtype=np.float32)
+    img_array = img_array / 255.0
+    return np.expand_dims(img_array, 0)
+
+
+def time_per_image(fn, payloads, repeats):
+    fn(payloads[0])  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for payload in payloads:
+            fn(payload)
+    return (time.perf_counter() - start) / (repeats * len(payloads))
+
+
+def compare_outputs(model_path, payloads):
+    """
+    Raw model outputs of both pipelines on the same payloads.
+    """
+    import tensorflow as tf
+    from ml_part.export import with_input_normalization
+
+    keras_model = tf.keras.models.load_model(model_path)
+    serving_model = with_input_normalization(keras_model)
+    reference = keras_model.predict_on_batch(
+        np.concatenate([reference_preprocess(p) for p in payloads]))[:, 0]
+    optimized = serving_model.predict_on_batch(
+        np.concatenate([imaging.decode_image(p, SIZE) for p in payloads]))[:, 0]
+    return float(np.max(np.abs(reference - optimized)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark inference image preprocessing')
+    parser.add_argument('--images', type=int, default=8, help='Distinct synthetic images per format')
+    parser.add_argument('--repeats', type=int, default=3, help='Passes over the image set')
+    parser.add_argument('--width', type=int, default=4032, help='Synthetic photo width (12MP default)')
+    parser.add_argument('--height', type=int, default=3024, help='Synthetic photo height')
+    parser.add_argument('--model', help='Optional model.h5 to compare raw predictions')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = {"image_size": [args.width, args.height], "target_size": list(SIZE), "formats": {}}
+    for fmt in ["JPEG", "PNG"]:
+        payloads = [synthetic_photo(args.width, args.height, fmt, seed) for seed in range(args.images)]
+        reference_time = time_per_image(reference_preprocess, payloads, args.repeats)
+        optimized_time = time_per_image(lambda p: imaging.decode_image(p, SIZE), payloads, args.repeats)
+
+        # Pixel drift in [0, 1] units, the scale the model sees
+        diffs = np.concatenate([
+            np.abs(reference_preprocess(p) - imaging.decode_image(p, SIZE) / 255.0).ravel()
+            for p in payloads
+        ])
+        result = {
+            "reference_ms": reference_time * 1000,
+            "optimized_ms": optimized_time * 1000,
+            "speedup": reference_time / optimized_time,
+            "max_abs_pixel_diff": float(diffs.max()),
+            "mean_abs_pixel_diff": float(diffs.mean()),
+        }
+        if args.model:
+            result["max_abs_prediction_diff"] = compare_outputs(args.model, payloads)
+        report["formats"][fmt] = result
+
+        print(f"{fmt}: reference {result['reference_ms']:.1f} ms/image, "
+              f"optimized {result['optimized_ms']:.1f} ms/image, "
+              f"speedup {result['speedup']:.1f}x, "
+              f"max pixel diff {result['max_abs_pixel_diff']:.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
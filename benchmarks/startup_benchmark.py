@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark of the serving API.
+
+Starts uvicorn in a fresh process for each inference backend, polls
+/health/ready, then sends one real prediction, and reports the time from
+process start to ready and to the first successful client prediction,
+together with the server's own startup timings.
+
+Run from the project root: python benchmarks/startup_benchmark.py --backends keras,tflite
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+from PIL import Image
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def sample_jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (180, 120, 90)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def measure_startup(backend, port, timeout):
+    """
+    Start the API with the given backend and time it until the first prediction.
+    """
+    env = dict(os.environ, INFERENCE_BACKEND=backend, PYTHONUNBUFFERED="1")
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.time()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port)],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        live_at = None
+        while time.time() - start < timeout:
+            if process.poll() is not None:
+                return {"error": f"server exited with code {process.returncode}"}
+            try:
+                if live_at is None and requests.get(f"{base_url}/health/live", timeout=1).ok:
+                    live_at = time.time() - start
+                response = requests.get(f"{base_url}/health/ready", timeout=1)
+                if response.ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.05)
+        else:
+            return {"error": f"not ready after {timeout}s"}
+        ready_at = time.time() - start
+        server_timings = response.json()["startup_seconds"]
+
+        response = requests.post(f"{base_url}/predict/",
+                                 files={"file": ("sample.jpg", sample_jpeg(), "image/jpeg")})
+        response.raise_for_status()
+        return {
+            "live_seconds": live_at,
+            "ready_seconds": ready_at,
+            "first_client_prediction_seconds": time.time() - start,
+            "server_startup_seconds": server_timings,
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure API cold-start time per inference backend')
+    parser.add_argument('--backends', default='keras,tflite', help='Comma-separated backends')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the temporary server')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for readiness')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = {}
+    for backend in args.backends.split(','):
+        result = measure_startup(backend, args.port, args.timeout)
+        report[backend] = result
+        if "error" in result:
+            print(f"{backend:>11}: {result['error']}")
+        else:
+            print(f"{backend:>11}: ready after {result['ready_seconds']:.2f}s, "
+                  f"first prediction after {result['first_client_prediction_seconds']:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0 if all("error" not in r for r in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
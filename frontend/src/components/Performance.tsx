@@ -86,8 +86,8 @@ const Performance: React.FC = () => {
         progress: simulatedProgress
       });
       
-      // If training is complete or failed, stop polling
-      if (data.status === 'completed' || data.status === 'failed') {
+      // If training is complete, failed or cancelled, stop polling
+      if (data.status === 'completed' || data.status === 'failed' || data.status === 'cancelled') {
         setRetraining(false);
         setTrainingJobId(null);
         // Refresh metrics data if training completed successfully
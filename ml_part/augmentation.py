@@ -0,0 +1,123 @@
+"""
+Training data augmentation as a Keras preprocessing layer.
+
+RandomAffine reproduces ImageDataGenerator's random_transform: rotation,
+shift, shear and zoom are composed into a single affine transform per image
+and applied in one bilinear resampling pass, followed by an optional
+horizontal flip. Chaining RandomRotation, RandomTranslation, RandomShear and
+RandomZoom instead would resample every image four times.
+"""
+
+import math
+import tensorflow as tf
+import config
+
+class RandomAffine(tf.keras.layers.Layer):
+    """
+    Random affine augmentation of a batch of images, with the same parameters
+    and semantics as ImageDataGenerator.
+
+    Args:
+        rotation_range: Maximum rotation in degrees
+        width_shift_range: Maximum horizontal shift as a fraction of the width
+        height_shift_range: Maximum vertical shift as a fraction of the height
+        shear_range: Maximum shear angle in degrees
+        zoom_range: Zoom factors are drawn from [1 - zoom_range, 1 + zoom_range], per axis
+        horizontal_flip: Flip half of the images horizontally
+        fill_mode: Filling of points outside the image ("nearest", "constant", "reflect" or "wrap")
+        seed: Random seed
+    """
+
+    def __init__(self, rotation_range=0.0, width_shift_range=0.0, height_shift_range=0.0, shear_range=0.0,
+                 zoom_range=0.0, horizontal_flip=False, fill_mode="nearest", seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.zoom_range = zoom_range
+        self.horizontal_flip = horizontal_flip
+        self.fill_mode = fill_mode
+        self.seed = seed
+
+    def _uniform(self, n, limit):
+        return tf.random.uniform([n], -limit, limit, seed=self.seed)
+
+    def transforms(self, n, height, width):
+        """
+        Random transforms for `n` images, in ImageProjectiveTransform format.
+        """
+        theta = self._uniform(n, math.radians(self.rotation_range))
+        tx = self._uniform(n, self.height_shift_range) * height
+        ty = self._uniform(n, self.width_shift_range) * width
+        shear = self._uniform(n, math.radians(self.shear_range))
+        zx = 1.0 + self._uniform(n, self.zoom_range)
+        zy = 1.0 + self._uniform(n, self.zoom_range)
+
+        # ImageDataGenerator's rotation @ shift @ shear @ zoom about the image
+        # center, mapping output (row, col) to input (row, col)
+        cos, sin = tf.cos(theta), tf.sin(theta)
+        m00 = cos * zx
+        m01 = (-cos * tf.sin(shear) - sin * tf.cos(shear)) * zy
+        m10 = sin * zx
+        m11 = (-sin * tf.sin(shear) + cos * tf.cos(shear)) * zy
+        m02 = cos * tx - sin * ty
+        m12 = sin * tx + cos * ty
+        center_row, center_col = height / 2 - 0.5, width / 2 - 0.5
+        m02 = m02 + center_row - m00 * center_row - m01 * center_col
+        m12 = m12 + center_col - m10 * center_row - m11 * center_col
+
+        # The op maps output (x, y) = (col, row) to input (col, row)
+        zeros = tf.zeros([n])
+        return tf.stack([m11, m10, m12, m01, m00, m02, zeros, zeros], axis=1)
+
+    def call(self, images, training=True):
+        if not training:
+            return images
+        shape = tf.shape(images)
+        n = shape[0]
+        height, width = tf.cast(shape[1], tf.float32), tf.cast(shape[2], tf.float32)
+        images = tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=self.transforms(n, height, width),
+            output_shape=shape[1:3],
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode=self.fill_mode.upper()
+        )
+        if self.horizontal_flip:
+            flip = tf.random.uniform([n], seed=self.seed) < 0.5
+            images = tf.where(flip[:, None, None, None], tf.reverse(images, axis=[2]), images)
+        return images
+
+    def get_config(self):
+        return {
+            **super().get_config(),
+            "rotation_range": self.rotation_range,
+            "width_shift_range": self.width_shift_range,
+            "height_shift_range": self.height_shift_range,
+            "shear_range": self.shear_range,
+            "zoom_range": self.zoom_range,
+            "horizontal_flip": self.horizontal_flip,
+            "fill_mode": self.fill_mode,
+            "seed": self.seed,
+        }
+
+def create_augmentation(seed=config.RANDOM_SEED):
+    """
+    Creates the training augmentation, with the transformations the
+    ImageDataGenerator training pipeline used.
+
+    Returns:
+        RandomAffine: The augmentation layer
+    """
+    return RandomAffine(
+        rotation_range=20,
+        width_shift_range=0.2,
+        height_shift_range=0.2,
+        shear_range=0.2,
+        zoom_range=0.2,
+        horizontal_flip=True,
+        seed=seed,
+        name="augmentation"
+    )
@@ -0,0 +1,91 @@
+"""
+Collects labeled production images from the serving API's prediction log.
+
+Every prediction that received ground-truth feedback and whose upload was
+kept (PREDICTION_LOG_UPLOAD_DIR) is copied into a class directory, ready to
+be added to the training data for the next retraining run.
+"""
+
+import os
+import shutil
+import sqlite3
+import argparse
+from contextlib import closing
+from datetime import datetime
+from PIL import Image
+import config
+
+CLASS_DIRS = {"cat": "cats", "dog": "dogs"}
+
+def labeled_uploads(log_path, since=None):
+    """
+    Reads the latest label of every labeled upload in the prediction log.
+
+    Args:
+        log_path: Path to the prediction log SQLite database
+        since: Only consider feedback given at or after this Unix timestamp
+
+    Returns:
+        dict: Upload SHA-256 -> ground truth ("cat" or "dog")
+    """
+    query = ("SELECT p.upload_sha256, f.ground_truth FROM feedback f "
+             "JOIN predictions p ON p.id = f.prediction_id "
+             "WHERE p.upload_sha256 IS NOT NULL AND f.timestamp >= ? ORDER BY f.rowid")
+    labels = {}
+    with closing(sqlite3.connect(log_path)) as conn:
+        for sha256, ground_truth in conn.execute(query, (since or 0,)):
+            # Later feedback overrides earlier labels for the same image
+            labels[sha256] = ground_truth
+    return labels
+
+def copy_upload(upload_path, class_dir, sha256):
+    """
+    Copies one stored upload into a class directory with a proper extension.
+
+    Returns:
+        bool: True if the image was copied, False if it was already there
+    """
+    with Image.open(upload_path) as img:
+        extension = "jpg" if img.format == "JPEG" else img.format.lower()
+    target = os.path.join(class_dir, f"{sha256}.{extension}")
+    if os.path.exists(target):
+        return False
+    shutil.copyfile(upload_path, target)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Export labeled production images for retraining')
+    parser.add_argument('--log', nargs='+', default=[config.PREDICTION_LOG_PATH],
+                        help='Prediction log database(s), e.g. one per API replica')
+    parser.add_argument('--uploads', default=config.PREDICTION_LOG_UPLOAD_DIR,
+                        help='Directory the API stored uploads in')
+    parser.add_argument('--since', help='Only feedback given since this ISO 8601 timestamp')
+    parser.add_argument('--output', default=config.NEW_DATA_DIR, help='Output directory')
+    args = parser.parse_args()
+
+    if not args.uploads:
+        print("No upload directory configured; set PREDICTION_LOG_UPLOAD_DIR on the API to keep images")
+        return
+
+    since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+    labels = {}
+    for log_path in args.log:
+        labels.update(labeled_uploads(log_path, since))
+    print(f"Found {len(labels)} labeled uploads in {', '.join(args.log)}")
+
+    for class_dir in CLASS_DIRS.values():
+        os.makedirs(os.path.join(args.output, class_dir), exist_ok=True)
+
+    copied, missing = 0, 0
+    for sha256, ground_truth in labels.items():
+        upload_path = os.path.join(args.uploads, sha256[:2], sha256)
+        if not os.path.exists(upload_path):
+            missing += 1
+            continue
+        if copy_upload(upload_path, os.path.join(args.output, CLASS_DIRS[ground_truth]), sha256):
+            copied += 1
+
+    print(f"Copied {copied} new images to {args.output} ({missing} uploads were not stored)")
+
+if __name__ == "__main__":
+    main()
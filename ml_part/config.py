@@ -2,12 +2,25 @@
 Configuration parameters for the cat vs dog classifier.
 """
 
+import os
+
 # Dataset parameters
 DATA_DIR = "ml_part/data"
 TRAIN_DIR = f"{DATA_DIR}/train"
 TEST_DIR = f"{DATA_DIR}/test"
+NEW_DATA_DIR = "ml_part/new_data"  # Labeled production images (see collect_feedback.py)
 VALIDATION_SPLIT = 0.2
+TEST_SPLIT = 0.2  # Share of PetImages placed in the test directory
+ORGANIZE_MANIFEST_PATH = f"{DATA_DIR}/organize_manifest.json"  # Hash, split and errors of every source image
+DATASET_WORKERS = None  # Processes validating and decoding images, None = all cores
+DEDUP_HAMMING_THRESHOLD = 6  # Max differing pHash bits of near-duplicates, -1 disables deduplication
+DEDUP_KEEP_DUPLICATES = False  # Keep all near-duplicates (on one side of the split) instead of one per class
 BATCH_SIZE = 32
+DATASET_CACHE_DIR = "ml_part/data_cache"  # Pre-resized NPY shards written by the preprocess stage
+DATASET_SHARD_SIZE = 1024  # Images per shard
+SHUFFLE_BUFFER_SIZE = 2048  # Images held for shuffling while streaming shards
+USE_DATASET_CACHE = True  # Train from the NPY shards; False decodes the image files with tf.data
+INPUT_PIPELINE_CACHE = ""  # tf.data cache file prefix for decoded images without the dataset cache, "" = memory
 
 # Image parameters
 IMG_HEIGHT = 150
@@ -19,10 +32,94 @@ EPOCHS = 10
 LEARNING_RATE = 0.001
 OPTIMIZER = "adam"
 NUM_CLASSES = 2  # Cat and Dog
+CONV_FILTERS = (32, 64, 128)  # Filters of each convolution + max-pooling block
+DENSE_UNITS = 512
+DROPOUT = 0.5
 
 # Training parameters
 EARLY_STOPPING_PATIENCE = 3
 CHECKPOINT_PATH = "ml_part/checkpoints/model.h5"
 
+# Incremental training: fine-tune the current checkpoint on new_data plus a replay sample of the training set
+TRAINING_MODES = ("full", "incremental")
+TRAINING_MODE = os.environ.get("TRAINING_MODE", "full")  # Set per job by the training worker
+INCREMENTAL_EPOCHS = 3
+INCREMENTAL_LEARNING_RATE = 0.0001
+INCREMENTAL_REPLAY_RATIO = 4  # Replayed training images per new image
+INCREMENTAL_MAX_ACCURACY_DROP = 0.01  # Test accuracy drop versus the current model that counts as a regression
+INCREMENTAL_FALLBACK_TO_FULL = True  # On a regression, retrain from scratch instead of failing
+
+# Training performance (overridable through environment variables on the build node, see performance.py)
+TRAINING_INTRA_OP_THREADS = int(os.environ.get("TRAINING_INTRA_OP_THREADS", 0))  # Threads per op, 0 = all cores
+TRAINING_INTER_OP_THREADS = int(os.environ.get("TRAINING_INTER_OP_THREADS", 0))  # Concurrent ops, 0 lets TF decide
+TRAINING_ONEDNN = os.environ.get("TRAINING_ONEDNN", "true").lower() in ("1", "true", "yes")  # oneDNN CPU kernels
+TRAINING_XLA_JIT = os.environ.get("TRAINING_XLA_JIT", "false").lower() in ("1", "true", "yes")
+# bfloat16 compute with float32 weights, on CPUs with AVX512_BF16 or AMX (float32 elsewhere)
+TRAINING_MIXED_PRECISION = os.environ.get("TRAINING_MIXED_PRECISION", "false").lower() in ("1", "true", "yes")
+TRAINING_BATCH_MULTIPLIER = int(os.environ.get("TRAINING_BATCH_MULTIPLIER", 1))  # Batch size = BATCH_SIZE * multiplier
+TRAINING_LR_SCALING = os.environ.get("TRAINING_LR_SCALING", "linear")  # "linear", "sqrt" or "none" with the multiplier
+TRAINING_LR_WARMUP_EPOCHS = int(os.environ.get("TRAINING_LR_WARMUP_EPOCHS", 2))  # Ramp up to the scaled learning rate
+TRAINING_PROFILE = os.environ.get("TRAINING_PROFILE", "false").lower() in ("1", "true", "yes")  # See profiling.py
+TRAINING_PROFILE_TRACE_STEPS = os.environ.get("TRAINING_PROFILE_TRACE_STEPS", "")  # "start:stop" steps to trace, "" = none
+TRAINING_PROFILE_TRACE_DIR = "ml_part/profile_trace"  # TensorBoard trace of TRAINING_PROFILE_TRACE_STEPS
+
+# Hyperparameter sweep (see sweep.py), a separate DVC pipeline in SWEEP_DIR
+SWEEP_DIR = "ml_part/sweeps"
+SWEEP_SPACE_PATH = f"{SWEEP_DIR}/space.json"  # Search space
+SWEEP_TRIALS = 16
+SWEEP_MIN_EPOCHS = 1  # Epochs of the first rung
+SWEEP_REDUCTION_FACTOR = 3  # A rung promotes its top 1/factor of trials to factor times the epochs, up to EPOCHS
+SWEEP_THREADS_PER_TRIAL = 2  # Trials run in parallel = cores // threads per trial
+
+# Serving artifacts exported after training
+TFLITE_PATH = "ml_part/checkpoints/model.tflite"
+ONNX_PATH = "ml_part/checkpoints/model.onnx"
+EXPORT_ONNX = False  # Requires tf2onnx
+
+# Post-training quantization parameters
+QUANTIZATION_MODE = "int8"  # "int8" (full-integer) or "dynamic" (dynamic-range)
+QUANTIZATION_CALIBRATION_SAMPLES = 200
+QUANTIZATION_MAX_ACCURACY_DROP = 0.01  # Refuse promotion beyond this test accuracy drop
+QUANTIZED_DIR = "ml_part/quantized"
+QUANTIZED_CANDIDATE_PATH = f"{QUANTIZED_DIR}/candidate.tflite"
+QUANTIZED_BASELINE_PATH = f"{QUANTIZED_DIR}/float_baseline.tflite"  # Float model the candidate is gated against
+QUANTIZED_PATH = f"{QUANTIZED_DIR}/model_int8.tflite"
+QUANTIZATION_METRICS_PATH = "ml_part/quantization_metrics.json"
+
 # Random seed for reproducibility
-RANDOM_SEED = 42 
\ No newline at end of file
+RANDOM_SEED = 42 
+
+# Serving parameters (overridable through environment variables in the pod spec)
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", 16))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", 5))
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", 2))
+PREDICT_MAX_PENDING = int(os.environ.get("PREDICT_MAX_PENDING", 64))
+PREDICT_RETRY_AFTER_SECONDS = int(os.environ.get("PREDICT_RETRY_AFTER_SECONDS", 1))
+PREDICT_BATCH_MAX_FILES = int(os.environ.get("PREDICT_BATCH_MAX_FILES", 256))
+STREAM_WINDOW = int(os.environ.get("STREAM_WINDOW", 64))
+STREAM_MAX_JOBS = int(os.environ.get("STREAM_MAX_JOBS", 4))  # streams read concurrently, each on its own thread
+STREAM_DATA_ROOT = os.environ.get("STREAM_DATA_ROOT", DATA_DIR)
+STREAM_ALLOW_URLS = os.environ.get("STREAM_ALLOW_URLS", "false").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 1024))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", 0))
+PREDICTION_HISTORY_SIZE = int(os.environ.get("PREDICTION_HISTORY_SIZE", 10000))
+FEEDBACK_BATCH_MAX_ITEMS = int(os.environ.get("FEEDBACK_BATCH_MAX_ITEMS", 10000))
+PREDICTION_LOG_PATH = os.environ.get("PREDICTION_LOG_PATH", "prediction_log/predictions.sqlite3")  # "" disables it
+PREDICTION_LOG_FLUSH_MS = float(os.environ.get("PREDICTION_LOG_FLUSH_MS", 200))
+PREDICTION_LOG_MAX_PENDING = int(os.environ.get("PREDICTION_LOG_MAX_PENDING", 10000))
+PREDICTION_LOG_UPLOAD_DIR = os.environ.get("PREDICTION_LOG_UPLOAD_DIR", "")  # "" keeps no image bytes
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras")  # keras, tflite or onnx
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 0))  # 0 lets the runtime decide
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "model_registry")
+CANDIDATE_MODEL_VERSION = os.environ.get("CANDIDATE_MODEL_VERSION", "")  # registry version evaluated on startup
+CANDIDATE_MODE = os.environ.get("CANDIDATE_MODE", "shadow")  # shadow or canary
+CANDIDATE_TRAFFIC_PERCENT = float(os.environ.get("CANDIDATE_TRAFFIC_PERCENT", 10))  # canary share of requests
+CANDIDATE_MAX_PENDING = int(os.environ.get("CANDIDATE_MAX_PENDING", 64))  # mirrored images in flight
+CANDIDATE_FEEDBACK_WINDOW = int(os.environ.get("CANDIDATE_FEEDBACK_WINDOW", PREDICTION_HISTORY_SIZE))
+TRAINING_QUEUE_PATH = os.environ.get("TRAINING_QUEUE_PATH", "training_queue/jobs.sqlite3")
+TRAINING_QUEUE_JOURNAL_MODE = os.environ.get("TRAINING_QUEUE_JOURNAL_MODE", "wal")  # "delete" on a volume shared by pods
+TRAINING_LOG_DIR = os.environ.get("TRAINING_LOG_DIR", "training_queue/logs")
+TRAINING_POLL_SECONDS = float(os.environ.get("TRAINING_POLL_SECONDS", 2))  # worker queue/cancel checks, API deploy checks
+TRAINING_LEASE_SECONDS = float(os.environ.get("TRAINING_LEASE_SECONDS", 60))  # running job requeued without a heartbeat
+TRAINING_CANCEL_GRACE_SECONDS = float(os.environ.get("TRAINING_CANCEL_GRACE_SECONDS", 30))  # SIGTERM to SIGKILL
+TRAINING_WORKER_NICE = int(os.environ.get("TRAINING_WORKER_NICE", 10))  # CPU priority increment of training
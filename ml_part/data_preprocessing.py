@@ -3,15 +3,19 @@ Data downloading and preprocessing for the cat vs dog classifier.
 """
 
 import os
+import io
+import json
+import hashlib
 import zipfile
 import requests
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import shutil
+from multiprocessing import Pool
 from pathlib import Path
 import config
-from PIL import Image
+import dataset_cache
+import dedup
+from PIL import Image, UnidentifiedImageError
 
 # def download_dataset():
 #     """
@@ -43,170 +47,257 @@ from PIL import Image
 #     os.remove(zip_path)
 #     print("Dataset downloaded and extracted.")
 
-def is_valid_image(file_path):
+def inspect_image(file_path):
     """
-    Check if an image file is valid by attempting to open it with PIL.
+    Hashes an image file and checks that it is a valid image. The file is
+    read once; PIL verifies and decodes the bytes in memory, and the decoded
+    image is also given a perceptual hash for deduplication.
     
     Args:
         file_path: Path to the image file
         
     Returns:
-        bool: True if the image is valid, False otherwise
+        tuple: (file path, SHA-256 of the contents, perceptual hash,
+            error message or None if the image is valid)
     """
     try:
-        img = Image.open(file_path)
-        img.verify()  # Verify that the image is not corrupted
-        img.close()
-        
-        # Also try to load the image to catch additional errors
-        img = Image.open(file_path)
-        img.load()
-        img.close()
-        return True
+        with open(file_path, "rb") as f:
+            contents = f.read()
+    except OSError as e:
+        return file_path, None, None, str(e)
+    sha256 = hashlib.sha256(contents).hexdigest()
+    try:
+        with Image.open(io.BytesIO(contents)) as img:
+            img.verify()  # Verify that the image is not corrupted
+        # Also load the image to catch additional errors
+        with Image.open(io.BytesIO(contents)) as img:
+            img.load()
+            perceptual_hash = dedup.phash(img)
+    except UnidentifiedImageError:
+        return file_path, sha256, None, "cannot identify image file"
     except Exception as e:
-        print(f"Invalid image found: {file_path} - Error: {str(e)}")
-        return False
+        return file_path, sha256, None, str(e)
+    return file_path, sha256, perceptual_hash, None
 
-def organize_dataset():
+def assign_split(sha256):
     """
-    Organizes the dataset into train and test directories with class subdirectories.
-    Filters out corrupt images.
+    Assigns an image to the train or test split from its content hash, so the
+    assignment never changes between runs and identical files share a split.
     """
-    # Create train and test directories
-    os.makedirs(config.TRAIN_DIR, exist_ok=True)
-    os.makedirs(config.TEST_DIR, exist_ok=True)
-    
-    # Create class directories
-    for dir_name in ["cats", "dogs"]:
-        os.makedirs(os.path.join(config.TRAIN_DIR, dir_name), exist_ok=True)
-        os.makedirs(os.path.join(config.TEST_DIR, dir_name), exist_ok=True)
+    digest = hashlib.sha256(f"{config.RANDOM_SEED}:{sha256}".encode()).hexdigest()
+    return "test" if int(digest[:8], 16) / 0xFFFFFFFF < config.TEST_SPLIT else "train"
+
+def link_or_copy(src, dst):
+    """
+    Hardlinks src to dst, falling back to a copy across filesystems.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def read_organize_manifest():
+    if not os.path.exists(config.ORGANIZE_MANIFEST_PATH):
+        return {}
+    with open(config.ORGANIZE_MANIFEST_PATH) as f:
+        return json.load(f).get("files", {})
+
+def write_organize_manifest(files, clusters):
+    rejected = sorted(name for name, entry in files.items() if entry["error"] is not None)
+    placed = [entry["path"] for entry in files.values() if entry["path"]]
+    train_prefix = os.path.relpath(config.TRAIN_DIR, config.DATA_DIR) + os.sep
+    manifest = {
+        "files": files,
+        "counts": {
+            "train": sum(path.startswith(train_prefix) for path in placed),
+            "test": sum(not path.startswith(train_prefix) for path in placed),
+            "rejected": len(rejected),
+            "duplicate_clusters": len(clusters),
+            "duplicates_dropped": sum(entry.get("duplicate_of") is not None for entry in files.values()),
+        },
+        "rejected": rejected,
+        "duplicate_clusters": clusters,
+    }
+    tmp_path = f"{config.ORGANIZE_MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, config.ORGANIZE_MANIFEST_PATH)
+
+def placed_split(entry):
+    """
+    Split an organize run placed a manifest entry in, None if it was not placed.
+    """
+    if not entry["path"]:
+        return None
+    train_prefix = os.path.relpath(config.TRAIN_DIR, config.DATA_DIR) + os.sep
+    return "train" if entry["path"].startswith(train_prefix) else "test"
+
+def cluster_split(files, group, stale):
+    """
+    Split of a near-duplicate cluster. Members placed by earlier runs keep
+    their side: the split holding most of them wins, and a tie (clusters
+    joined by a new image) goes to test so test images never move into
+    training. An entirely new cluster takes the split of its first member.
+    """
+    placed = [placed_split(files[name]) for name in group if name not in stale]
+    placed = [split for split in placed if split]
+    if not placed:
+        return files[group[0]]["split"]
+    return "train" if placed.count("train") > placed.count("test") else "test"
+
+def existing_split(target_class_name, file, size):
+    """
+    Split of a file placed by an earlier organize run without a manifest, if any.
+    """
+    for split, split_dir in (("train", config.TRAIN_DIR), ("test", config.TEST_DIR)):
+        path = os.path.join(split_dir, target_class_name, file)
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            return split
+    return None
+
+def organize_dataset(workers=config.DATASET_WORKERS):
+    """
+    Organizes the dataset into train and test directories with class subdirectories.
+    Filters out corrupt images and keeps near-duplicate images on one side of the split.
     
-    # Path to the extracted dataset
+    Incremental: a manifest (ORGANIZE_MANIFEST_PATH) records the size,
+    modification time, content hash, perceptual hash, split and validation
+    error of every source file, so only new or changed files are validated
+    (in a process pool) and linked into place; files removed from PetImages
+    are removed from the splits.
+    """
     extracted_dir = os.path.join(config.DATA_DIR, "PetImages")
+    split_dirs = {"train": config.TRAIN_DIR, "test": config.TEST_DIR}
+    for split_dir in split_dirs.values():
+        for dir_name in ["cats", "dogs"]:
+            os.makedirs(os.path.join(split_dir, dir_name), exist_ok=True)
     
-    # Count statistics
-    total_files = 0
-    valid_files = 0
-    invalid_files = 0
+    files = read_organize_manifest()
+    bootstrap = not files
     
-    # Move files to train and test directories
+    # Find new and changed source files
+    current = {}
+    pending = []
     for class_name in ["Cat", "Dog"]:
         class_dir = os.path.join(extracted_dir, class_name)
-        target_class_name = class_name.lower() + "s"
-        
-        # List all files in the class directory
-        all_files = os.listdir(class_dir)
-        total_files += len(all_files)
-        
-        # Filter out invalid images
-        valid_files_list = []
-        for file in all_files:
-            file_path = os.path.join(class_dir, file)
-            if is_valid_image(file_path):
-                valid_files_list.append(file)
-                valid_files += 1
-            else:
-                invalid_files += 1
-        
-        print(f"Found {len(valid_files_list)} valid {class_name} images out of {len(all_files)}")
-        
-        # Shuffle the valid files
-        np.random.seed(config.RANDOM_SEED)
-        np.random.shuffle(valid_files_list)
-        
-        # Split files into train and test
-        split_idx = int(len(valid_files_list) * 0.8)  # 80% train, 20% test
-        train_files = valid_files_list[:split_idx]
-        test_files = valid_files_list[split_idx:]
-        
-        # Copy files to train directory
-        for file in train_files:
-            src = os.path.join(class_dir, file)
-            dst = os.path.join(config.TRAIN_DIR, target_class_name, file)
-            try:
-                shutil.copy(src, dst)
-            except:
-                print(f"Error copying {src}")
-        
-        # Copy files to test directory
-        for file in test_files:
-            src = os.path.join(class_dir, file)
-            dst = os.path.join(config.TEST_DIR, target_class_name, file)
-            try:
-                shutil.copy(src, dst)
-            except:
-                print(f"Error copying {src}")
+        for entry in os.scandir(class_dir):
+            if not entry.is_file():
+                continue
+            name = f"{class_name}/{entry.name}"
+            stat = entry.stat()
+            current[name] = (entry.path, stat.st_size, stat.st_mtime_ns)
+            known = files.get(name)
+            if (known is None or known["size"] != stat.st_size or known["mtime_ns"] != stat.st_mtime_ns
+                    or (known["error"] is None and not known.get("phash"))):
+                pending.append(entry.path)
     
-    print(f"Dataset organized into train and test directories.")
-    print(f"Total files: {total_files}, Valid: {valid_files}, Invalid: {invalid_files}")
-
-def create_data_generators():
-    """
-    Creates and returns train and test data generators.
+    # Remove the splits' copies of deleted source files
+    removed = [name for name in files if name not in current]
+    for name in removed:
+        if files[name]["path"]:
+            path = os.path.join(config.DATA_DIR, files[name]["path"])
+            if os.path.lexists(path):
+                os.remove(path)
+        del files[name]
     
-    Returns:
-        tuple: (train_generator, test_generator)
-    """
-    # Data augmentation for training
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        rotation_range=20,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        shear_range=0.2,
-        zoom_range=0.2,
-        horizontal_flip=True,
-        validation_split=config.VALIDATION_SPLIT
-    )
+    print(f"{len(current)} source files: {len(pending)} new or changed, {len(removed)} removed")
     
-    # Only rescaling for testing
-    test_datagen = ImageDataGenerator(rescale=1./255)
+    # Validate and hash new files in parallel
+    stale = set()
+    with Pool(workers) as pool:
+        results = pool.imap_unordered(inspect_image, pending, chunksize=64)
+        for file_path, sha256, perceptual_hash, error in results:
+            class_name = os.path.basename(os.path.dirname(file_path))
+            file = os.path.basename(file_path)
+            name = f"{class_name}/{file}"
+            _, size, mtime_ns = current[name]
+            
+            previous = files.get(name)
+            if previous is not None and previous["sha256"] == sha256 and previous["error"] is None:
+                # Touched but unchanged
+                previous.update(mtime_ns=mtime_ns, phash=perceptual_hash)
+                continue
+            
+            split = None
+            if error is not None:
+                print(f"Invalid image found: {file_path} - Error: {error}")
+            else:
+                # Keep the layout of a dataset organized before the manifest existed
+                split = ((existing_split(class_name.lower() + "s", file, size) if bootstrap else None)
+                         or assign_split(sha256))
+            files[name] = {"size": size, "mtime_ns": mtime_ns, "sha256": sha256, "phash": perceptual_hash,
+                           "split": split, "path": previous["path"] if previous else None, "error": error,
+                           "duplicate_of": None}
+            stale.add(name)
     
-    # Training generator with validation split
-    train_generator = train_datagen.flow_from_directory(
-        config.TRAIN_DIR,
-        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
-        batch_size=config.BATCH_SIZE,
-        class_mode='binary',
-        subset='training'
-    )
+    # A near-duplicate cluster is placed on one side of the split (see cluster_split). Clusters
+    # chain transitively, so an image is only dropped when it is within the threshold of an image
+    # kept for its class; images placed by earlier runs are kept first so the kept ones stay put
+    placement = {name: entry["split"] for name, entry in files.items() if entry["error"] is None}
+    duplicate_of = {}
+    clusters = []
+    if config.DEDUP_HAMMING_THRESHOLD >= 0:
+        clusters = dedup.cluster({name: files[name]["phash"] for name in placement})
+        for group in clusters:
+            split = cluster_split(files, group, stale)
+            kept = {}
+            for name in sorted(group, key=lambda name: (name in stale or not files[name]["path"], name)):
+                class_kept = kept.setdefault(name.split("/")[0], [])
+                original = next((other for other in class_kept if dedup.distance(
+                    files[name]["phash"], files[other]["phash"]) <= config.DEDUP_HAMMING_THRESHOLD), None)
+                if original is not None and not config.DEDUP_KEEP_DUPLICATES:
+                    duplicate_of[name] = original
+                    placement[name] = None
+                else:
+                    class_kept.append(name)
+                    placement[name] = split
     
-    # Validation generator
-    validation_generator = train_datagen.flow_from_directory(
-        config.TRAIN_DIR,
-        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
-        batch_size=config.BATCH_SIZE,
-        class_mode='binary',
-        subset='validation'
-    )
+    # Link every file into the place it belongs, moving or dropping it if that changed
+    for name, entry in files.items():
+        entry["duplicate_of"] = duplicate_of.get(name)
+        split = placement.get(name)
+        class_name, file = name.split("/", 1)
+        path = (os.path.relpath(os.path.join(split_dirs[split], class_name.lower() + "s", file), config.DATA_DIR)
+                if split else None)
+        if path == entry["path"] and name not in stale:
+            continue
+        if entry["path"] and os.path.lexists(os.path.join(config.DATA_DIR, entry["path"])):
+            os.remove(os.path.join(config.DATA_DIR, entry["path"]))
+        if path:
+            link_or_copy(current[name][0], os.path.join(config.DATA_DIR, path))
+        entry["path"] = path
     
-    # Test generator
-    test_generator = test_datagen.flow_from_directory(
-        config.TEST_DIR,
-        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
-        batch_size=config.BATCH_SIZE,
-        class_mode='binary'
-    )
+    write_organize_manifest(files, clusters)
     
-    return train_generator, validation_generator, test_generator
+    valid_files = len(placement)
+    print(f"Dataset organized into train and test directories.")
+    print(f"Total files: {len(files)}, Valid: {valid_files}, Invalid: {len(files) - valid_files}, "
+          f"Near-duplicate clusters: {len(clusters)}, Duplicates dropped: {len(duplicate_of)}")
 
 def prepare_dataset():
     """
     Main function to prepare the dataset.
+    
+    Returns:
+        dict: The dataset cache manifest
     """
     # Dataset is now pulled using DVC pull instead of downloading
     # Ensure data directories exist
     os.makedirs(config.TRAIN_DIR, exist_ok=True)
     os.makedirs(config.TEST_DIR, exist_ok=True)
     
-    # If the dataset is not organized, organize it
-    if not os.path.exists(os.path.join(config.TRAIN_DIR, "cats")) or not os.path.exists(os.path.join(config.TRAIN_DIR, "dogs")):
+    # Organize new or changed source images; without PetImages keep the pulled train/test directories
+    if os.path.isdir(os.path.join(config.DATA_DIR, "PetImages")):
         print("Organizing dataset...")
         organize_dataset()
     else:
         print("Dataset already organized.")
     
-    return create_data_generators()
+    # Decode and resize every image once, so training streams NPY shards instead of JPEGs
+    print("Building dataset cache...")
+    return dataset_cache.build_cache()
 
 if __name__ == "__main__":
     prepare_dataset() 
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Preprocessed, sharded dataset cache for training.
+
+The preprocess stage decodes every image once, resizes it to the model's
+input size and writes the train, validation and test splits as uint8 NPY
+shards with a manifest. Training streams the shards through tf.data instead
+of decoding and resizing every JPEG again in each epoch.
+
+Splits follow flow_from_directory: labels are the alphabetically sorted
+class directories (cats = 0, dogs = 1), and the validation split is the
+first VALIDATION_SPLIT of each class's sorted file names. The "new" split
+holds the labeled production images in NEW_DATA_DIR (see collect_feedback.py).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from multiprocessing import Pool
+import numpy as np
+from PIL import Image
+import config
+
+# Image formats flow_from_directory picks up
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+SPLITS = ("train", "validation", "test")
+NEW_SPLIT = "new"
+MANIFEST_VERSION = 1
+
+def class_names(directory):
+    return sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+
+def list_split(directory, subset=None, classes=None):
+    """
+    Lists the images of a class-per-subdirectory directory the way
+    flow_from_directory does.
+
+    Args:
+        directory: Directory with one subdirectory per class
+        subset: "training" or "validation" to apply VALIDATION_SPLIT, None for all files
+        classes: Class names in label order, by default the directory's subdirectories
+
+    Returns:
+        list: (file path, label) tuples
+    """
+    samples = []
+    if not os.path.isdir(directory):
+        return samples
+    for label, class_name in enumerate(classes or class_names(directory)):
+        class_dir = os.path.join(directory, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        files = sorted(file for file in os.listdir(class_dir) if file.lower().endswith(IMAGE_EXTENSIONS))
+        split_idx = int(len(files) * config.VALIDATION_SPLIT)
+        if subset == "validation":
+            files = files[:split_idx]
+        elif subset == "training":
+            files = files[split_idx:]
+        samples.extend((os.path.join(class_dir, file), label) for file in files)
+    return samples
+
+def split_sources():
+    """
+    Returns:
+        dict: Split name -> (file path, label) tuples
+    """
+    classes = class_names(config.TRAIN_DIR) if os.path.isdir(config.TRAIN_DIR) else None
+    return {
+        "train": list_split(config.TRAIN_DIR, "training"),
+        "validation": list_split(config.TRAIN_DIR, "validation"),
+        "test": list_split(config.TEST_DIR),
+        # Labeled like the training data, even if new_data lacks a class
+        NEW_SPLIT: list_split(config.NEW_DATA_DIR, classes=classes),
+    }
+
+def fingerprint(samples):
+    """
+    Hash of the file list, sizes and modification times, to detect when a
+    split has to be rebuilt.
+    """
+    sha = hashlib.sha256()
+    sha.update(f"{config.IMG_HEIGHT}x{config.IMG_WIDTH}x{config.CHANNELS}".encode())
+    for path, label in samples:
+        stat = os.stat(path)
+        sha.update(f"{path}\0{label}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return sha.hexdigest()
+
+def load_image(path):
+    """
+    Decodes and resizes one image like flow_from_directory (RGB, nearest neighbour).
+
+    Returns:
+        numpy.ndarray: (H, W, C) uint8 array, or None if the image cannot be read
+    """
+    try:
+        with Image.open(path) as img:
+            img = img.convert("RGB").resize((config.IMG_WIDTH, config.IMG_HEIGHT), Image.NEAREST)
+            return np.asarray(img, dtype=np.uint8)
+    except Exception as e:
+        print(f"Skipping unreadable image {path}: {str(e)}")
+        return None
+
+def write_split(samples, output_dir, shard_size, workers):
+    """
+    Decodes a split in parallel and writes it as NPY shards.
+
+    Returns:
+        list: Shard entries for the manifest
+    """
+    tmp_dir = f"{output_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    shards = []
+    images, labels = [], []
+
+    def flush():
+        index = len(shards)
+        names = {"images": f"images-{index:05d}.npy", "labels": f"labels-{index:05d}.npy"}
+        np.save(os.path.join(tmp_dir, names["images"]), np.stack(images))
+        np.save(os.path.join(tmp_dir, names["labels"]), np.asarray(labels, dtype=np.uint8))
+        shards.append({**names, "count": len(images)})
+        images.clear()
+        labels.clear()
+
+    with Pool(workers) as pool:
+        decoded = pool.imap(load_image, [path for path, _ in samples], chunksize=32)
+        for (_, label), image in zip(samples, decoded):
+            if image is None:
+                continue
+            images.append(image)
+            labels.append(label)
+            if len(images) == shard_size:
+                flush()
+    if images:
+        flush()
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return shards
+
+def build_cache(cache_dir=config.DATASET_CACHE_DIR, shard_size=config.DATASET_SHARD_SIZE, workers=config.DATASET_WORKERS,
+                force=False):
+    """
+    Writes (or refreshes) the sharded cache of every split. Splits whose
+    source files have not changed since the last build are kept as they are.
+
+    Returns:
+        dict: The manifest
+    """
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    manifest = read_manifest(cache_dir) or {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        manifest = {}
+    os.makedirs(cache_dir, exist_ok=True)
+
+    splits = manifest.get("splits", {})
+    for split, samples in split_sources().items():
+        digest = fingerprint(samples)
+        if not force and splits.get(split, {}).get("fingerprint") == digest:
+            print(f"Dataset cache for {split} is up to date ({splits[split]['count']} images)")
+            continue
+        print(f"Caching {len(samples)} {split} images...")
+        shards = write_split(samples, os.path.join(cache_dir, split), shard_size, workers or os.cpu_count())
+        splits[split] = {
+            "fingerprint": digest,
+            "count": sum(shard["count"] for shard in shards),
+            "skipped": len(samples) - sum(shard["count"] for shard in shards),
+            "shards": shards,
+        }
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "image_shape": [config.IMG_HEIGHT, config.IMG_WIDTH, config.CHANNELS],
+        "classes": class_names(config.TRAIN_DIR),
+        "splits": splits,
+    }
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return manifest
+
+def read_manifest(cache_dir=config.DATASET_CACHE_DIR):
+    path = os.path.join(cache_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def is_current(cache_dir=config.DATASET_CACHE_DIR):
+    """
+    Whether the cache exists and matches the current train/test directories.
+    """
+    manifest = read_manifest(cache_dir)
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        return False
+    if manifest["image_shape"] != [config.IMG_HEIGHT, config.IMG_WIDTH, config.CHANNELS]:
+        return False
+    return all(manifest["splits"].get(split, {}).get("fingerprint") == fingerprint(samples)
+               for split, samples in split_sources().items())
+
+def sample_split(split, count=None, seed=None, cache_dir=config.DATASET_CACHE_DIR):
+    """
+    Reads a random sample of a cached split into memory.
+
+    Args:
+        split: Split name
+        count: Number of images, None for the whole split
+        seed: Sampling seed
+
+    Returns:
+        tuple: ((N, H, W, C) uint8 images, (N,) uint8 labels)
+    """
+    manifest = read_manifest(cache_dir)
+    split_dir = os.path.join(cache_dir, split)
+    shards = manifest["splits"][split]["shards"]
+    total = sum(shard["count"] for shard in shards)
+    count = total if count is None else min(count, total)
+    chosen = np.sort(np.random.default_rng(seed).choice(total, count, replace=False))
+
+    images, labels = [], []
+    offset = 0
+    for shard in shards:
+        rows = chosen[(chosen >= offset) & (chosen < offset + shard["count"])] - offset
+        if len(rows):
+            images.append(np.load(os.path.join(split_dir, shard["images"]), mmap_mode="r")[rows])
+            labels.append(np.load(os.path.join(split_dir, shard["labels"]))[rows])
+        offset += shard["count"]
+    if not images:
+        shape = tuple(manifest["image_shape"])
+        return np.zeros((0,) + shape, dtype=np.uint8), np.zeros((0,), dtype=np.uint8)
+    return np.concatenate(images), np.concatenate(labels)
+
+def load_split_dataset(split, batch_size, shuffle=False, seed=None, transform=None,
+                       cache_dir=config.DATASET_CACHE_DIR):
+    """
+    Streams cached splits as a tf.data pipeline of (images, labels) batches.
+    Shards are memory-mapped and read a few at a time, so the split never has
+    to fit in memory.
+
+    Args:
+        split: Split name ("train", "validation", "test" or "new") or a list of them
+        batch_size: Images per batch
+        shuffle: Shuffle shard order and images (reshuffled every epoch)
+        seed: Shuffle seed
+        transform: Function mapped over (uint8 images, float32 labels) batches
+            in parallel, e.g. rescaling and augmentation
+        cache_dir: Cache directory
+
+    Returns:
+        tf.data.Dataset: Prefetched batches; (N, H, W, C) uint8 images and
+            (N,) float32 labels unless `transform` changes them
+    """
+    import tensorflow as tf
+
+    manifest = read_manifest(cache_dir)
+    splits = [split] if isinstance(split, str) else list(split)
+    shards = [(os.path.join(cache_dir, name), shard) for name in splits for shard in manifest["splits"][name]["shards"]]
+    image_shape = tuple(manifest["image_shape"])
+
+    def read_shard(index):
+        split_dir, shard = shards[int(index)]
+        images = np.load(os.path.join(split_dir, shard["images"]), mmap_mode="r")
+        labels = np.load(os.path.join(split_dir, shard["labels"]))
+        # Hand the shard over in slices so only a slice at a time is copied out of the mmap
+        for start in range(0, len(labels), 256):
+            yield images[start:start + 256], labels[start:start + 256]
+
+    def shard_dataset(index):
+        return tf.data.Dataset.from_generator(
+            read_shard, args=(index,),
+            output_signature=(tf.TensorSpec((None,) + image_shape, tf.uint8), tf.TensorSpec((None,), tf.uint8))
+        ).unbatch()
+
+    dataset = tf.data.Dataset.range(len(shards))
+    if shuffle:
+        dataset = dataset.shuffle(max(1, len(shards)), seed=seed, reshuffle_each_iteration=True)
+    # Read several shards at once so shuffling mixes images across shards
+    dataset = dataset.interleave(shard_dataset, cycle_length=min(4, max(1, len(shards))),
+                                 num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    if shuffle:
+        dataset = dataset.shuffle(config.SHUFFLE_BUFFER_SIZE, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda images, labels: (images, tf.cast(labels, tf.float32)))
+    if transform is not None:
+        dataset = dataset.map(transform, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the sharded training dataset cache')
+    parser.add_argument('--output', default=config.DATASET_CACHE_DIR, help='Cache directory')
+    parser.add_argument('--shard-size', type=int, default=config.DATASET_SHARD_SIZE, help='Images per shard')
+    parser.add_argument('--workers', type=int, default=config.DATASET_WORKERS, help='Decode processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='Rebuild splits even if unchanged')
+    args = parser.parse_args()
+
+    manifest = build_cache(args.output, args.shard_size, args.workers, args.force)
+    for split, entry in manifest["splits"].items():
+        print(f"{split}: {entry['count']} images in {len(entry['shards'])} shards ({entry['skipped']} skipped)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Perceptual-hash deduplication for the cat vs dog dataset.
+
+Every image gets a 64-bit DCT perceptual hash (pHash), which stays nearly the
+same under resizing, recompression and small edits. Near-duplicates are
+images whose hashes differ in at most DEDUP_HAMMING_THRESHOLD bits. They are
+found with multi-index hashing, which only compares images that share an
+exact chunk of their hash instead of comparing every pair of images.
+
+organize_dataset uses the clusters to keep near-duplicates on one side of
+the train/test split. Run this module on its own to report duplicates and
+train/test leakage in an organized dataset:
+    python ml_part/dedup.py --output dedup_report.json
+"""
+
+import json
+import argparse
+from multiprocessing import Pool
+import numpy as np
+from PIL import Image
+import config
+import dataset_cache
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+def dct_matrix(n):
+    """
+    Orthonormal DCT-II matrix, so the 2D DCT of X is D @ X @ D.T.
+    """
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+DCT_MATRIX = dct_matrix(DCT_SIZE)
+
+def phash(img):
+    """
+    64-bit perceptual hash of a PIL image: the signs of its lowest 8x8 DCT
+    frequencies (of a 32x32 grayscale thumbnail) relative to their median.
+
+    Returns:
+        str: The hash as 16 hex digits
+    """
+    pixels = np.asarray(img.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+    bits = (low > np.median(low)).ravel()
+    return np.packbits(bits).tobytes().hex()
+
+def distance(hash_a, hash_b):
+    """
+    Hamming distance between two hex pHashes.
+    """
+    return (int(hash_a, 16) ^ int(hash_b, 16)).bit_count()
+
+def near_duplicate_pairs(values, threshold):
+    """
+    Finds every pair of hashes within `threshold` bits with multi-index
+    hashing: the 64 bits are split into threshold + 1 chunks, and two hashes
+    that differ in at most `threshold` bits agree exactly on at least one
+    chunk, so only hashes sharing a chunk value are compared.
+
+    Args:
+        values: 64-bit hashes as integers
+        threshold: Maximum Hamming distance
+
+    Returns:
+        set: (i, j) index pairs with i < j
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    bounds = np.linspace(0, 64, min(threshold + 1, 64) + 1).astype(int)
+    pairs = set()
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        keys = (values >> np.uint64(low)) & np.uint64((1 << int(high - low)) - 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = np.sort(order[start:end])
+            bucket = values[members]
+            distances = np.bitwise_count(bucket[:, None] ^ bucket[None, :])
+            i, j = np.nonzero(np.triu(distances <= threshold, k=1))
+            pairs.update(zip(members[i].tolist(), members[j].tolist()))
+    return pairs
+
+def cluster(hashes, threshold=config.DEDUP_HAMMING_THRESHOLD):
+    """
+    Groups items whose perceptual hashes are within `threshold` bits of each
+    other (transitively, so two members of a cluster can be further apart).
+
+    Args:
+        hashes: Item -> hex pHash
+        threshold: Maximum Hamming distance of near-duplicates
+
+    Returns:
+        list: Clusters of two or more items, each sorted, largest first
+    """
+    items = sorted(hashes)
+    parent = list(range(len(items)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for i, j in near_duplicate_pairs([int(hashes[item], 16) for item in items], threshold):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(find(index), []).append(item)
+    return sorted((group for group in groups.values() if len(group) > 1), key=lambda g: (-len(g), g[0]))
+
+def hash_file(path):
+    """
+    Returns:
+        tuple: (path, hex pHash or None if the image cannot be read)
+    """
+    try:
+        with Image.open(path) as img:
+            return path, phash(img)
+    except Exception:
+        return path, None
+
+def leakage_report(threshold=config.DEDUP_HAMMING_THRESHOLD, workers=config.DATASET_WORKERS):
+    """
+    Finds near-duplicate clusters in the organized train and test directories.
+
+    Returns:
+        dict: Cluster counts and the clusters that span both splits
+    """
+    splits = {}
+    for split, directory in (("train", config.TRAIN_DIR), ("test", config.TEST_DIR)):
+        for path, _ in dataset_cache.list_split(directory):
+            splits[path] = split
+
+    with Pool(workers) as pool:
+        hashes = {path: value for path, value in pool.imap_unordered(hash_file, list(splits), chunksize=64)
+                  if value is not None}
+    clusters = cluster(hashes, threshold)
+    leaking = [group for group in clusters if len({splits[path] for path in group}) > 1]
+    return {
+        "images": len(hashes),
+        "threshold": threshold,
+        "clusters": len(clusters),
+        "redundant_images": sum(len(group) - 1 for group in clusters),
+        "leaking_clusters": len(leaking),
+        "leaking_test_images": sum(splits[path] == "test" for group in leaking for path in group),
+        "leaking": leaking,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Report near-duplicate images and train/test leakage')
+    parser.add_argument('--threshold', type=int, default=config.DEDUP_HAMMING_THRESHOLD,
+                        help='Maximum Hamming distance between pHashes of near-duplicates')
+    parser.add_argument('--workers', type=int, default=config.DATASET_WORKERS, help='Hashing processes')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = leakage_report(args.threshold, args.workers)
+    print(f"{report['images']} images, {report['clusters']} near-duplicate clusters "
+          f"({report['redundant_images']} redundant images), {report['leaking_clusters']} clusters "
+          f"span train and test ({report['leaking_test_images']} test images)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Export of the trained model to serving formats (TFLite, optionally ONNX).
+
+Exported artifacts take uint8 pixels and scale them to [0, 1] inside the
+graph, matching what the backend's image decoder produces.
+"""
+
+import os
+import tensorflow as tf
+
+
+def with_input_normalization(model):
+    """
+    Wrap a model trained on [0, 1] inputs so it accepts uint8 pixels.
+    Scaling by 1/255 runs inside the graph instead of as a NumPy pass per image.
+
+    Args:
+        model: Keras model taking float inputs in [0, 1]
+
+    Returns:
+        model: Keras model taking uint8 inputs in [0, 255]
+    """
+    inputs = tf.keras.Input(shape=model.input_shape[1:], dtype="uint8")
+    outputs = model(tf.keras.layers.Rescaling(1.0 / 255)(inputs))
+    return tf.keras.Model(inputs, outputs)
+
+
+def export_tflite(model, output_path):
+    """
+    Convert a trained Keras model into a TFLite flatbuffer.
+
+    Args:
+        model: Trained Keras model (float inputs in [0, 1])
+        output_path: Where to write the .tflite file
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(with_input_normalization(model))
+    tflite_model = converter.convert()
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+    print(f"TFLite model saved to {output_path}")
+
+
+def export_onnx(model, output_path):
+    """
+    Convert a trained Keras model into ONNX. Requires the optional tf2onnx package.
+
+    Args:
+        model: Trained Keras model (float inputs in [0, 1])
+        output_path: Where to write the .onnx file
+    """
+    try:
+        import tf2onnx
+    except ImportError:
+        print("tf2onnx is not installed, skipping ONNX export")
+        return
+
+    serving_model = with_input_normalization(model)
+    input_signature = [tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.uint8, name="image")]
+
+    # tf2onnx converts concrete functions, which works for both Keras 2 and 3 models
+    function = tf.function(lambda image: serving_model(image))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tf2onnx.convert.from_function(function, input_signature=input_signature,
+                                  opset=13, output_path=output_path)
+
+    print(f"ONNX model saved to {output_path}")
+
+
+def export_quantized_tflite(model, output_path, representative_images, mode="int8"):
+    """
+    Convert a trained Keras model into a post-training quantized TFLite flatbuffer.
+
+    Args:
+        model: Trained Keras model (float inputs in [0, 1])
+        output_path: Where to write the .tflite file
+        representative_images: Iterable of (H, W, C) uint8 arrays used to
+            calibrate activation ranges (only needed for "int8")
+        mode: "dynamic" for dynamic-range (int8 weights, float activations) or
+            "int8" for full-integer quantization of weights and activations
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(with_input_normalization(model))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "int8":
+        def representative_dataset():
+            for image in representative_images:
+                yield [image[None, ...]]
+        converter.representative_dataset = representative_dataset
+    elif mode != "dynamic":
+        raise ValueError(f"Unknown quantization mode '{mode}', expected 'dynamic' or 'int8'")
+    tflite_model = converter.convert()
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+    print(f"Quantized ({mode}) TFLite model saved to {output_path}")
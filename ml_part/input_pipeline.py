@@ -0,0 +1,185 @@
+"""
+tf.data input pipelines for training, validation, and testing.
+
+Images are read either from the preprocessed dataset cache (NPY shards
+written by the preprocess stage, see dataset_cache.py) or straight from the
+train/test directories with parallel decoding. Both sources use the same
+split as flow_from_directory with VALIDATION_SPLIT, rescale to [0, 1] and
+apply the ImageDataGenerator-equivalent augmentation in parallel map calls.
+"""
+
+import numpy as np
+import tensorflow as tf
+import config
+import dataset_cache
+import augmentation
+
+# Labeled production images (new_data) are trained on together with the training split
+TRAIN_SPLITS = ("train", dataset_cache.NEW_SPLIT)
+
+def rescale(images, labels):
+    return tf.cast(images, tf.float32) / 255.0, labels
+
+def make_augment(seed=config.RANDOM_SEED):
+    """
+    Returns:
+        function: Batch transform that rescales and randomly augments images
+    """
+    augment_layer = augmentation.create_augmentation(seed)
+
+    def augment(images, labels):
+        return augment_layer(tf.cast(images, tf.float32) / 255.0, training=True), labels
+
+    return augment
+
+def nearest_indices(in_size, out_size):
+    """
+    Source pixel of each output pixel in PIL's nearest-neighbour resize,
+    which steps through the source in accumulated float64 increments.
+    """
+    scale = tf.cast(in_size, tf.float64) / out_size
+    steps = tf.concat([[scale / 2], tf.fill([out_size - 1], scale)], 0)
+    return tf.minimum(tf.cast(tf.math.cumsum(steps), tf.int32), in_size - 1)
+
+def decode_image(path, label):
+    """
+    Reads and resizes one image like flow_from_directory, pixel for pixel
+    (PIL's JPEG decoder settings and nearest-neighbour resize), so both
+    input sources feed the model identical images.
+    """
+    contents = tf.io.read_file(path)
+    image = tf.cond(
+        tf.io.is_jpeg(contents),
+        lambda: tf.io.decode_jpeg(contents, channels=config.CHANNELS, dct_method="INTEGER_ACCURATE"),
+        lambda: tf.io.decode_image(contents, channels=config.CHANNELS, expand_animations=False)
+    )
+    shape = tf.shape(image)
+    image = tf.gather(image, nearest_indices(shape[0], config.IMG_HEIGHT), axis=0)
+    image = tf.gather(image, nearest_indices(shape[1], config.IMG_WIDTH), axis=1)
+    return tf.cast(image, tf.uint8), tf.cast(label, tf.float32)
+
+def file_dataset(samples, batch_size, shuffle=False, seed=None, transform=None, cache=""):
+    """
+    Builds a pipeline that decodes image files in parallel.
+
+    Args:
+        samples: (file path, label) tuples
+        batch_size: Images per batch
+        shuffle: Shuffle images (reshuffled every epoch)
+        seed: Shuffle seed
+        transform: Function mapped over (uint8 images, float32 labels) batches
+        cache: tf.data cache file for decoded images, "" to cache them in memory
+
+    Returns:
+        tf.data.Dataset: Prefetched batches
+    """
+    paths = [path for path, _ in samples]
+    labels = [label for _, label in samples]
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(decode_image, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    # Unreadable files are skipped instead of failing the epoch
+    dataset = dataset.ignore_errors()
+    # Decode once; later epochs read the decoded images from the cache
+    dataset = dataset.cache(cache)
+    if shuffle:
+        dataset = dataset.shuffle(max(1, min(len(samples), config.SHUFFLE_BUFFER_SIZE)), seed=seed,
+                                  reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    if transform is not None:
+        dataset = dataset.map(transform, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def ensure_cache():
+    if not dataset_cache.is_current():
+        print("Dataset cache is missing or out of date, building it...")
+        dataset_cache.build_cache()
+
+def create_datasets(use_cache=config.USE_DATASET_CACHE, batch_size=config.BATCH_SIZE, seed=config.RANDOM_SEED):
+    """
+    Creates the training, validation, and testing pipelines. With the
+    dataset cache it is (re)built first if it is missing or older than the
+    images in the data directory.
+
+    Args:
+        use_cache: Stream the preprocessed dataset cache instead of decoding image files
+        batch_size: Images per batch
+        seed: Shuffle and augmentation seed
+
+    Returns:
+        tuple: (train_dataset, validation_dataset, test_dataset)
+    """
+    augment = make_augment(seed)
+    # Validation is augmented like the training data, as the ImageDataGenerator validation subset was
+    transforms = {"train": augment, "validation": augment, "test": rescale}
+
+    if use_cache:
+        ensure_cache()
+        return tuple(
+            dataset_cache.load_split_dataset(TRAIN_SPLITS if split == "train" else split, batch_size,
+                                             shuffle=split == "train", seed=seed, transform=transforms[split])
+            for split in dataset_cache.SPLITS
+        )
+
+    sources = dataset_cache.split_sources()
+    sources["train"] = sources["train"] + sources[dataset_cache.NEW_SPLIT]
+    return tuple(
+        file_dataset(sources[split], batch_size, shuffle=split == "train", seed=seed, transform=transforms[split],
+                     cache=f"{config.INPUT_PIPELINE_CACHE}_{split}" if config.INPUT_PIPELINE_CACHE else "")
+        for split in dataset_cache.SPLITS
+    )
+
+def train_image_count(use_cache=config.USE_DATASET_CACHE):
+    """
+    Images per epoch of create_datasets' training pipeline.
+    """
+    if use_cache:
+        ensure_cache()
+        manifest = dataset_cache.read_manifest()
+        return sum(manifest["splits"][split]["count"] for split in TRAIN_SPLITS)
+    sources = dataset_cache.split_sources()
+    return sum(len(sources[split]) for split in TRAIN_SPLITS)
+
+def create_incremental_datasets(replay_ratio=config.INCREMENTAL_REPLAY_RATIO, use_cache=config.USE_DATASET_CACHE,
+                                batch_size=config.BATCH_SIZE, seed=config.RANDOM_SEED):
+    """
+    Creates the pipelines for fine-tuning: the training pipeline holds the
+    new images plus a random replay sample of the training split, so the
+    model does not forget the old data; validation and testing are the same
+    as for a full training run.
+
+    Args:
+        replay_ratio: Replayed training images per new image
+        use_cache: Stream the preprocessed dataset cache instead of decoding image files
+        batch_size: Images per batch
+        seed: Sampling, shuffle and augmentation seed
+
+    Returns:
+        tuple: (train_dataset, validation_dataset, test_dataset, new image count, replayed image count)
+    """
+    augment = make_augment(seed)
+
+    if use_cache:
+        ensure_cache()
+        new_images, new_labels = dataset_cache.sample_split(dataset_cache.NEW_SPLIT)
+        replay_images, replay_labels = dataset_cache.sample_split("train", len(new_labels) * replay_ratio, seed)
+        images = np.concatenate([new_images, replay_images])
+        labels = np.concatenate([new_labels, replay_labels]).astype(np.float32)
+        train_dataset = (tf.data.Dataset.from_tensor_slices((images, labels))
+                         .shuffle(max(1, len(labels)), seed=seed, reshuffle_each_iteration=True)
+                         .batch(batch_size)
+                         .map(augment, num_parallel_calls=tf.data.AUTOTUNE)
+                         .prefetch(tf.data.AUTOTUNE))
+        validation_dataset = dataset_cache.load_split_dataset("validation", batch_size, transform=augment)
+        test_dataset = dataset_cache.load_split_dataset("test", batch_size, transform=rescale)
+        return train_dataset, validation_dataset, test_dataset, len(new_labels), len(replay_labels)
+
+    sources = dataset_cache.split_sources()
+    new_samples = sources[dataset_cache.NEW_SPLIT]
+    rng = np.random.default_rng(seed)
+    replay_count = min(len(new_samples) * replay_ratio, len(sources["train"]))
+    chosen = np.sort(rng.choice(len(sources["train"]), replay_count, replace=False))
+    replay_samples = [sources["train"][i] for i in chosen]
+    train_dataset = file_dataset(new_samples + replay_samples, batch_size, shuffle=True, seed=seed, transform=augment)
+    validation_dataset = file_dataset(sources["validation"], batch_size, transform=augment)
+    test_dataset = file_dataset(sources["test"], batch_size, transform=rescale)
+    return train_dataset, validation_dataset, test_dataset, len(new_samples), len(replay_samples)
@@ -3,20 +3,32 @@ Model definition and training for cat vs dog classifier.
 """
 
 import os
+import sys
+import shutil
+import config
+import performance  # Before TensorFlow, which reads the oneDNN setting on import
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
+from tensorflow.keras.callbacks import EarlyStopping
 import matplotlib.pyplot as plt
 import numpy as np
 import json
-import config
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import export
+import input_pipeline
+import profiling
 
-def create_model():
+def create_model(conv_filters=config.CONV_FILTERS, dense_units=config.DENSE_UNITS, dropout=config.DROPOUT,
+                 learning_rate=None):
     """
     Creates and returns a CNN model for image classification.
     
+    Args:
+        conv_filters: Filters of each convolution + max-pooling block
+        dense_units: Units of the fully connected layer
+        dropout: Dropout rate before the output layer
+        learning_rate: Learning rate, by default LEARNING_RATE scaled for the training batch size
+    
     Returns:
         model: A compiled Keras model
     """
@@ -24,100 +36,64 @@ def create_model():
     os.makedirs(os.path.dirname(config.CHECKPOINT_PATH), exist_ok=True)
     
     # Define the model architecture
-    model = Sequential([
-        # First convolutional layer
-        Conv2D(32, (3, 3), activation='relu', input_shape=(config.IMG_HEIGHT, config.IMG_WIDTH, config.CHANNELS)),
-        MaxPooling2D(2, 2),
-        
-        # Second convolutional layer
-        Conv2D(64, (3, 3), activation='relu'),
-        MaxPooling2D(2, 2),
-        
-        # Third convolutional layer
-        Conv2D(128, (3, 3), activation='relu'),
-        MaxPooling2D(2, 2),
-        
-        # Flatten and fully connected layers
-        Flatten(),
-        Dense(512, activation='relu'),
-        Dropout(0.5),  # Dropout for regularization
-        Dense(1, activation='sigmoid')  # Binary classification (cat or dog)
-    ])
+    model = Sequential()
+    input_shape = (config.IMG_HEIGHT, config.IMG_WIDTH, config.CHANNELS)
+    for index, filters in enumerate(conv_filters):
+        # Convolutional layer, the first one taking the images
+        if index == 0:
+            model.add(Conv2D(filters, (3, 3), activation='relu', input_shape=input_shape))
+        else:
+            model.add(Conv2D(filters, (3, 3), activation='relu'))
+        model.add(MaxPooling2D(2, 2))
+    
+    # Flatten and fully connected layers
+    model.add(Flatten())
+    model.add(Dense(dense_units, activation='relu'))
+    model.add(Dropout(dropout))  # Dropout for regularization
+    # Binary classification (cat or dog), in float32 even under mixed precision
+    model.add(Dense(1, activation='sigmoid', dtype='float32'))
     
     # Compile the model
-    model.compile(
-        optimizer=tf.keras.optimizers.get(config.OPTIMIZER),
-        loss='binary_crossentropy',
-        metrics=['accuracy']
-    )
+    compile_model(model, performance.learning_rate() if learning_rate is None else learning_rate)
     
     # Print model summary
     model.summary()
     
     return model
 
-def create_data_generators():
+def compile_model(model, learning_rate):
     """
-    Creates and returns data generators for training, validation, and testing.
-    
-    Returns:
-        tuple: (train_generator, validation_generator, test_generator)
+    Compiles the model with the configured optimizer at `learning_rate`.
     """
-    # Data augmentation for training
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        rotation_range=20,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        shear_range=0.2,
-        zoom_range=0.2,
-        horizontal_flip=True,
-        validation_split=config.VALIDATION_SPLIT
-    )
-    
-    # Only rescaling for testing
-    test_datagen = ImageDataGenerator(rescale=1./255)
-    
-    # Training generator with validation split
-    train_generator = train_datagen.flow_from_directory(
-        config.TRAIN_DIR,
-        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
-        batch_size=config.BATCH_SIZE,
-        class_mode='binary',
-        subset='training'
-    )
-    
-    # Validation generator
-    validation_generator = train_datagen.flow_from_directory(
-        config.TRAIN_DIR,
-        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
-        batch_size=config.BATCH_SIZE,
-        class_mode='binary',
-        subset='validation'
-    )
-    
-    # Test generator
-    test_generator = test_datagen.flow_from_directory(
-        config.TEST_DIR,
-        target_size=(config.IMG_HEIGHT, config.IMG_WIDTH),
-        batch_size=config.BATCH_SIZE,
-        class_mode='binary'
+    model.compile(
+        optimizer=tf.keras.optimizers.get({"class_name": config.OPTIMIZER, "config": {"learning_rate": learning_rate}}),
+        loss='binary_crossentropy',
+        metrics=['accuracy'],
+        jit_compile=config.TRAINING_XLA_JIT
     )
-    
-    return train_generator, validation_generator, test_generator
 
-def train_model(model, train_generator, validation_generator):
+def train_model(model, train_dataset, validation_dataset, train_images, epochs=config.EPOCHS, profiler=None):
     """
-    Trains the model using the provided data generators.
+    Trains the model using the provided input pipelines.
     
     Args:
         model: Compiled Keras model
-        train_generator: Training data generator
-        validation_generator: Validation data generator
+        train_dataset: Training dataset
+        validation_dataset: Validation dataset
+        train_images: Images per training epoch, for the images/sec log
+        epochs: Maximum number of epochs
+        profiler: TrainingProfiler to record the run with, or None
     
     Returns:
         history: Training history
     """
+    checkpoint = profiling.TimedModelCheckpoint(
+        filepath=config.CHECKPOINT_PATH,
+        monitor='val_accuracy',
+        save_best_only=True,
+        verbose=1
+    )
+    
     # Define callbacks
     callbacks = [
         EarlyStopping(
@@ -125,37 +101,40 @@ def train_model(model, train_generator, validation_generator):
             patience=config.EARLY_STOPPING_PATIENCE,
             restore_best_weights=True
         ),
-        ModelCheckpoint(
-            filepath=config.CHECKPOINT_PATH,
-            monitor='val_accuracy',
-            save_best_only=True,
-            verbose=1
-        )
+        checkpoint,
+        performance.Throughput(train_images)
     ]
+    if config.TRAINING_BATCH_MULTIPLIER > 1 and config.TRAINING_LR_WARMUP_EPOCHS > 0:
+        lr_scale = performance.learning_rate(1.0)
+        callbacks.append(performance.LearningRateWarmup(lr_scale, config.TRAINING_LR_WARMUP_EPOCHS))
+    if profiler is not None:
+        profiler.checkpoint = checkpoint
+        train_dataset = profiler.instrument(train_dataset)
+        callbacks.append(profiler)
     
     # Train the model
     history = model.fit(
-        train_generator,
-        epochs=config.EPOCHS,
-        validation_data=validation_generator,
+        train_dataset,
+        epochs=epochs,
+        validation_data=validation_dataset,
         callbacks=callbacks
     )
     
     return history
 
-def evaluate_model(model, test_generator):
+def evaluate_model(model, test_dataset):
     """
     Evaluates the model on the test data.
     
     Args:
         model: Trained Keras model
-        test_generator: Test data generator
+        test_dataset: Test dataset
     
     Returns:
         results: Evaluation results dictionary
     """
     # Evaluate the model
-    test_loss, test_accuracy = model.evaluate(test_generator)
+    test_loss, test_accuracy = model.evaluate(test_dataset)
     
     print(f"Test Loss: {test_loss:.4f}")
     print(f"Test Accuracy: {test_accuracy:.4f}")
@@ -166,6 +145,97 @@ def evaluate_model(model, test_generator):
         "test_accuracy": float(test_accuracy)
     }
 
+def train_full(profiler=None):
+    """
+    Trains a new model from scratch on the training split and new_data.
+    
+    Args:
+        profiler: TrainingProfiler to record training with, or None
+    
+    Returns:
+        tuple: (model, history, eval_results)
+    """
+    # Create the model
+    print("Creating model...")
+    model = create_model()
+    
+    # Create input pipelines (assumes data_preprocessing.py has already been run)
+    print("Creating input pipelines...")
+    train_dataset, validation_dataset, test_dataset = input_pipeline.create_datasets(batch_size=performance.batch_size())
+    
+    # Train the model
+    print("Training model...")
+    history = train_model(model, train_dataset, validation_dataset, input_pipeline.train_image_count(),
+                          profiler=profiler)
+    
+    # Evaluate the checkpoint that gets exported, not EarlyStopping's in-memory weights
+    print("Evaluating model...")
+    model = tf.keras.models.load_model(config.CHECKPOINT_PATH)
+    eval_results = evaluate_model(model, test_dataset)
+    
+    return model, history, eval_results
+
+def fine_tune(profiler=None):
+    """
+    Fine-tunes the current checkpoint on new_data mixed with a replay sample
+    of the training split, with its own epoch budget and learning rate. If
+    test accuracy drops by more than INCREMENTAL_MAX_ACCURACY_DROP compared
+    to the current model, the previous checkpoint is restored. The gate
+    evaluates the saved checkpoint, the model that is exported and served.
+    
+    Args:
+        profiler: TrainingProfiler to record training with, or None
+    
+    Returns:
+        tuple: (model, history, eval_results, mode_info), or None if there
+            were no new images or the fine-tuned model regressed
+    """
+    print("Creating input pipelines...")
+    train_dataset, validation_dataset, test_dataset, new_count, replay_count = \
+        input_pipeline.create_incremental_datasets(batch_size=performance.batch_size())
+    if new_count == 0:
+        print(f"No labeled images in {config.NEW_DATA_DIR} to fine-tune on")
+        return None
+    print(f"Fine-tuning on {new_count} new and {replay_count} replayed images...")
+    
+    # The checkpoint callback overwrites the checkpoint, keep the current model to roll back to
+    backup_path = f"{config.CHECKPOINT_PATH}.previous"
+    shutil.copy2(config.CHECKPOINT_PATH, backup_path)
+    
+    model = tf.keras.models.load_model(config.CHECKPOINT_PATH)
+    print("Evaluating current model...")
+    baseline = evaluate_model(model, test_dataset)
+    
+    # Checkpoints are float32; fine-tune in the configured precision
+    model = performance.with_precision(model, tf.keras.mixed_precision.global_policy().name)
+    learning_rate = performance.learning_rate(config.INCREMENTAL_LEARNING_RATE)
+    compile_model(model, learning_rate)
+    print("Training model...")
+    history = train_model(model, train_dataset, validation_dataset, new_count + replay_count,
+                          epochs=config.INCREMENTAL_EPOCHS, profiler=profiler)
+    
+    # Gate the checkpoint (best val_accuracy), not EarlyStopping's in-memory weights
+    print("Evaluating model...")
+    model = tf.keras.models.load_model(config.CHECKPOINT_PATH)
+    eval_results = evaluate_model(model, test_dataset)
+    
+    accuracy_drop = baseline["test_accuracy"] - eval_results["test_accuracy"]
+    if accuracy_drop > config.INCREMENTAL_MAX_ACCURACY_DROP:
+        print(f"Test accuracy dropped by {accuracy_drop:.4f} (limit {config.INCREMENTAL_MAX_ACCURACY_DROP}), "
+              f"restoring the previous model")
+        os.replace(backup_path, config.CHECKPOINT_PATH)
+        return None
+    os.remove(backup_path)
+    
+    mode_info = {
+        "new_images": new_count,
+        "replayed_images": replay_count,
+        "baseline_test_accuracy": baseline["test_accuracy"],
+        "learning_rate": learning_rate,
+        "max_epochs": config.INCREMENTAL_EPOCHS
+    }
+    return model, history, eval_results, mode_info
+
 def plot_training_history(history):
     """
     Plots the training and validation accuracy/loss.
@@ -225,15 +295,19 @@ def plot_training_history(history):
     plt.savefig('ml_part/plots/loss.png')
     plt.close()
 
-def save_metrics(train_history, eval_results):
+def save_metrics(train_history, eval_results, training_mode, performance_settings, profile=None):
     """
     Save metrics in JSON format for DVC tracking.
     
     Args:
         train_history: Training history object
         eval_results: Evaluation results dictionary
+        training_mode: Mode that was run, mode requested, and fine-tuning details
+        performance_settings: Threading, precision and batch settings training ran with
+        profile: TrainingProfiler summary, or None if training was not profiled
     """
     # Extract final values from training history
+    images_per_sec = train_history.history['images_per_sec']
     final_epoch = len(train_history.history['accuracy'])
     train_accuracy = float(train_history.history['accuracy'][-1])
     val_accuracy = float(train_history.history['val_accuracy'][-1])
@@ -261,8 +335,16 @@ def save_metrics(train_history, eval_results):
             "batch_size": config.BATCH_SIZE,
             "learning_rate": config.LEARNING_RATE,
             "max_epochs": config.EPOCHS
+        },
+        "training_mode": training_mode,
+        "performance": {
+            **performance_settings,
+            "images_per_sec_per_epoch": [float(rate) for rate in images_per_sec],
+            "mean_images_per_sec": float(np.mean(images_per_sec))
         }
     }
+    if profile is not None:
+        metrics["profile"] = profile
     
     # Save metrics to JSON file
     with open('ml_part/metrics.json', 'w') as f:
@@ -274,31 +356,64 @@ def main():
     """
     Main function to run the training pipeline.
     """
+    # Threading and precision have to be set before TensorFlow starts running ops
+    performance_settings = performance.configure()
+    
     # Set random seeds for reproducibility
     tf.random.set_seed(config.RANDOM_SEED)
     np.random.seed(config.RANDOM_SEED)
     
-    # Create the model
-    print("Creating model...")
-    model = create_model()
-    
-    # Create data generators (assumes data_preprocessing.py has already been run)
-    print("Creating data generators...")
-    train_generator, validation_generator, test_generator = create_data_generators()
-    
-    # Train the model
-    print("Training model...")
-    history = train_model(model, train_generator, validation_generator)
-    
-    # Evaluate the model
-    print("Evaluating model...")
-    eval_results = evaluate_model(model, test_generator)
+    profiler = None
+    if config.TRAINING_PROFILE:
+        profiler = profiling.TrainingProfiler(profiling.parse_trace_steps(config.TRAINING_PROFILE_TRACE_STEPS))
+    
+    requested_mode = config.TRAINING_MODE
+    if requested_mode not in config.TRAINING_MODES:
+        sys.exit(f"TRAINING_MODE must be one of {list(config.TRAINING_MODES)}, got {requested_mode!r}")
+    
+    result = None
+    training_mode = {"mode": "full", "requested_mode": requested_mode, "fallback": False}
+    if requested_mode == "incremental":
+        if os.path.exists(config.CHECKPOINT_PATH):
+            result = fine_tune(profiler)
+            if result is None and not config.INCREMENTAL_FALLBACK_TO_FULL:
+                sys.exit("Incremental training produced no model and INCREMENTAL_FALLBACK_TO_FULL is disabled")
+        else:
+            print(f"No checkpoint at {config.CHECKPOINT_PATH} to fine-tune")
+        if result is None:
+            print("Falling back to full training...")
+            training_mode["fallback"] = True
+    
+    if result is not None:
+        model, history, eval_results, mode_info = result
+        training_mode.update(mode="incremental", **mode_info)
+    else:
+        model, history, eval_results = train_full(profiler)
+    
+    # Keep the checkpoint and serving exports in float32 whatever precision training ran in
+    if performance_settings["precision"] != "float32":
+        tf.keras.mixed_precision.set_global_policy("float32")
+        checkpoint = tf.keras.models.load_model(config.CHECKPOINT_PATH)
+        performance.with_precision(checkpoint, "float32").save(config.CHECKPOINT_PATH)
     
     # Plot training history
     plot_training_history(history)
     
     # Save metrics for DVC
-    save_metrics(history, eval_results)
+    profile = None
+    if profiler is not None:
+        profiler.save()
+        profile = profiler.summary()
+    save_metrics(history, eval_results, training_mode, performance_settings, profile)
+    
+    # Export serving artifacts for the backend's inference backends. The in-memory model holds
+    # EarlyStopping's best-val_loss weights, the checkpoint the best-val_accuracy ones; export the
+    # checkpoint so every backend serves the same weights as model.h5
+    print("Exporting serving models...")
+    serving_model = tf.keras.models.load_model(config.CHECKPOINT_PATH)
+    export.export_tflite(serving_model, config.TFLITE_PATH)
+    if config.EXPORT_ONNX:
+        export.export_onnx(serving_model, config.ONNX_PATH)
     
     print(f"Model saved to {config.CHECKPOINT_PATH}")
     print("Training complete!")
@@ -0,0 +1,136 @@
+"""
+Training performance settings: CPU threading, oneDNN, XLA JIT compilation,
+bfloat16 mixed precision and large-batch training with learning-rate scaling.
+
+Import this module before TensorFlow: TensorFlow reads the oneDNN switch
+from the environment when it is first imported.
+"""
+
+import os
+import math
+import time
+import config
+
+os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1" if config.TRAINING_ONEDNN else "0")
+
+import tensorflow as tf
+
+LR_SCALINGS = ("linear", "sqrt", "none")
+
+def bf16_supported():
+    """
+    Whether the CPU has native bfloat16 instructions (AVX512_BF16 or AMX).
+    Elsewhere bfloat16 is emulated and slower than float32.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = {flag for line in f if line.startswith("flags") for flag in line.split(":", 1)[1].split()}
+    except OSError:
+        return False
+    return bool(flags & {"avx512_bf16", "amx_bf16"})
+
+def batch_size():
+    return config.BATCH_SIZE * config.TRAINING_BATCH_MULTIPLIER
+
+def learning_rate(base=config.LEARNING_RATE):
+    """
+    Learning rate for the training batch size: `base` is the rate for
+    BATCH_SIZE, scaled with TRAINING_BATCH_MULTIPLIER per TRAINING_LR_SCALING.
+    """
+    if config.TRAINING_LR_SCALING not in LR_SCALINGS:
+        raise ValueError(f"TRAINING_LR_SCALING must be one of {list(LR_SCALINGS)}, got {config.TRAINING_LR_SCALING!r}")
+    multiplier = config.TRAINING_BATCH_MULTIPLIER
+    scale = {"linear": multiplier, "sqrt": math.sqrt(multiplier), "none": 1}[config.TRAINING_LR_SCALING]
+    return base * scale
+
+def configure():
+    """
+    Applies the threading and precision settings. Call before TensorFlow runs
+    any op and before building models.
+
+    Returns:
+        dict: The effective settings, for metrics.json
+    """
+    if config.TRAINING_INTRA_OP_THREADS:
+        tf.config.threading.set_intra_op_parallelism_threads(config.TRAINING_INTRA_OP_THREADS)
+    if config.TRAINING_INTER_OP_THREADS:
+        tf.config.threading.set_inter_op_parallelism_threads(config.TRAINING_INTER_OP_THREADS)
+
+    policy = "float32"
+    if config.TRAINING_MIXED_PRECISION:
+        if bf16_supported():
+            policy = "mixed_bfloat16"
+        else:
+            print("This CPU has no native bfloat16 support, training in float32")
+    tf.keras.mixed_precision.set_global_policy(policy)
+
+    return {
+        "cpu_count": os.cpu_count(),
+        "intra_op_threads": config.TRAINING_INTRA_OP_THREADS,
+        "inter_op_threads": config.TRAINING_INTER_OP_THREADS,
+        "onednn": os.environ["TF_ENABLE_ONEDNN_OPTS"] != "0",
+        "xla_jit": config.TRAINING_XLA_JIT,
+        "precision": policy,
+        "batch_size": batch_size(),
+        "learning_rate": learning_rate(),
+        "lr_scaling": config.TRAINING_LR_SCALING,
+    }
+
+def with_precision(model, policy):
+    """
+    Copy of a Sequential model whose layers compute in `policy`, sharing its
+    weights' values. The output layer always stays float32, so the sigmoid
+    and the loss are computed in full precision.
+    """
+    output_layer = model.layers[-1]
+
+    def clone_layer(layer):
+        layer_config = layer.get_config()
+        layer_config["dtype"] = "float32" if layer is output_layer else policy
+        return layer.__class__.from_config(layer_config)
+
+    copy = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    copy.set_weights(model.get_weights())
+    return copy
+
+class LearningRateWarmup(tf.keras.callbacks.Callback):
+    """
+    Ramps the learning rate linearly from the unscaled rate up to the
+    compiled, batch-scaled rate over the first `epochs` epochs, which keeps
+    large-batch training stable early on.
+    """
+
+    def __init__(self, scale, epochs):
+        super().__init__()
+        self.scale = scale
+        self.epochs = epochs
+
+    def on_train_begin(self, logs=None):
+        self.target = float(self.model.optimizer.learning_rate)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        if epoch <= self.epochs:
+            start = self.target / self.scale
+            self.model.optimizer.learning_rate = start + (self.target - start) * epoch / self.epochs
+
+class Throughput(tf.keras.callbacks.Callback):
+    """
+    Logs training images/sec of every epoch as `images_per_sec`, timed from
+    the start of the epoch to its last training step (validation excluded).
+    """
+
+    def __init__(self, images_per_epoch):
+        super().__init__()
+        self.images_per_epoch = images_per_epoch
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = self.end = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        rate = self.images_per_epoch / max(self.end - self.start, 1e-9)
+        print(f"Epoch {epoch + 1}: {rate:.1f} images/sec")
+        if logs is not None:
+            logs["images_per_sec"] = rate
@@ -0,0 +1,224 @@
+"""
+Opt-in training profiler (TRAINING_PROFILE).
+
+Records, for every training step, the time spent waiting for the input
+pipeline and computing, and for every epoch samples/sec, peak RSS and the
+checkpoint write time. The report goes to ml_part/plots (profile.png and CSV
+data for DVC plots) and under "profile" in metrics.json. A TensorBoard trace
+of a window of steps can be captured with TRAINING_PROFILE_TRACE_STEPS.
+"""
+
+import os
+import csv
+import time
+import resource
+from collections import deque
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import ModelCheckpoint
+import config
+
+# Columns of profile_steps.csv and profile_epochs.csv
+STEP_FIELDS = ("step", "epoch", "step_seconds", "input_wait_seconds", "compute_seconds", "samples")
+EPOCH_FIELDS = ("epoch", "samples_per_sec", "input_wait_fraction", "checkpoint_seconds", "peak_rss_mb")
+
+class TimedModelCheckpoint(ModelCheckpoint):
+    """
+    ModelCheckpoint that records how long its end-of-epoch save takes
+    (close to zero in epochs where save_best_only skips the write).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_seconds = []
+
+    def on_epoch_end(self, epoch, logs=None):
+        start = time.perf_counter()
+        super().on_epoch_end(epoch, logs)
+        self.write_seconds.append(time.perf_counter() - start)
+
+def parse_trace_steps(value):
+    """
+    Parses a "start:stop" global step window, "" for no trace.
+
+    Returns:
+        tuple: (start, stop) or None
+    """
+    if not value:
+        return None
+    start, stop = (int(step) for step in value.split(":"))
+    if not 0 <= start < stop:
+        raise ValueError(f"TRAINING_PROFILE_TRACE_STEPS must be 'start:stop' with 0 <= start < stop, got {value!r}")
+    return start, stop
+
+class TrainingProfiler(tf.keras.callbacks.Callback):
+    """
+    Profiles model.fit. The training dataset has to go through `instrument`,
+    which timestamps each batch as it leaves the input pipeline. A step whose
+    batch was not ready when it started waited for input until the timestamp;
+    the rest of the step is compute.
+    `checkpoint` has to be set to the run's TimedModelCheckpoint, which must
+    come before the profiler in the callback list.
+
+    Args:
+        trace_steps: (start, stop) global steps to capture a TensorBoard trace of, or None
+        trace_dir: TensorBoard log directory of the trace
+    """
+
+    def __init__(self, trace_steps=None, trace_dir=config.TRAINING_PROFILE_TRACE_DIR):
+        super().__init__()
+        self.trace_steps = trace_steps
+        self.trace_dir = trace_dir
+        self.checkpoint = None
+        self.tracing = False
+        self.ready = deque()
+
+    def on_train_begin(self, logs=None):
+        # A profiler reused for another fit (e.g. the full-training fallback) reports that run only
+        self.global_step = 0
+        self.steps = []
+        self.epochs = []
+
+    def instrument(self, dataset):
+        """
+        Returns the dataset with each batch timestamped when the input
+        pipeline produces it. Apply it last, after prefetch.
+        """
+        def stamp(size):
+            # Keras fetches the next batch while a step runs, so stamps are matched to steps in order
+            self.ready.append((time.perf_counter(), int(size)))
+            return np.int64(0)
+
+        def timestamped(images, labels):
+            done = tf.py_function(stamp, [tf.shape(images)[0]], tf.int64)
+            with tf.control_dependencies([done]):
+                return tf.identity(images), labels
+
+        return dataset.map(timestamped)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.epoch_start = len(self.steps)
+        self.ready.clear()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.trace_steps and self.global_step == self.trace_steps[0]:
+            tf.profiler.experimental.start(self.trace_dir)
+            self.tracing = True
+        self.step_begin = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        ready, size = self.ready.popleft() if self.ready else (self.step_begin, 0)
+        ready = max(ready, self.step_begin)
+        self.steps.append({
+            "step": self.global_step,
+            "epoch": self.epoch + 1,
+            "step_seconds": end - self.step_begin,
+            "input_wait_seconds": ready - self.step_begin,
+            "compute_seconds": end - ready,
+            "samples": size,
+        })
+        self.global_step += 1
+        if self.tracing and self.global_step == self.trace_steps[1]:
+            self.stop_trace()
+
+    def on_epoch_end(self, epoch, logs=None):
+        steps = self.steps[self.epoch_start:]
+        step_seconds = sum(step["step_seconds"] for step in steps)
+        input_wait = sum(step["input_wait_seconds"] for step in steps)
+        self.epochs.append({
+            "epoch": epoch + 1,
+            "samples_per_sec": sum(step["samples"] for step in steps) / max(step_seconds, 1e-9),
+            "input_wait_fraction": input_wait / max(step_seconds, 1e-9),
+            # The checkpoint callback runs before this one, so its time for this epoch is recorded
+            "checkpoint_seconds": self.checkpoint.write_seconds[-1] if self.checkpoint.write_seconds else 0.0,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+
+    def on_train_end(self, logs=None):
+        if self.tracing:
+            self.stop_trace()
+
+    def stop_trace(self):
+        tf.profiler.experimental.stop()
+        self.tracing = False
+        print(f"TensorBoard trace of steps {self.trace_steps[0]}-{self.trace_steps[1] - 1} saved to {self.trace_dir}")
+
+    def summary(self):
+        """
+        Run-level profile for metrics.json. Step statistics leave out the
+        first step, which includes tracing the training function. Statistics
+        are zero if training stopped before any step or epoch completed.
+
+        Returns:
+            dict: Step time percentiles, input wait share, throughput, memory and checkpoint times
+        """
+        steps = self.steps[1:] or self.steps
+        step_seconds = np.array([step["step_seconds"] for step in steps])
+        input_wait = np.array([step["input_wait_seconds"] for step in steps])
+        checkpoint_seconds = [epoch["checkpoint_seconds"] for epoch in self.epochs]
+        return {
+            "steps": len(self.steps),
+            "step_seconds_p50": float(np.percentile(step_seconds, 50)) if steps else 0.0,
+            "step_seconds_p95": float(np.percentile(step_seconds, 95)) if steps else 0.0,
+            "input_wait_fraction": float(input_wait.sum() / max(step_seconds.sum(), 1e-9)),
+            "samples_per_sec": float(sum(step["samples"] for step in steps) / max(step_seconds.sum(), 1e-9)),
+            "peak_rss_mb": float(max((epoch["peak_rss_mb"] for epoch in self.epochs), default=0.0)),
+            "checkpoint_seconds_total": float(sum(checkpoint_seconds)),
+            "checkpoint_seconds_max": float(max(checkpoint_seconds, default=0.0)),
+            "trace_dir": self.trace_dir if self.trace_steps else None,
+        }
+
+    def save(self, plots_dir="ml_part/plots"):
+        """
+        Writes the per-step and per-epoch profile as CSV and profile.png.
+        """
+        import matplotlib.pyplot as plt
+
+        os.makedirs(plots_dir, exist_ok=True)
+        for name, fields, rows in (("profile_steps.csv", STEP_FIELDS, self.steps),
+                                   ("profile_epochs.csv", EPOCH_FIELDS, self.epochs)):
+            with open(os.path.join(plots_dir, name), "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+
+        steps = [step["step"] for step in self.steps]
+        epochs = [epoch["epoch"] for epoch in self.epochs]
+        plt.figure(figsize=(12, 8))
+
+        plt.subplot(2, 2, 1)
+        plt.plot(steps, [step["input_wait_seconds"] for step in self.steps])
+        plt.plot(steps, [step["compute_seconds"] for step in self.steps])
+        plt.title('Step Time')
+        plt.ylabel('Seconds')
+        plt.xlabel('Step')
+        plt.legend(['Input wait', 'Compute'], loc='upper right')
+        plt.grid(True)
+
+        plt.subplot(2, 2, 2)
+        plt.plot(epochs, [epoch["samples_per_sec"] for epoch in self.epochs], marker='o')
+        plt.title('Training Throughput')
+        plt.ylabel('Samples/sec')
+        plt.xlabel('Epoch')
+        plt.grid(True)
+
+        plt.subplot(2, 2, 3)
+        plt.plot(epochs, [epoch["peak_rss_mb"] for epoch in self.epochs], marker='o')
+        plt.title('Peak RSS')
+        plt.ylabel('MB')
+        plt.xlabel('Epoch')
+        plt.grid(True)
+
+        plt.subplot(2, 2, 4)
+        plt.bar(epochs, [epoch["checkpoint_seconds"] for epoch in self.epochs])
+        plt.title('Checkpoint Write Time')
+        plt.ylabel('Seconds')
+        plt.xlabel('Epoch')
+        plt.grid(True)
+
+        plt.tight_layout()
+        plt.savefig(os.path.join(plots_dir, 'profile.png'))
+        plt.close()
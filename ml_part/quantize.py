@@ -0,0 +1,159 @@
+"""
+Post-training quantization of the trained cat vs dog classifier.
+
+Produces a quantized TFLite model calibrated on training images, evaluates it
+and the float TFLite model on the test set, and only promotes the quantized
+model for serving if its accuracy drop stays within the configured threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import numpy as np
+import tensorflow as tf
+import config
+import export
+
+# Evaluate on exactly the pixels the serving API feeds the model
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import imaging
+
+CLASS_NAMES = ["cats", "dogs"]  # Label 0 = cat, 1 = dog, as in flow_from_directory
+
+def list_images(directory):
+    """
+    Lists the images of a train/test directory with their labels.
+
+    Args:
+        directory: Directory with one subdirectory per class
+
+    Returns:
+        list: (file path, label) tuples
+    """
+    samples = []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(directory, class_name)
+        for file in sorted(os.listdir(class_dir)):
+            samples.append((os.path.join(class_dir, file), label))
+    return samples
+
+def load_image(path):
+    """
+    Loads an image with the serving API's preprocessing (backend/imaging.py):
+    JPEG draft decode, RGB, bicubic resize, uint8.
+
+    Args:
+        path: Path to the image file
+
+    Returns:
+        numpy.ndarray: (H, W, C) uint8 array
+    """
+    with open(path, "rb") as f:
+        return imaging.decode_image(f.read(), (config.IMG_WIDTH, config.IMG_HEIGHT))[0]
+
+def representative_images(samples, count):
+    """
+    Yields a random sample of training images to calibrate activation ranges.
+
+    Args:
+        samples: (file path, label) tuples of the training set
+        count: Number of images to yield
+    """
+    rng = np.random.default_rng(config.RANDOM_SEED)
+    for i in rng.choice(len(samples), size=count, replace=False):
+        yield load_image(samples[i][0])
+
+def evaluate_tflite(model_path, test_images, test_labels):
+    """
+    Evaluates a TFLite model one image at a time, as the API sees requests.
+
+    Args:
+        model_path: Path to the .tflite file
+        test_images: (N, H, W, C) uint8 array
+        test_labels: (N,) array of 0/1 labels
+
+    Returns:
+        dict: Accuracy, model size and per-image latency
+    """
+    interpreter = tf.lite.Interpreter(model_path=model_path)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+
+    predictions = np.empty(len(test_images), dtype=np.float32)
+    latencies = np.empty(len(test_images))
+    for i, image in enumerate(test_images):
+        start = time.perf_counter()
+        interpreter.set_tensor(input_index, image[None, ...])
+        interpreter.invoke()
+        predictions[i] = interpreter.get_tensor(output_index)[0][0]
+        latencies[i] = time.perf_counter() - start
+
+    accuracy = float(np.mean((predictions > 0.5) == test_labels))
+    return {
+        "accuracy": accuracy,
+        "size_mb": os.path.getsize(model_path) / 1e6,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000)
+    }
+
+def main():
+    """
+    Main function to run the quantization pipeline.
+    """
+    print(f"Loading model from {config.CHECKPOINT_PATH}")
+    model = tf.keras.models.load_model(config.CHECKPOINT_PATH)
+
+    # The float baseline the quantized model must match comes from the same checkpoint. It is
+    # a scratch file: model.tflite is an output of the train stage and is never rewritten here
+    export.export_tflite(model, config.QUANTIZED_BASELINE_PATH)
+
+    print(f"Quantizing model ({config.QUANTIZATION_MODE})...")
+    train_samples = list_images(config.TRAIN_DIR)
+    calibration_samples = min(config.QUANTIZATION_CALIBRATION_SAMPLES, len(train_samples))
+    export.export_quantized_tflite(model, config.QUANTIZED_CANDIDATE_PATH,
+                                   representative_images(train_samples, calibration_samples),
+                                   mode=config.QUANTIZATION_MODE)
+
+    print("Loading test set...")
+    test_samples = list_images(config.TEST_DIR)
+    test_images = np.stack([load_image(path) for path, _ in test_samples])
+    test_labels = np.array([label for _, label in test_samples])
+
+    print("Evaluating float model...")
+    float_results = evaluate_tflite(config.QUANTIZED_BASELINE_PATH, test_images, test_labels)
+    print("Evaluating quantized model...")
+    quantized_results = evaluate_tflite(config.QUANTIZED_CANDIDATE_PATH, test_images, test_labels)
+
+    # Accuracy gate: only a model within the allowed drop is served
+    accuracy_drop = float_results["accuracy"] - quantized_results["accuracy"]
+    promoted = accuracy_drop <= config.QUANTIZATION_MAX_ACCURACY_DROP
+    if promoted:
+        shutil.copyfile(config.QUANTIZED_CANDIDATE_PATH, config.QUANTIZED_PATH)
+        print(f"Quantized model promoted to {config.QUANTIZED_PATH}")
+    else:
+        if os.path.exists(config.QUANTIZED_PATH):
+            os.remove(config.QUANTIZED_PATH)
+        print(f"Quantized model NOT promoted: accuracy drop {accuracy_drop:.4f} exceeds "
+              f"{config.QUANTIZATION_MAX_ACCURACY_DROP:.4f}")
+
+    metrics = {
+        "float": float_results,
+        config.QUANTIZATION_MODE: quantized_results,
+        "accuracy_drop": accuracy_drop,
+        "max_accuracy_drop": config.QUANTIZATION_MAX_ACCURACY_DROP,
+        "test_samples": len(test_samples),
+        "calibration_samples": calibration_samples,
+        "promoted": promoted
+    }
+    with open(config.QUANTIZATION_METRICS_PATH, 'w') as f:
+        json.dump(metrics, f, indent=4)
+
+    print(f"Float accuracy: {float_results['accuracy']:.4f}, "
+          f"quantized accuracy: {quantized_results['accuracy']:.4f}")
+    print(f"Metrics saved to {config.QUANTIZATION_METRICS_PATH}")
+
+if __name__ == "__main__":
+    main()
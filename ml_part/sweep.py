@@ -0,0 +1,327 @@
+"""
+Hyperparameter sweep with asynchronous successive halving (ASHA).
+
+Trials sample batch size, learning rate, dropout and layer widths from the
+search space in SWEEP_SPACE_PATH and train in parallel worker processes,
+each with SWEEP_THREADS_PER_TRIAL TensorFlow threads. Training runs in rungs
+of SWEEP_MIN_EPOCHS * SWEEP_REDUCTION_FACTOR**k epochs. Whenever a worker is
+free, a trial in the top 1/SWEEP_REDUCTION_FACTOR of a rung (by validation
+accuracy) is promoted to the next rung, otherwise a new trial starts; trials
+never promoted are pruned. Every trial streams the preprocessed dataset
+cache, so the images are decoded once for the whole sweep.
+
+The ranked results go to SWEEP_DIR/results.csv and the best trial to
+SWEEP_DIR/metrics.json. The sweep is a DVC pipeline of its own, so
+reproducing the training pipeline does not run it:
+    dvc repro ml_part/sweeps/dvc.yaml
+or directly, from the project root:
+    python ml_part/sweep.py --trials 16
+"""
+
+import os
+import csv
+import json
+import math
+import time
+import shutil
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+import config
+import dataset_cache
+
+# Tunable hyperparameters and their values outside a sweep
+PARAMETERS = {
+    "batch_size": config.BATCH_SIZE,
+    "learning_rate": config.LEARNING_RATE,
+    "dropout": config.DROPOUT,
+    "dense_units": config.DENSE_UNITS,
+    "conv_filters": list(config.CONV_FILTERS),
+}
+
+def load_space(path=config.SWEEP_SPACE_PATH):
+    with open(path) as f:
+        space = json.load(f)
+    unknown = set(space) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}, expected some of {list(PARAMETERS)}")
+    return space
+
+def sample_params(space, rng):
+    """
+    Draws the hyperparameters of one trial. A list in the search space is a
+    set of choices, {"min": ..., "max": ...} a uniform range ("log": true for
+    log-uniform, "int": true to round). Parameters not in the space keep
+    their config.py values.
+
+    Returns:
+        dict: Parameter name -> value
+    """
+    params = dict(PARAMETERS)
+    for name, values in space.items():
+        if isinstance(values, list):
+            params[name] = values[rng.integers(len(values))]
+            continue
+        low, high = values["min"], values["max"]
+        if values.get("log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        params[name] = int(round(value)) if values.get("int") else float(value)
+    return params
+
+def rung_epochs(min_epochs, factor, max_epochs):
+    """
+    Total epochs a trial has trained after each rung: min_epochs * factor**k, up to max_epochs.
+    """
+    epochs = [min_epochs]
+    while epochs[-1] * factor <= max_epochs:
+        epochs.append(epochs[-1] * factor)
+    return epochs
+
+def init_worker(threads):
+    """
+    Configures TensorFlow in a trial worker process before it runs any op.
+    """
+    config.TRAINING_INTRA_OP_THREADS = threads
+    config.TRAINING_INTER_OP_THREADS = min(threads, 2)
+    import performance
+    performance.configure()
+
+def run_trial(trial_id, params, initial_epoch, epochs, trial_dir):
+    """
+    Trains a trial from `initial_epoch` to `epochs`, continuing from the
+    model it saved in its previous rung. Runs in a worker process, with the
+    output going to the trial's train.log.
+
+    Returns:
+        dict: Validation accuracy and loss of each epoch and the training time
+    """
+    import tensorflow as tf
+    import model
+    import input_pipeline
+
+    os.makedirs(trial_dir, exist_ok=True)
+    model_path = os.path.join(trial_dir, "model.keras")
+    with open(os.path.join(trial_dir, "train.log"), "a") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        print(f"==== Trial {trial_id}, epochs {initial_epoch + 1}-{epochs}: {params} ====")
+        start = time.perf_counter()
+        # A different seed per rung, so a resumed trial does not replay the same shuffles and augmentations
+        seed = config.RANDOM_SEED + initial_epoch
+        tf.random.set_seed(seed)
+        if initial_epoch == 0:
+            net = model.create_model(params["conv_filters"], params["dense_units"], params["dropout"],
+                                     params["learning_rate"])
+        else:
+            net = tf.keras.models.load_model(model_path)
+
+        train_dataset, validation_dataset, _ = input_pipeline.create_datasets(
+            use_cache=True, batch_size=params["batch_size"], seed=seed)
+        # Keep tf.data to the trial's share of the cores, like the TensorFlow ops
+        options = tf.data.Options()
+        options.threading.private_threadpool_size = config.TRAINING_INTRA_OP_THREADS
+        history = net.fit(
+            train_dataset.with_options(options),
+            validation_data=validation_dataset.with_options(options),
+            initial_epoch=initial_epoch,
+            epochs=epochs,
+            verbose=2
+        )
+        net.save(model_path)
+
+    return {
+        "epochs": epochs,
+        "val_accuracy": [float(value) for value in history.history["val_accuracy"]],
+        "val_loss": [float(value) for value in history.history["val_loss"]],
+        "seconds": time.perf_counter() - start,
+    }
+
+class Scheduler:
+    """
+    ASHA bookkeeping: the state of every trial and the next job to run.
+
+    Args:
+        params: Hyperparameters of each trial
+        rungs: Total epochs after each rung
+        factor: Reduction factor; a rung promotes its top 1/factor of trials
+    """
+
+    def __init__(self, params, rungs, factor):
+        self.rungs = rungs
+        self.factor = factor
+        self.trials = [
+            {"trial": index, "params": trial_params, "status": "pending", "rung": -1, "epochs": 0,
+             "val_accuracy": [], "val_loss": [], "seconds": 0.0, "error": None}
+            for index, trial_params in enumerate(params)
+        ]
+        self.started = 0
+
+    def score(self, trial, rung):
+        """
+        Best validation accuracy (then lowest loss) within the epochs of
+        `rung`, so trials that went on to later rungs compare fairly.
+        """
+        epochs = self.rungs[rung]
+        return max(trial["val_accuracy"][:epochs]), -min(trial["val_loss"][:epochs])
+
+    def next_job(self):
+        """
+        Returns:
+            tuple: (trial, epochs to train it to), or None if no trial can run now
+        """
+        # Promote from the highest rung first, so the best trials finish early
+        for rung in reversed(range(len(self.rungs) - 1)):
+            finished = [trial for trial in self.trials if trial["status"] != "failed" and trial["rung"] >= rung]
+            ranked = sorted(finished, key=lambda trial: self.score(trial, rung), reverse=True)
+            for trial in ranked[:len(ranked) // self.factor]:
+                if trial["rung"] == rung and trial["status"] == "paused":
+                    return trial, self.rungs[rung + 1]
+        if self.started < len(self.trials):
+            self.started += 1
+            return self.trials[self.started - 1], self.rungs[0]
+        return None
+
+    def record(self, trial, result):
+        trial["epochs"] = result["epochs"]
+        trial["val_accuracy"].extend(result["val_accuracy"])
+        trial["val_loss"].extend(result["val_loss"])
+        trial["seconds"] += result["seconds"]
+        trial["rung"] = self.rungs.index(result["epochs"])
+        trial["status"] = "completed" if trial["rung"] == len(self.rungs) - 1 else "paused"
+
+    def ranked(self):
+        """
+        Trials ranked by the rung they reached, then by their score there; failed trials last.
+        """
+        for trial in self.trials:
+            if trial["status"] == "paused":
+                trial["status"] = "pruned"
+        scored = [trial for trial in self.trials if trial["rung"] >= 0]
+        failed = [trial for trial in self.trials if trial["rung"] < 0]
+        return sorted(scored, key=lambda trial: (trial["rung"], self.score(trial, trial["rung"])), reverse=True) + failed
+
+def run_sweep(space, trials, min_epochs, factor, max_epochs, workers, threads, seed, sweep_dir):
+    """
+    Runs the sweep.
+
+    Returns:
+        list: Trials, best first
+    """
+    rungs = rung_epochs(min_epochs, factor, max_epochs)
+    rng = np.random.default_rng(seed)
+    scheduler = Scheduler([sample_params(space, rng) for _ in range(trials)], rungs, factor)
+    trials_dir = os.path.join(sweep_dir, "trials")
+    shutil.rmtree(trials_dir, ignore_errors=True)
+    print(f"Running {trials} trials over rungs of {rungs} epochs, {workers} at a time with {threads} threads each")
+
+    # Workers must not inherit a forked TensorFlow runtime
+    context = multiprocessing.get_context("spawn")
+    running = {}
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(threads,)) as pool:
+        while True:
+            while len(running) < workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial, epochs = job
+                trial["status"] = "running"
+                trial_dir = os.path.join(trials_dir, f"trial_{trial['trial']:03d}")
+                future = pool.submit(run_trial, trial["trial"], trial["params"], trial["epochs"], epochs, trial_dir)
+                running[future] = trial
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = running.pop(future)
+                try:
+                    scheduler.record(trial, future.result())
+                except Exception as e:
+                    trial["status"] = "failed"
+                    trial["error"] = str(e)
+                    print(f"Trial {trial['trial']} failed: {str(e)}")
+                    continue
+                print(f"Trial {trial['trial']}: {trial['epochs']} epochs, "
+                      f"val_accuracy {max(trial['val_accuracy']):.4f} ({trial['status']})")
+
+    # Trial logs are kept, the models only served to resume trials
+    for trial in scheduler.trials:
+        model_path = os.path.join(trials_dir, f"trial_{trial['trial']:03d}", "model.keras")
+        if os.path.exists(model_path):
+            os.remove(model_path)
+    return scheduler.ranked()
+
+def save_results(ranked, rungs, seconds, sweep_dir):
+    """
+    Writes the ranked results table (results.csv) and the sweep summary with
+    the best trial (metrics.json) for DVC.
+    """
+    os.makedirs(sweep_dir, exist_ok=True)
+    with open(os.path.join(sweep_dir, "results.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", "trial", "status", "epochs", "val_accuracy", "val_loss", "seconds"] + list(PARAMETERS))
+        for rank, trial in enumerate(ranked, 1):
+            trained = trial["rung"] >= 0
+            params = [trial["params"][name] for name in PARAMETERS]
+            params[-1] = "-".join(str(filters) for filters in params[-1])
+            writer.writerow([rank, trial["trial"], trial["status"], trial["epochs"],
+                             max(trial["val_accuracy"]) if trained else "",
+                             min(trial["val_loss"]) if trained else "",
+                             round(trial["seconds"], 1)] + params)
+
+    best = ranked[0]
+    metrics = {
+        "trials": len(ranked),
+        "completed": sum(trial["status"] == "completed" for trial in ranked),
+        "pruned": sum(trial["status"] == "pruned" for trial in ranked),
+        "failed": sum(trial["status"] == "failed" for trial in ranked),
+        "rung_epochs": rungs,
+        "epochs_trained": sum(trial["epochs"] for trial in ranked),
+        "epochs_without_pruning": len(ranked) * rungs[-1],
+        "seconds": seconds,
+        "best": {
+            "trial": best["trial"],
+            "epochs": best["epochs"],
+            "val_accuracy": max(best["val_accuracy"]) if best["rung"] >= 0 else None,
+            "val_loss": min(best["val_loss"]) if best["rung"] >= 0 else None,
+            "params": best["params"],
+        },
+    }
+    with open(os.path.join(sweep_dir, "metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=4)
+    print(f"Results saved to {sweep_dir}/results.csv, best trial {best['trial']}: {best['params']}")
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep with asynchronous successive halving')
+    parser.add_argument('--space', default=config.SWEEP_SPACE_PATH, help='Search space JSON file')
+    parser.add_argument('--trials', type=int, default=config.SWEEP_TRIALS, help='Number of sampled configurations')
+    parser.add_argument('--min-epochs', type=int, default=config.SWEEP_MIN_EPOCHS, help='Epochs of the first rung')
+    parser.add_argument('--max-epochs', type=int, default=config.EPOCHS, help='Epoch limit of the last rung')
+    parser.add_argument('--reduction-factor', type=int, default=config.SWEEP_REDUCTION_FACTOR,
+                        help='Rung promotion factor (eta)')
+    parser.add_argument('--threads-per-trial', type=int, default=config.SWEEP_THREADS_PER_TRIAL,
+                        help='TensorFlow threads of each trial')
+    parser.add_argument('--workers', type=int, help='Trials run in parallel (default: cores // threads per trial)')
+    parser.add_argument('--seed', type=int, default=config.RANDOM_SEED, help='Sampling seed')
+    parser.add_argument('--output', default=config.SWEEP_DIR, help='Directory of the results')
+    args = parser.parse_args()
+
+    threads = max(1, min(args.threads_per_trial, cores))
+    workers = max(1, min(args.workers or cores // threads, args.trials))
+
+    # Decode the images once, before the trials start streaming the cache
+    if not dataset_cache.is_current():
+        print("Dataset cache is missing or out of date, building it...")
+        dataset_cache.build_cache()
+
+    start = time.perf_counter()
+    rungs = rung_epochs(args.min_epochs, args.reduction_factor, args.max_epochs)
+    ranked = run_sweep(load_space(args.space), args.trials, args.min_epochs, args.reduction_factor, args.max_epochs,
+                       workers, threads, args.seed, args.output)
+    save_results(ranked, rungs, time.perf_counter() - start, args.output)
+
+if __name__ == "__main__":
+    main()